@@ -0,0 +1,397 @@
+"""Embedded DuckDB mirror of news sentiment and daily bars for historical analytics.
+
+The worker copies new rows from Postgres every cycle; long-window analytics
+then run as columnar SQL on a local file instead of holding connections from
+the small API pool. The mirror is append-mostly and keeps article-level rows
+even after news retention archives them in Postgres. Rebuild it with:
+
+    python -m analytics_store --rebuild
+
+DuckDB lets one connection write a file or many read it. Queries open it
+read-only and close it again; only a sync opens it read-write, for as long
+as the sync takes. Several API processes and a manual rebuild can therefore
+share the file, each waiting briefly for the other's lock.
+"""
+
+import argparse
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from database import ArticleTicker, NewsArticle, PriceBar, SessionLocal
+
+try:
+    import duckdb
+
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    duckdb = None
+    DUCKDB_AVAILABLE = False
+    print("DuckDB not found. Historical analytics will query the primary database.")
+
+
+ANALYTICS_DB_PATH = Path(os.getenv("ANALYTICS_DB_PATH", Path(__file__).resolve().parent / "data" / "analytics.duckdb"))
+# Written after a sync commits news rows, so readiness checks need no DuckDB connection.
+READY_MARKER = ANALYTICS_DB_PATH.with_suffix(".ready")
+SYNC_BATCH_SIZE = 5000
+# How long a query waits for a running sync to release the file before the
+# caller falls back to Postgres, and how long a sync waits for readers.
+READ_LOCK_TIMEOUT_SECONDS = 2.0
+WRITE_LOCK_TIMEOUT_SECONDS = 60.0
+# Recent articles are re-copied each sync: the worker can still attach
+# tickers or AI labels to them after the first copy.
+RESYNC_DAYS = 2
+# Daily bars are re-copied from a week before each symbol's last mirrored
+# day, which covers revised closes and late sessions.
+BAR_OVERLAP_DAYS = 7
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS news_events (
+        article_id INTEGER,
+        symbol VARCHAR,
+        published_at TIMESTAMP,
+        sentiment_label VARCHAR,
+        sentiment_score DOUBLE,
+        event_type VARCHAR
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS price_bars (
+        symbol VARCHAR,
+        date DATE,
+        open DOUBLE,
+        high DOUBLE,
+        low DOUBLE,
+        close DOUBLE,
+        volume BIGINT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        name VARCHAR PRIMARY KEY,
+        value TIMESTAMP
+    )
+    """,
+]
+NEWS_EVENT_COLUMNS = ["article_id", "symbol", "published_at", "sentiment_label", "sentiment_score", "event_type"]
+BAR_COLUMNS = ["symbol", "date", "open", "high", "low", "close", "volume"]
+
+_sync_lock = threading.Lock()
+
+
+class AnalyticsBusy(Exception):
+    """The mirror stayed locked by another connection past the wait limit."""
+
+
+def _open(read_only: bool, timeout: float):
+    give_up_at = time.monotonic() + timeout
+    while True:
+        try:
+            return duckdb.connect(str(ANALYTICS_DB_PATH), read_only=read_only)
+        except duckdb.OperationalError as e:
+            # Another process holds the file lock, or this process has it open in the other mode.
+            if time.monotonic() >= give_up_at:
+                raise AnalyticsBusy(str(e)) from e
+            time.sleep(0.05)
+
+
+@contextmanager
+def _reader():
+    connection = _open(read_only=True, timeout=READ_LOCK_TIMEOUT_SECONDS)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+@contextmanager
+def _writer():
+    ANALYTICS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    connection = _open(read_only=False, timeout=WRITE_LOCK_TIMEOUT_SECONDS)
+    try:
+        for statement in SCHEMA:
+            connection.execute(statement)
+        yield connection
+    finally:
+        connection.close()
+
+
+def analytics_ready():
+    """True once a sync has filled the mirror; callers fall back to Postgres otherwise, or if a query finds it busy."""
+    return DUCKDB_AVAILABLE and ANALYTICS_DB_PATH.exists() and READY_MARKER.exists()
+
+
+def query_frame(sql: str, params: list | None = None):
+    """Run a read-only query; raises AnalyticsBusy while a sync holds the file."""
+    with _reader() as connection:
+        return connection.execute(sql, params or []).df()
+
+
+def _insert_frame(cursor, table: str, frame: pd.DataFrame):
+    cursor.register("incoming", frame)
+    try:
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM incoming")
+    finally:
+        cursor.unregister("incoming")
+
+
+def _news_events_query(db: Session):
+    return db.query(
+        NewsArticle.id,
+        ArticleTicker.symbol,
+        NewsArticle.published_at,
+        NewsArticle.sentiment_label,
+        NewsArticle.sentiment_score,
+        NewsArticle.event_type,
+    ).outerjoin(ArticleTicker, ArticleTicker.article_id == NewsArticle.id)
+
+
+def _news_events_frame(rows: list):
+    frame = pd.DataFrame(rows, columns=NEWS_EVENT_COLUMNS)
+    frame["symbol"] = frame["symbol"].fillna("Global")
+    frame["published_at"] = pd.to_datetime(frame["published_at"])
+    frame["sentiment_score"] = frame["sentiment_score"].astype(float)
+    return frame
+
+
+def _load_news_events(db: Session, after_id: int, watermark: int, resync_since: datetime, limit: int):
+    rows = (
+        _news_events_query(db)
+        .filter(
+            NewsArticle.id > after_id,
+            or_(NewsArticle.id > watermark, NewsArticle.published_at >= resync_since),
+        )
+        .order_by(NewsArticle.id)
+        .limit(limit)
+        .all()
+    )
+    frame = _news_events_frame(rows)
+    if len(frame) == limit:
+        # The limit may have cut the last article's ticker rows; it leads the next batch instead.
+        frame = frame[frame["article_id"] < frame["article_id"].iloc[-1]]
+    return frame
+
+
+def _resync_relinked_articles(db: Session, cursor, resync_since: datetime):
+    """Re-copy articles older than the resync window that gained ticker links since the last sync."""
+    latest = db.query(func.max(ArticleTicker.linked_at)).scalar()
+    if latest is None:
+        return 0
+    state = cursor.execute("SELECT value FROM sync_state WHERE name = 'links_synced_at'").fetchone()
+
+    query = (
+        db.query(ArticleTicker.article_id)
+        .join(NewsArticle, NewsArticle.id == ArticleTicker.article_id)
+        .filter(NewsArticle.published_at < resync_since, ArticleTicker.linked_at <= latest)
+        .distinct()
+    )
+    if state is not None:
+        query = query.filter(ArticleTicker.linked_at > state[0])
+    article_ids = sorted(row[0] for row in query.all())
+
+    copied = 0
+    for start in range(0, len(article_ids), SYNC_BATCH_SIZE):
+        batch = article_ids[start:start + SYNC_BATCH_SIZE]
+        cursor.register("relinked", pd.DataFrame({"article_id": batch}))
+        cursor.execute("DELETE FROM news_events WHERE article_id IN (SELECT article_id FROM relinked)")
+        cursor.unregister("relinked")
+        frame = _news_events_frame(_news_events_query(db).filter(NewsArticle.id.in_(batch)).all())
+        _insert_frame(cursor, "news_events", frame)
+        copied += len(frame)
+
+    cursor.execute("INSERT OR REPLACE INTO sync_state VALUES ('links_synced_at', ?)", [latest])
+    return copied
+
+
+def sync_news_events(db: Session, cursor, rebuild: bool = False):
+    """
+    Copy articles past the mirror's watermark, re-copy the last RESYNC_DAYS and
+    older articles that gained tickers since. A rebuild re-copies every article
+    still in Postgres and keeps the mirrored ones retention has archived.
+    """
+    resync_since = datetime.utcnow() - timedelta(days=RESYNC_DAYS)
+    if rebuild:
+        oldest = db.query(func.min(NewsArticle.published_at)).scalar()
+        if oldest is not None:
+            resync_since = min(resync_since, oldest)
+    cursor.execute("DELETE FROM news_events WHERE published_at >= ?", [resync_since])
+    watermark = cursor.execute("SELECT coalesce(max(article_id), 0) FROM news_events").fetchone()[0]
+
+    copied = 0
+    after_id = 0
+    while True:
+        frame = _load_news_events(db, after_id, watermark, resync_since, SYNC_BATCH_SIZE)
+        if frame.empty:
+            break
+        _insert_frame(cursor, "news_events", frame)
+        copied += len(frame)
+        after_id = int(frame["article_id"].max())
+    return copied + _resync_relinked_articles(db, cursor, resync_since)
+
+
+def _load_bars(db: Session, symbols: list[str], start: date | None):
+    query = db.query(
+        PriceBar.symbol, PriceBar.date, PriceBar.open, PriceBar.high, PriceBar.low, PriceBar.close, PriceBar.volume,
+    ).filter(PriceBar.symbol.in_(symbols))
+    if start is not None:
+        query = query.filter(PriceBar.date >= start)
+
+    frame = pd.DataFrame(query.all(), columns=BAR_COLUMNS)
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame["volume"] = frame["volume"].astype("Int64")
+    return frame
+
+
+def sync_price_bars(db: Session, cursor):
+    """Full copy for symbols new to the mirror or backfilled further back; an overlapping tail for the rest."""
+    mirrored = {
+        symbol: (first, last)
+        for symbol, first, last in cursor.execute("SELECT symbol, min(date), max(date) FROM price_bars GROUP BY symbol").fetchall()
+    }
+    full, tail = [], []
+    for symbol, first in db.query(PriceBar.symbol, func.min(PriceBar.date)).group_by(PriceBar.symbol).all():
+        if symbol in mirrored and mirrored[symbol][0] <= first:
+            tail.append(symbol)
+        else:
+            full.append(symbol)
+
+    copied = 0
+    if full:
+        frame = _load_bars(db, full, None)
+        cursor.register("symbols", pd.DataFrame({"symbol": full}))
+        cursor.execute("DELETE FROM price_bars WHERE symbol IN (SELECT symbol FROM symbols)")
+        cursor.unregister("symbols")
+        _insert_frame(cursor, "price_bars", frame)
+        copied += len(frame)
+    if tail:
+        start = min(mirrored[symbol][1] for symbol in tail) - timedelta(days=BAR_OVERLAP_DAYS)
+        frame = _load_bars(db, tail, start)
+        cursor.register("symbols", pd.DataFrame({"symbol": tail}))
+        cursor.execute("DELETE FROM price_bars WHERE date >= ? AND symbol IN (SELECT symbol FROM symbols)", [start])
+        cursor.unregister("symbols")
+        _insert_frame(cursor, "price_bars", frame)
+        copied += len(frame)
+    return copied
+
+
+def sync_analytics_store(db: Session, rebuild: bool = False):
+    """Bring the mirror up to date in one DuckDB transaction, holding the only read-write connection."""
+    with _sync_lock, _writer() as cursor:
+        try:
+            cursor.execute("BEGIN TRANSACTION")
+            if rebuild:
+                cursor.execute("DELETE FROM price_bars")
+            copied = {
+                "news_events": sync_news_events(db, cursor, rebuild=rebuild),
+                "price_bars": sync_price_bars(db, cursor),
+            }
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+        if cursor.execute("SELECT EXISTS (SELECT 1 FROM news_events)").fetchone()[0]:
+            READY_MARKER.touch()
+        else:
+            READY_MARKER.unlink(missing_ok=True)
+        return copied
+
+
+def sync_analytics_store_sync(rebuild: bool = False):
+    if not DUCKDB_AVAILABLE:
+        return {"news_events": 0, "price_bars": 0}
+    db = SessionLocal()
+    try:
+        return sync_analytics_store(db, rebuild=rebuild)
+    finally:
+        db.close()
+
+
+def symbol_sentiment(since: datetime):
+    """Average sentiment and article count per attributed symbol since ``since``."""
+    return query_frame(
+        """
+        SELECT symbol, avg(sentiment_score) AS sentiment_score, count(*) AS article_count
+        FROM news_events
+        WHERE published_at >= ? AND symbol <> 'Global'
+        GROUP BY symbol
+        """,
+        [since],
+    )
+
+
+def attributed_events(labels: list[str], since: datetime | None = None):
+    """
+    Ticker-attributed articles with one of ``labels``, published since
+    ``since``, and the first publication time the mirror holds; archived
+    articles from before it only exist as daily summaries.
+    """
+    with _reader() as connection:
+        first = connection.execute("SELECT min(published_at) FROM news_events").fetchone()[0]
+        events = connection.execute(
+            """
+            SELECT symbol, published_at, sentiment_label, sentiment_score, event_type
+            FROM news_events
+            WHERE symbol <> 'Global' AND list_contains(?, sentiment_label) AND published_at >= ?
+            """,
+            [labels, since or datetime.min],
+        ).df()
+    return events, first
+
+
+def daily_sentiment_history(symbol: str, start: date, window: int = 20):
+    """
+    One row per calendar day with a session or an article: close, article
+    counts, mean score and the net (positive - negative) headline count over
+    the trailing ``window`` rows.
+    """
+    return query_frame(
+        """
+        WITH news AS (
+            SELECT CAST(published_at AS DATE) AS day,
+                   count(*) AS articles,
+                   count(*) FILTER (WHERE sentiment_label = 'POSITIVE') AS positive,
+                   count(*) FILTER (WHERE sentiment_label = 'NEGATIVE') AS negative,
+                   avg(sentiment_score) AS mean_score
+            FROM news_events
+            WHERE symbol = ? AND published_at >= ?
+            GROUP BY 1
+        ),
+        bars AS (
+            SELECT date AS day, close FROM price_bars WHERE symbol = ? AND date >= ?
+        )
+        SELECT coalesce(bars.day, news.day) AS day,
+               bars.close,
+               coalesce(news.articles, 0) AS articles,
+               coalesce(news.positive, 0) AS positive,
+               coalesce(news.negative, 0) AS negative,
+               news.mean_score,
+               sum(coalesce(news.positive, 0) - coalesce(news.negative, 0)) OVER (
+                   ORDER BY coalesce(bars.day, news.day) ROWS BETWEEN ? PRECEDING AND CURRENT ROW
+               ) AS net_sentiment
+        FROM bars FULL OUTER JOIN news ON bars.day = news.day
+        ORDER BY day
+        """,
+        [symbol, start, symbol, start, window - 1],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the DuckDB analytics mirror from the primary database.")
+    parser.add_argument(
+        "--rebuild", action="store_true",
+        help="copy everything still in the primary again (archived articles already mirrored are kept)",
+    )
+    args = parser.parse_args()
+
+    if not DUCKDB_AVAILABLE:
+        raise SystemExit("DuckDB is not installed.")
+    print(f"Copied {sync_analytics_store_sync(rebuild=args.rebuild)} into {ANALYTICS_DB_PATH}.")
@@ -0,0 +1,245 @@
+"""Walk-forward backtest of the prediction scoring rules over stored daily bars.
+
+Run from ``backend/``:
+
+    python -m backtest                            # every symbol with stored bars
+    python -m backtest --sync --years 5           # backfill bars for the universe first
+    python -m backtest --horizon 63 --folds 5 --fundamentals current
+
+The technical and sentiment pillars are replayed as of each session close,
+vectorized over the whole date x symbol grid. Fundamentals have no stored
+history: ``--fundamentals none`` (default) scores them as 0, ``current``
+applies today's scores to every past date and so carries look-ahead bias.
+Sentiment uses the event-study weights stored today, with the same caveat.
+"""
+
+import argparse
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from database import Instrument, PriceBar, SessionLocal, init_db
+from event_study import ensure_price_bars, event_day_indices, event_weight, load_event_weights, load_events
+from price_store import PriceHistoryStore
+from routers.analysis import (
+    BUY_SCORE,
+    STRONG_BUY_SCORE,
+    SELL_SCORE,
+    STRONG_SELL_SCORE,
+    TECH_MA_LONG,
+    TECH_MA_SHORT,
+)
+
+
+SIGNALS = ["STRONG BUY", "BUY", "HOLD", "SELL", "STRONG SELL"]
+TRADING_DAYS = 252
+SENTIMENT_WINDOW = 5
+HOLD_BAND = 0.03
+BUY_THRESHOLD_GRID = [2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]
+
+
+def technical_scores(closes: pd.DataFrame):
+    """MA-short above MA-long, plus close above MA-long, as of every session."""
+    ma_short = closes.rolling(TECH_MA_SHORT, min_periods=TECH_MA_SHORT).mean()
+    ma_long = closes.rolling(TECH_MA_LONG, min_periods=TECH_MA_LONG).mean()
+    scores = (ma_short > ma_long).astype(float) + (closes > ma_long).astype(float)
+    return scores.where(ma_long.notna())
+
+
+def sentiment_scores(db: Session, closes: pd.DataFrame):
+    """Weighted headline votes over the trailing SENTIMENT_WINDOW sessions, clipped to +/-1."""
+    articles = load_events(db, since=closes.index[0].to_pydatetime())
+    articles = articles[articles["symbol"].isin(closes.columns)]
+    votes = np.zeros(closes.shape)
+    if not articles.empty:
+        weights = {event_type: event_weight(event_type) for event_type in articles["event_type"].unique()}
+        value = articles["sign"] * articles["event_type"].map(weights)
+
+        session = event_day_indices(closes.index, articles["published_at"])
+        column = closes.columns.get_indexer(articles["symbol"])
+        inside = session < len(closes)
+        np.add.at(votes, (session[inside], column[inside]), value.to_numpy()[inside])
+
+    window = pd.DataFrame(votes, index=closes.index, columns=closes.columns).rolling(SENTIMENT_WINDOW, min_periods=1).sum()
+    return window.clip(-1.0, 1.0)
+
+
+def fundamental_scores(symbols: list[str], mode: str):
+    if mode == "none":
+        return pd.Series(0.0, index=symbols)
+
+    from market_data import market_data
+    from routers.analysis import fundamental_score
+
+    scores = {}
+    for symbol in symbols:
+        try:
+            scores[symbol] = fundamental_score(market_data.fundamentals_sync(symbol).info)[0]
+        except Exception as e:
+            print(f"Skipping fundamentals for {symbol}: {e}")
+            scores[symbol] = 0
+    return pd.Series(scores, dtype=float)
+
+
+def classify_scores(total: pd.DataFrame, buy: float = BUY_SCORE, strong_buy: float = STRONG_BUY_SCORE,
+                    sell: float = SELL_SCORE, strong_sell: float = STRONG_SELL_SCORE):
+    """Vectorized ``classify_score``; NaN scores (not enough history) stay unlabelled."""
+    values = total.to_numpy()
+    labels = np.select(
+        [values >= strong_buy, values >= buy, values <= strong_sell, values <= sell, ~np.isnan(values)],
+        ["STRONG BUY", "BUY", "STRONG SELL", "SELL", "HOLD"],
+        default="",
+    )
+    return pd.DataFrame(labels, index=total.index, columns=total.columns)
+
+
+def _max_drawdown(equity: pd.Series):
+    return float((equity / equity.cummax() - 1).min()) if len(equity) else 0.0
+
+
+def signal_report(signals: pd.DataFrame, closes: pd.DataFrame, horizon: int):
+    """
+    Per signal: forward ``horizon``-session return stats and a daily-rebalanced,
+    equal-weight long book of every stock carrying that signal.
+    """
+    forward = closes.shift(-horizon) / closes - 1
+    excess = forward.sub(forward.mean(axis=1), axis=0)
+    next_day = (closes.shift(-1) / closes - 1).fillna(0.0)
+
+    report = []
+    for signal in SIGNALS:
+        held = signals == signal
+        returns = forward.where(held).stack().dropna()
+        if returns.empty:
+            continue
+
+        if "BUY" in signal:
+            hits = returns > 0
+        elif "SELL" in signal:
+            hits = returns < 0
+        else:
+            hits = returns.abs() <= HOLD_BAND
+
+        count = held.sum(axis=1)
+        book = (next_day.where(held, 0.0).sum(axis=1) / count.where(count > 0)).fillna(0.0)
+        equity = (1 + book).cumprod()
+        active_days = int((count > 0).sum())
+        report.append({
+            "signal": signal,
+            "observations": len(returns),
+            "hit_rate": float(hits.mean()),
+            "mean_return": float(returns.mean()),
+            "median_return": float(returns.median()),
+            "mean_excess": float(excess.where(held).stack().mean()),
+            "book_annualized": float(equity.iloc[-1] ** (TRADING_DAYS / active_days) - 1) if active_days else 0.0,
+            "book_max_drawdown": _max_drawdown(equity),
+        })
+    return pd.DataFrame(report)
+
+
+def confidence_report(total: pd.DataFrame, closes: pd.DataFrame, horizon: int):
+    """Does a higher ``50 + score * 7`` confidence actually mean a better hit rate?"""
+    forward = closes.shift(-horizon) / closes - 1
+    frame = pd.DataFrame({"score": total.stack(), "forward": forward.stack()}).dropna()
+    frame["confidence"] = (50 + frame["score"] * 7).clip(10, 98)
+    frame["bucket"] = (frame["confidence"] // 10 * 10).astype(int)
+    return frame.groupby("bucket").agg(
+        observations=("forward", "size"),
+        up_rate=("forward", lambda returns: float((returns > 0).mean())),
+        mean_return=("forward", "mean"),
+    ).reset_index()
+
+
+def walk_forward_buy_threshold(total: pd.DataFrame, closes: pd.DataFrame, horizon: int, folds: int):
+    """
+    Split the sessions into ``folds`` consecutive blocks. For each block after
+    the first, pick the BUY threshold with the best mean excess return on all
+    earlier blocks and score it out of sample on the block itself.
+    """
+    forward = closes.shift(-horizon) / closes - 1
+    excess = forward.sub(forward.mean(axis=1), axis=0)
+    blocks = np.array_split(np.arange(len(total)), folds)
+
+    rows = []
+    for k in range(1, folds):
+        # Drop the last ``horizon`` training sessions: their forward returns overlap the test block.
+        train = np.concatenate(blocks[:k])[:-horizon or None]
+        test = blocks[k]
+        train_scores, train_excess = total.iloc[train].to_numpy(), excess.iloc[train].to_numpy()
+        test_scores, test_excess = total.iloc[test].to_numpy(), excess.iloc[test].to_numpy()
+
+        def mean_excess(scores, excess_returns, threshold):
+            picked = excess_returns[(scores >= threshold) & ~np.isnan(excess_returns)]
+            return float(picked.mean()) if picked.size else np.nan
+
+        in_sample = {threshold: mean_excess(train_scores, train_excess, threshold) for threshold in BUY_THRESHOLD_GRID}
+        candidates = {threshold: value for threshold, value in in_sample.items() if not np.isnan(value)}
+        if not candidates:
+            continue
+        best = max(candidates, key=candidates.get)
+        rows.append({
+            "fold": k,
+            "test_start": total.index[test[0]].date(),
+            "test_end": total.index[test[-1]].date(),
+            "chosen_buy_threshold": best,
+            "in_sample_excess": candidates[best],
+            "out_of_sample_excess": mean_excess(test_scores, test_excess, best),
+            "current_rule_excess": mean_excess(test_scores, test_excess, BUY_SCORE),
+        })
+    return pd.DataFrame(rows)
+
+
+def _universe_symbols(db: Session):
+    symbols = {row[0] for row in db.query(Instrument.symbol).all()}
+    return sorted(symbols or {row[0] for row in db.query(PriceBar.symbol).distinct().all()})
+
+
+def run_backtest(db: Session, symbols: list[str], start: date, end: date, horizon: int, fundamentals: str = "none"):
+    closes = PriceHistoryStore.from_db(db, symbols, start).close_matrix(symbols, start, end)
+    if closes.empty:
+        raise ValueError("No stored price bars for the requested symbols and dates.")
+
+    load_event_weights(db)
+    total = technical_scores(closes) + sentiment_scores(db, closes)
+    total = total.add(fundamental_scores(list(closes.columns), fundamentals), axis=1)
+    return closes, total, classify_scores(total)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the prediction scoring rules.")
+    parser.add_argument("--symbols", nargs="*", default=None, help="defaults to the whole instrument universe")
+    parser.add_argument("--years", type=float, default=5.0)
+    parser.add_argument("--horizon", type=int, default=21, help="forward sessions (21 ~ 1m, 63 ~ 3m)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--fundamentals", choices=["none", "current"], default="none")
+    parser.add_argument("--sync", action="store_true", help="download missing bars before running")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        symbols = [symbol.upper() for symbol in args.symbols] if args.symbols else _universe_symbols(db)
+        end = date.today()
+        start = end - timedelta(days=int(args.years * 365))
+        if args.sync:
+            ensure_price_bars(db, symbols, start)
+        closes, total, signals = run_backtest(db, symbols, start, end, args.horizon, args.fundamentals)
+    finally:
+        db.close()
+
+    with pd.option_context("display.width", 160, "display.float_format", "{:.4f}".format):
+        print(f"{closes.shape[1]} symbols x {closes.shape[0]} sessions, {args.horizon}-session horizon\n")
+        print(signal_report(signals, closes, args.horizon).to_string(index=False))
+        print("\nConfidence calibration")
+        print(confidence_report(total, closes, args.horizon).to_string(index=False))
+        if args.folds > 1:
+            print("\nWalk-forward BUY threshold")
+            print(walk_forward_buy_threshold(total, closes, args.horizon, args.folds).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
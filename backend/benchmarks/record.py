@@ -0,0 +1,62 @@
+"""Record live upstream responses into ``fixtures/`` for the replay transport.
+
+    python -m benchmarks.record BBCA BBRI TLKM
+
+Writes per-ticker yfinance info/history fixtures, which take precedence over
+the shared templates, and refreshes the Google News RSS template.
+"""
+
+import argparse
+import json
+import re
+
+import httpx
+import yfinance as yf
+
+from benchmarks.replay import FIXTURES_DIR
+
+
+def record_ticker(symbol: str):
+    ticker = f"{symbol.upper()}.JK"
+    stock = yf.Ticker(ticker)
+
+    info_dir = FIXTURES_DIR / "yfinance" / "info"
+    history_dir = FIXTURES_DIR / "yfinance" / "history"
+    info_dir.mkdir(parents=True, exist_ok=True)
+    history_dir.mkdir(parents=True, exist_ok=True)
+
+    (info_dir / f"{ticker}.json").write_text(json.dumps(stock.info, indent=2, default=str), encoding="utf-8")
+    history = stock.history(period="6mo", auto_adjust=False)[["Open", "High", "Low", "Close", "Volume"]]
+    history.index = history.index.tz_localize(None)
+    history.to_csv(history_dir / f"{ticker}.csv", index_label="Date")
+
+
+def record_rss(query: str):
+    response = httpx.get(
+        "https://news.google.com/rss/search",
+        params={"q": query, "hl": "id", "gl": "ID", "ceid": "ID:id"},
+        timeout=10,
+        follow_redirects=True,
+    )
+    response.raise_for_status()
+    symbol = query.split()[0]
+    template = re.sub(re.escape(symbol), "__Q__", response.text, flags=re.IGNORECASE)
+    (FIXTURES_DIR / "google_news" / "search.xml").write_text(template, encoding="utf-8")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Record upstream fixtures for offline benchmarks.")
+    parser.add_argument("symbols", nargs="*", default=["BBCA"])
+    parser.add_argument("--rss-query", default="BBCA saham")
+    args = parser.parse_args(argv)
+
+    for symbol in args.symbols:
+        record_ticker(symbol)
+        print(f"Recorded {symbol}")
+
+    record_rss(args.rss_query)
+    print(f"Recorded RSS for '{args.rss_query}'")
+
+
+if __name__ == "__main__":
+    main_cli()
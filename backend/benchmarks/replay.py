@@ -0,0 +1,216 @@
+"""Stand-in transports that replay recorded upstream responses from ``fixtures/``.
+
+yfinance, Google News RSS (via httpx) and LiteLLM are swapped for replay
+objects inside ``replay_upstreams()``. Per-ticker fixtures are optional:
+``fixtures/yfinance/info/<TICKER>.json`` and ``history/<TICKER>.csv`` are used
+when present, otherwise the shared template is served with prices scaled by a
+stable per-ticker factor so different symbols produce different signals.
+"""
+
+import json
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import pandas as pd
+import yfinance as yf
+
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+PRICE_FIELDS = ("Open", "High", "Low", "Close")
+PERIOD_ROWS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126}
+# Characters per streamed completion chunk, roughly a provider's delta size.
+COMPLETION_CHUNK_CHARS = 64
+
+
+def _price_factor(ticker: str):
+    return 0.25 + (zlib.crc32(ticker.encode()) % 1000) / 100
+
+
+class FixtureStore:
+    def __init__(self, fixtures_dir: Path = FIXTURES_DIR, latency_ms: float = 0.0):
+        self.fixtures_dir = fixtures_dir
+        self.latency_seconds = latency_ms / 1000
+        self._info_template = json.loads((fixtures_dir / "yfinance" / "info.json").read_text(encoding="utf-8"))
+        self._history_template = self._read_history(fixtures_dir / "yfinance" / "history.csv")
+        self._holders = json.loads((fixtures_dir / "yfinance" / "holders.json").read_text(encoding="utf-8"))
+        self._rss_template = (fixtures_dir / "google_news" / "search.xml").read_text(encoding="utf-8")
+        self._completion = json.loads((fixtures_dir / "litellm" / "completion.json").read_text(encoding="utf-8"))
+
+    @staticmethod
+    def _read_history(path: Path):
+        frame = pd.read_csv(path, parse_dates=["Date"], index_col="Date")
+        frame.index = frame.index.tz_localize("Asia/Jakarta")
+        return frame
+
+    def wait(self):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def info(self, ticker: str):
+        path = self.fixtures_dir / "yfinance" / "info" / f"{ticker}.json"
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+
+        factor = _price_factor(ticker)
+        name = ticker.replace(".JK", "")
+        info = {
+            key: value.replace("__SYMBOL__", ticker).replace("__NAME__", name) if isinstance(value, str) else value
+            for key, value in self._info_template.items()
+        }
+        for key in ("currentPrice", "regularMarketPrice", "previousClose", "regularMarketPreviousClose",
+                    "fiftyTwoWeekHigh", "fiftyTwoWeekLow"):
+            info[key] = round(info[key] * factor, 2)
+        info["marketCap"] = int(info["marketCap"] * factor / 10)
+        return info
+
+    def history(self, ticker: str, period: str = "1mo"):
+        path = self.fixtures_dir / "yfinance" / "history" / f"{ticker}.csv"
+        if path.exists():
+            frame = self._read_history(path)
+        else:
+            frame = self._history_template.copy()
+            frame[list(PRICE_FIELDS)] = frame[list(PRICE_FIELDS)] * _price_factor(ticker)
+        return frame.tail(PERIOD_ROWS.get(period, len(frame)))
+
+    def holders(self, kind: str):
+        return pd.DataFrame(self._holders[kind])
+
+    def rss(self, query: str):
+        symbol = (query.split() or ["GLOBAL"])[0].upper()
+        return self._rss_template.replace("__Q__", symbol).encode("utf-8")
+
+    def completion(self, ids: list):
+        """The recorded items, cycled, each answering one requested article id."""
+        articles = self._completion["articles"]
+        items = [{"id": article_id, **articles[index % len(articles)]} for index, article_id in enumerate(ids)]
+        return json.dumps({"articles": items}, ensure_ascii=False)
+
+
+class ReplayFastInfo:
+    def __init__(self, store: FixtureStore, ticker: str):
+        self._store = store
+        self._ticker = ticker
+
+    def get(self, key, default=None):
+        self._store.wait()
+        history = self._store.history(self._ticker, "1y")
+        last, previous = history.iloc[-1], history.iloc[-2]
+        values = {
+            "lastPrice": float(last["Close"]),
+            "previousClose": float(previous["Close"]),
+            "open": float(last["Open"]),
+            "dayHigh": float(last["High"]),
+            "dayLow": float(last["Low"]),
+            "lastVolume": int(last["Volume"]),
+            "yearHigh": float(history["High"].max()),
+            "yearLow": float(history["Low"].min()),
+            "currency": "IDR",
+            "shares": self._store.info(self._ticker).get("sharesOutstanding"),
+        }
+        return values.get(key, default)
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+
+class ReplayTicker:
+    def __init__(self, store: FixtureStore, ticker: str):
+        self._store = store
+        self.ticker = ticker
+
+    @property
+    def info(self):
+        self._store.wait()
+        return self._store.info(self.ticker)
+
+    @property
+    def fast_info(self):
+        return ReplayFastInfo(self._store, self.ticker)
+
+    def history(self, period: str = "1mo", **kwargs):
+        self._store.wait()
+        return self._store.history(self.ticker, period)
+
+    @property
+    def institutional_holders(self):
+        self._store.wait()
+        return self._store.holders("institutional")
+
+    @property
+    def mutualfund_holders(self):
+        self._store.wait()
+        return self._store.holders("mutualfund")
+
+    @property
+    def income_stmt(self):
+        self._store.wait()
+        return pd.DataFrame()
+
+
+def _replay_download(store: FixtureStore):
+    def download(tickers, period="1mo", group_by="column", **kwargs):
+        store.wait()
+        if isinstance(tickers, str):
+            tickers = tickers.split()
+        frame = pd.concat({ticker: store.history(ticker, period) for ticker in tickers}, axis=1)
+        if group_by == "ticker":
+            return frame
+        return frame.swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+    return download
+
+
+@contextmanager
+def replay_upstreams(store: FixtureStore):
+    """Route every upstream call in the app through ``store`` for the duration of the block."""
+    import news_service
+
+    def rss_handler(request: httpx.Request):
+        store.wait()
+        query = parse_qs(urlparse(str(request.url)).query).get("q", [""])[0]
+        return httpx.Response(200, content=store.rss(query), headers={"Content-Type": "application/xml"})
+
+    real_async_client = httpx.AsyncClient
+
+    def replay_async_client(*args, **kwargs):
+        kwargs["transport"] = httpx.MockTransport(rss_handler)
+        return real_async_client(*args, **kwargs)
+
+    def replay_completion(messages=None, stream=False, **kwargs):
+        store.wait()
+        payload = json.loads(messages[-1]["content"].split("\n\n", 1)[1])
+        content = store.completion([article["id"] for article in payload["articles"]])
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        return iter([
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[start:start + COMPLETION_CHUNK_CHARS]))])
+            for start in range(0, len(content), COMPLETION_CHUNK_CHARS)
+        ])
+
+    originals = {
+        (yf, "Ticker"): yf.Ticker,
+        (yf, "Tickers"): yf.Tickers,
+        (yf, "download"): yf.download,
+        (news_service.httpx, "AsyncClient"): real_async_client,
+        (news_service, "completion"): news_service.completion,
+        (news_service, "LITELLM_AVAILABLE"): news_service.LITELLM_AVAILABLE,
+    }
+
+    yf.Ticker = lambda ticker, *args, **kwargs: ReplayTicker(store, ticker)
+    yf.Tickers = lambda tickers, *args, **kwargs: SimpleNamespace(
+        tickers={ticker: ReplayTicker(store, ticker) for ticker in tickers.split()}
+    )
+    yf.download = _replay_download(store)
+    news_service.httpx.AsyncClient = replay_async_client
+    news_service.completion = replay_completion
+    news_service.LITELLM_AVAILABLE = True
+    try:
+        yield store
+    finally:
+        for (owner, attribute), value in originals.items():
+            setattr(owner, attribute, value)
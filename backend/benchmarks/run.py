@@ -0,0 +1,173 @@
+"""Offline latency/throughput benchmarks against recorded upstream fixtures.
+
+Run from ``backend/``:
+
+    python -m benchmarks.run                      # compare with baseline.json
+    python -m benchmarks.run --update-baseline    # store current numbers
+    python -m benchmarks.run --upstream-latency-ms 80 --only stock_detail
+
+The database defaults to a throwaway SQLite file; set BENCH_DATABASE_URL to
+point at a local Postgres instead. Caches are cleared before every iteration
+unless ``--warm`` is given, so numbers reflect the full request path.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "BENCH_DATABASE_URL",
+    f"sqlite:///{Path(tempfile.gettempdir()) / 'capital_sense_bench.db'}",
+)
+os.environ["RATE_LIMIT_PER_MINUTE"] = "1000000000"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import ingestion  # noqa: E402
+import main  # noqa: E402
+import worker  # noqa: E402
+from benchmarks.replay import FixtureStore, replay_upstreams  # noqa: E402
+
+
+def _reset_news_table():
+    """Empty the news tables and feed schedule so every cycle polls (and the hourly poll budget is fresh)."""
+    db = database.SessionLocal()
+    try:
+        db.query(database.ArticleTicker).delete()
+        db.query(database.ArticleTokenCounts).delete()
+        db.query(database.NewsArticle).delete()
+        db.query(database.NewsFeedCheckpoint).delete()
+        db.commit()
+    finally:
+        db.close()
+    ingestion._recent_polls.clear()
+
+
+def _seed_news(client: TestClient):
+    _reset_news_table()
+    worker.update_all_news()
+
+
+def _http_scenario(path: str, setup=None):
+    def scenario(client: TestClient):
+        response = client.get(path)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        body = response.json()
+        if isinstance(body, dict) and "error" in body:
+            raise RuntimeError(f"{path} returned error: {body['error']}")
+
+    scenario.setup = setup
+    return scenario
+
+
+def _news_cycle(client: TestClient):
+    _reset_news_table()
+    worker.update_all_news()
+
+
+SCENARIOS = {
+    "market_summary": _http_scenario("/api/stocks/"),
+    "stock_detail": _http_scenario("/api/stocks/BBCA"),
+    "news": _http_scenario("/api/news/?q=Global", setup=_seed_news),
+    "prediction": _http_scenario("/api/analysis/prediction/BBCA"),
+    "top_picks": _http_scenario("/api/analysis/top-picks"),
+    "news_update_cycle": _news_cycle,
+}
+
+
+def run_scenario(name: str, client: TestClient, iterations: int, warm: bool):
+    scenario = SCENARIOS[name]
+    setup = getattr(scenario, "setup", None)
+    if setup:
+        setup(client)
+
+    random.seed(0)
+    scenario(client)
+
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if not warm:
+            cache.clear_all_caches()
+        iteration_started = time.perf_counter()
+        scenario(client)
+        samples.append(time.perf_counter() - iteration_started)
+    elapsed = time.perf_counter() - started
+
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "throughput_rps": iterations / elapsed if elapsed else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    print(f"{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}{'base p50':>10}{'delta':>9}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        delta = ""
+        if base and base["p50_ms"]:
+            change = (result["p50_ms"] - base["p50_ms"]) / base["p50_ms"]
+            delta = f"{change:+.0%}"
+            if change > tolerance:
+                regressions.append(name)
+        print(
+            f"{name:<20}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['throughput_rps']:>10.1f}"
+            f"{(base or {}).get('p50_ms', float('nan')):>10.1f}{delta:>9}"
+        )
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Capital Sense benchmarks.")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--only", nargs="*", choices=sorted(SCENARIOS), default=None)
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0)
+    parser.add_argument("--warm", action="store_true", help="keep caches between iterations")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before failing")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    store = FixtureStore(latency_ms=args.upstream_latency_ms)
+    client = TestClient(main.app)
+
+    results = {}
+    with replay_upstreams(store):
+        for name in args.only or SCENARIOS:
+            results[name] = run_scenario(name, client, args.iterations, args.warm)
+
+    baseline = json.loads(BASELINE_FILE.read_text(encoding="utf-8")) if BASELINE_FILE.exists() else {}
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        baseline.update(results)
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline written to {BASELINE_FILE}")
+        return 0
+
+    if regressions:
+        print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
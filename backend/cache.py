@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import CACHE_REQUESTS
+
+
+_all_caches = []
+
+
+class TTLCache:
+    """Small thread-safe in-process cache with a per-cache time-to-live.
+
+    ``get_or_load`` serializes loads per key, so concurrent requests for the
+    same missing key trigger a single upstream call and share its result.
+    Expired entries are kept until LRU eviction so a failed reload can fall
+    back to the last good value (``serve_stale``).
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 512, persist: bool = False):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Persistent caches are written to the startup snapshot (see snapshots.py).
+        self.persist = persist
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> [lock, threads holding or waiting for it]
+        self._key_locks = {}
+        _all_caches.append(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def get_stale(self, key, default=None):
+        """Last stored value for ``key``, expired or not."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return default if entry is None else entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def export_entries(self):
+        """(key, value, seconds until expiry) for every entry, oldest first; expired ones go negative."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value, expires_at - now) for key, (expires_at, value) in self._entries.items()]
+
+    def restore_entries(self, entries):
+        """Load exported entries without replacing anything set since startup."""
+        now = time.monotonic()
+        with self._lock:
+            # Newest first, each pushed to the LRU end, so the snapshot's own order survives.
+            for key, value, expires_in in reversed(list(entries)):
+                if key in self._entries:
+                    continue
+                self._entries[key] = (now + expires_in, value)
+                self._entries.move_to_end(key, last=False)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    @contextmanager
+    def _key_lock(self, key):
+        """Hold ``key``'s load lock; it is dropped once no thread holds or waits for it."""
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def get_or_load(self, key, loader, serve_stale: bool = False):
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            return value
+
+        with self._key_lock(key):
+            value = self.get(key, missing)
+            if value is not missing:
+                CACHE_REQUESTS.inc(cache=self.name, result="hit")
+                return value
+
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            try:
+                value = loader()
+            except Exception:
+                value = self.get_stale(key, missing) if serve_stale else missing
+                if value is missing:
+                    raise
+                CACHE_REQUESTS.inc(cache=self.name, result="stale")
+                return value
+
+            self.set(key, value)
+            return value
+
+
+def persistent_caches():
+    return {cache.name: cache for cache in _all_caches if cache.persist}
+
+
+def clear_all_caches():
+    for cache in _all_caches:
+        cache.invalidate()
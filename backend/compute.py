@@ -0,0 +1,135 @@
+"""Process pool for CPU-bound analytics, so they run off the API process's GIL.
+
+Started from the FastAPI lifespan. With COMPUTE_WORKERS=0 (or before the pool
+starts, e.g. in scripts and benchmarks) tasks run inline on a thread instead,
+so callers never need to know which mode is active.
+
+Metrics recorded inside a task are captured in the worker and replayed into
+the API process's registry, so they still show up on /metrics.
+
+Large matrices cross the process boundary through ``share_frame`` /
+``attach_frame``: the parent copies the values into one shared-memory block
+and workers map it, instead of pickling the whole frame per task.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from metrics import capture_observations, replay_observations
+
+
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", "2"))
+
+_pool = None
+
+
+def _init_worker():
+    # Workers are spawned, not forked, so they hold no copies of the parent's
+    # sockets, locks or scheduler threads; each loads what its tasks need.
+    from news_service import load_ai_model
+
+    load_ai_model()
+
+
+def start_compute_pool(workers: int = COMPUTE_WORKERS):
+    """Start the pool; returns False when multiprocess offload is disabled."""
+    global _pool
+    if workers <= 0:
+        return False
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        print(f"Compute pool started with {workers} worker processes.")
+    return True
+
+
+def shutdown_compute_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def pool_active():
+    return _pool is not None
+
+
+def _run_captured(func, *args):
+    with capture_observations() as observations:
+        result = func(*args)
+    return result, observations
+
+
+async def run_cpu(func, *args):
+    """Await ``func(*args)`` in a worker process (or a thread when the pool is off)."""
+    if _pool is None:
+        return await asyncio.to_thread(func, *args)
+    result, observations = await asyncio.get_running_loop().run_in_executor(_pool, _run_captured, func, *args)
+    replay_observations(observations)
+    return result
+
+
+def run_cpu_sync(func, *args):
+    """Blocking variant for scheduler jobs, which already run on their own threads."""
+    if _pool is None:
+        return func(*args)
+    result, observations = _pool.submit(_run_captured, func, *args).result()
+    replay_observations(observations)
+    return result
+
+
+@dataclass(frozen=True)
+class SharedFrameHandle:
+    """Picklable reference to a float matrix in shared memory; the labels travel by value."""
+
+    name: str
+    shape: tuple
+    dtype: str
+    index: pd.Index
+    columns: pd.Index
+
+
+@contextmanager
+def share_frame(frame: pd.DataFrame):
+    """Copy ``frame``'s values into shared memory for the duration of the block."""
+    values = np.ascontiguousarray(frame.to_numpy(dtype=float))
+    block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    try:
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        yield SharedFrameHandle(block.name, values.shape, values.dtype.str, frame.index, frame.columns)
+    finally:
+        block.close()
+        block.unlink()
+
+
+@contextmanager
+def attach_frame(handle: SharedFrameHandle):
+    """
+    Map a shared frame without copying. The frame is only valid inside the
+    block; anything returned from a task must be computed from it, not a view of it.
+    """
+    # Spawned workers share the parent's resource tracker, so attaching here
+    # does not take ownership: the parent's ``share_frame`` still unlinks.
+    block = shared_memory.SharedMemory(name=handle.name)
+    values = np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=block.buf)
+    frame = pd.DataFrame(values, index=handle.index, columns=handle.columns, copy=False)
+    try:
+        yield frame
+    finally:
+        del frame, values
+        try:
+            block.close()
+        except BufferError:
+            # A caller still holds a view; the mapping closes when it is collected.
+            pass
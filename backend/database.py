@@ -1,9 +1,16 @@
+import contextvars
 import datetime
 import os
+import random
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
-from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Text, create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import BigInteger, Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, String, Text, UniqueConstraint, create_engine, event, inspect, text
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+
+from metrics import DB_POOL_CONNECTIONS, DB_QUERY_SECONDS
 
 
 def _load_env_file() -> None:
@@ -28,16 +35,119 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is required for Neon PostgreSQL.")
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=300,
-    pool_pre_ping=True,
-)
+# Optional read replicas (comma-separated URLs). Read-only API queries are
+# spread across them; writes and the worker always use the primary.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+WORKER_DB_POOL_SIZE = int(os.getenv("WORKER_DB_POOL_SIZE", "2"))
+WORKER_DB_MAX_OVERFLOW = int(os.getenv("WORKER_DB_MAX_OVERFLOW", "3"))
+
+ENGINES = {}
+
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _discard_query_timer(context):
+    # after_cursor_execute never fires for a failed statement; drop its start time so the stack stays paired.
+    started = context.connection.info.get("query_started_at") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _create_engine(url: str, pool: str, pool_size: int, max_overflow: int):
+    new_engine = create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=30,
+        pool_recycle=300,
+        pool_pre_ping=True,
+    )
+
+    def record_query_duration(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started_at"].pop()
+        words = statement.split(None, 1)
+        operation = words[0].upper() if words else "UNKNOWN"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, operation=operation, pool=pool)
+
+    event.listen(new_engine, "before_cursor_execute", _start_query_timer)
+    event.listen(new_engine, "after_cursor_execute", record_query_duration)
+    event.listen(new_engine, "handle_error", _discard_query_timer)
+    ENGINES[pool] = new_engine
+    return new_engine
+
+
+# API requests and scheduler jobs get separate pools on the primary, so a
+# long ingestion or retention job cannot starve request handlers of connections.
+engine = _create_engine(DATABASE_URL, "api", DB_POOL_SIZE, DB_MAX_OVERFLOW)
+worker_engine = _create_engine(DATABASE_URL, "worker", WORKER_DB_POOL_SIZE, WORKER_DB_MAX_OVERFLOW)
+replica_engines = [
+    _create_engine(url, f"replica_{index}", DB_POOL_SIZE, DB_MAX_OVERFLOW)
+    for index, url in enumerate(DATABASE_REPLICA_URLS)
+]
+
+_pool_role = contextvars.ContextVar("db_pool_role", default="api")
+
+
+@contextmanager
+def use_worker_pool():
+    """Route every session opened in this block (and threads it starts via asyncio) to the worker pool."""
+    token = _pool_role.set("worker")
+    try:
+        yield
+    finally:
+        _pool_role.reset(token)
+
+
+def primary_engine():
+    return worker_engine if _pool_role.get() == "worker" else engine
+
+
+class RoutingSession(Session):
+    """Binds to the primary pool for the current role (API or worker)."""
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    def get_bind(self, mapper=None, clause=None, **kw):
+        return primary_engine()
+
+
+class ReadRoutingSession(RoutingSession):
+    """
+    Sends SELECTs to one replica (picked per session) and everything else to
+    the primary. After its first write the session stays on the primary so it
+    reads its own writes. Worker sessions never use replicas.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._replica = random.choice(replica_engines) if replica_engines else None
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self._wrote = True
+        if self._replica is None or self._wrote or _pool_role.get() == "worker":
+            return primary_engine()
+        return self._replica
+
+
+def _collect_pool_metrics(gauge):
+    for pool_name, pool_engine in ENGINES.items():
+        pool = pool_engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        gauge.set(pool.checkedout(), pool=pool_name, state="in_use")
+        gauge.set(pool.checkedin(), pool=pool_name, state="idle")
+        gauge.set(max(pool.overflow(), 0), pool=pool_name, state="overflow")
+
+
+DB_POOL_CONNECTIONS.collector = _collect_pool_metrics
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+# For read-only request paths that tolerate replica lag (feeds, recaps, listings).
+ReadSessionLocal = sessionmaker(class_=ReadRoutingSession, autocommit=False, autoflush=False)
 Base = declarative_base()
 
 
@@ -47,8 +157,9 @@ class NewsArticle(Base):
         Index("ix_news_related_stock_published_at", "related_stock", "published_at"),
     )
 
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    # No index on title: search uses LIKE '%q%', which a b-tree cannot serve.
+    title = Column(String)
     description = Column(Text)
     summary = Column(Text, nullable=True)
     source = Column(String)
@@ -59,7 +170,60 @@ class NewsArticle(Base):
     event_type = Column(String, nullable=True)
     market_impact = Column(String, nullable=True)
     ai_rationale = Column(Text, nullable=True)
-    related_stock = Column(String, default="Global", index=True)
+    # Covered by the (related_stock, published_at) index.
+    related_stock = Column(String, default="Global")
+    # Title SimHash stored as a signed 64-bit integer (see news_index.title_simhash).
+    title_fingerprint = Column(BigInteger, nullable=True)
+    # Set once ticker attribution ran, including articles that mention no ticker.
+    tickers_linked = Column(Boolean, nullable=False, default=False)
+
+
+class ArticleTicker(Base):
+    __tablename__ = "article_tickers"
+    __table_args__ = (
+        Index("ix_article_tickers_article_id", "article_id"),
+    )
+
+    symbol = Column(String, primary_key=True)
+    article_id = Column(Integer, ForeignKey("news_articles.id", ondelete="CASCADE"), primary_key=True)
+    # Lets the analytics mirror re-copy older articles that gain a ticker later.
+    linked_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+class ArticleTokenCounts(Base):
+    __tablename__ = "article_token_counts"
+
+    article_id = Column(Integer, ForeignKey("news_articles.id", ondelete="CASCADE"), primary_key=True)
+    published_at = Column(DateTime, index=True)
+    sentiment_label = Column(String)
+    related_stock = Column(String)
+    ticker_counts = Column(Text, default="{}")
+    keyword_counts = Column(Text, default="{}")
+
+
+class NewsDailySummary(Base):
+    """Archived articles, rolled up per first trading session, symbol, event type and sentiment."""
+
+    __tablename__ = "news_daily_summaries"
+
+    session_date = Column(Date, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    sentiment_label = Column(String, primary_key=True)
+    articles = Column(Integer, nullable=False, default=0)
+    sentiment_score_sum = Column(Float, nullable=False, default=0.0)
+
+
+class NewsFeedCheckpoint(Base):
+    """Last time each news feed made it through the whole ingestion pipeline, and when to poll it next."""
+
+    __tablename__ = "news_feed_checkpoints"
+
+    feed = Column(String, primary_key=True)
+    completed_at = Column(DateTime)
+    articles_inserted = Column(Integer, nullable=False, default=0)
+    poll_interval_seconds = Column(Integer, nullable=False)
+    next_poll_at = Column(DateTime, nullable=False, index=True)
 
 
 class Portfolio(Base):
@@ -72,6 +236,94 @@ class Portfolio(Base):
     total_invested = Column(Float, default=0.0)
 
 
+class Instrument(Base):
+    __tablename__ = "instruments"
+
+    symbol = Column(String, primary_key=True)
+    name = Column(String)
+    sector = Column(String, index=True)
+    shares_outstanding = Column(BigInteger)
+    market_cap = Column(Float)
+    last_price = Column(Float)
+    previous_close = Column(Float)
+    volume = Column(BigInteger)
+    profile_updated_at = Column(DateTime)
+    quote_updated_at = Column(DateTime)
+    # Consecutive failed profile fetches and when the next attempt is allowed.
+    profile_failures = Column(Integer, nullable=False, default=0)
+    profile_retry_at = Column(DateTime, nullable=True)
+
+
+class InstrumentPopularity(Base):
+    """Decaying view score per symbol, fed from detail/prediction request logs."""
+
+    __tablename__ = "instrument_popularity"
+
+    symbol = Column(String, primary_key=True)
+    score = Column(Float, nullable=False, default=0.0)
+    total_views = Column(Integer, nullable=False, default=0)
+    scored_at = Column(DateTime, nullable=False)
+    last_viewed_at = Column(DateTime)
+
+
+class Transaction(Base):
+    __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_symbol_executed_at", "symbol", "executed_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False)
+    side = Column(String, nullable=False)
+    shares = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+    executed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    invested_delta = Column(Float, default=0.0)
+    realized_pnl = Column(Float, default=0.0)
+
+
+class PriceBar(Base):
+    __tablename__ = "price_bars"
+    __table_args__ = (
+        UniqueConstraint("symbol", "date", name="uq_price_bars_symbol_date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String, nullable=False)
+    date = Column(Date, nullable=False, index=True)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(BigInteger)
+
+
+class PortfolioSnapshot(Base):
+    __tablename__ = "portfolio_snapshots"
+
+    date = Column(Date, primary_key=True)
+    market_value = Column(Float, default=0.0)
+    invested = Column(Float, default=0.0)
+    realized_pnl = Column(Float, default=0.0)
+    net_flow = Column(Float, default=0.0)
+
+
+class EventStudyResult(Base):
+    """Market-adjusted returns after news, per event type and horizon (trading days)."""
+
+    __tablename__ = "event_study_results"
+
+    event_type = Column(String, primary_key=True)
+    horizon = Column(Integer, primary_key=True)
+    events = Column(Integer, nullable=False)
+    mean_abnormal_return = Column(Float)
+    signed_abnormal_return = Column(Float)
+    t_stat = Column(Float)
+    hit_rate = Column(Float)
+    weight = Column(Float, nullable=False, default=0.0)
+    computed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
 class Review(Base):
     __tablename__ = "reviews"
 
@@ -82,5 +334,39 @@ class Review(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
 
 
+# Indexes removed from the models; create_all never drops them from an existing database.
+OBSOLETE_INDEXES = [
+    "ix_news_articles_id",
+    "ix_news_articles_title",
+    "ix_news_articles_related_stock",
+    "ix_news_published_at_title_fingerprint",
+]
+
+
+# Columns added to existing tables after their first release; create_all never alters a table.
+ADDED_COLUMNS = {
+    "news_articles": {
+        "title_fingerprint": "BIGINT",
+        "tickers_linked": "BOOLEAN NOT NULL DEFAULT FALSE",
+    },
+}
+
+
+def _add_missing_columns(conn):
+    inspector = inspect(conn)
+    for table_name, columns in ADDED_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        missing = [name for name in columns if name not in existing]
+        for name in missing:
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {columns[name]}"))
+        if missing:
+            for index in Base.metadata.tables[table_name].indexes:
+                index.create(conn, checkfirst=True)
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _add_missing_columns(conn)
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -0,0 +1,318 @@
+"""Event study: market-adjusted returns after stored news, per event type.
+
+Calibrates the weight the prediction endpoint gives each headline's sentiment.
+Runs weekly from the worker, or on demand:
+
+    python -m event_study
+"""
+
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from analytics_store import AnalyticsBusy, analytics_ready, attributed_events
+from compute import SharedFrameHandle, attach_frame, run_cpu_sync, share_frame
+from database import ArticleTicker, EventStudyResult, NewsArticle, NewsDailySummary, PriceBar, SessionLocal
+from portfolio_engine import load_close_matrix, sync_price_bars_sync
+
+
+HORIZONS = (1, 3, 5, 20)
+WEIGHT_HORIZON = 5
+ALL_EVENTS = "_all"
+
+# IDX closes at 16:00 WIB (09:00 UTC); later news first trades the next session.
+MARKET_CLOSE_UTC = timedelta(hours=9)
+# Weights reach +/-1 at |t| = 2, shrunk towards zero for thin event types.
+T_STAT_SCALE = 2.0
+SHRINKAGE_EVENTS = 30
+
+SENTIMENT_SIGNS = {"POSITIVE": 1, "NEGATIVE": -1}
+HISTORY_PERIODS = [(31, "1mo"), (93, "3mo"), (186, "6mo"), (366, "1y"), (731, "2y"), (1827, "5y")]
+
+_weights = {}
+_weights_lock = threading.Lock()
+
+
+def sentiment_sign(label, score):
+    """
+    Label direction scaled by the classifier's confidence, |sentiment_score|,
+    so a hedged headline counts for less than a clear one; a missing score
+    counts fully. Works on scalars and Series alike.
+    """
+    if isinstance(label, pd.Series):
+        confidence = pd.to_numeric(score, errors="coerce").abs().fillna(1.0).clip(upper=1.0)
+        return label.map(SENTIMENT_SIGNS).astype(float) * confidence
+    confidence = 1.0 if score is None or pd.isna(score) else min(abs(float(score)), 1.0)
+    return SENTIMENT_SIGNS.get(label, 0) * confidence
+
+
+def load_archived_events(db: Session, since: datetime | None = None, before: date | None = None):
+    """Expand archived daily summaries (sessions before ``before``, if given) back into one row per article, dated at its session."""
+    query = db.query(
+        NewsDailySummary.symbol,
+        NewsDailySummary.session_date,
+        NewsDailySummary.sentiment_label,
+        NewsDailySummary.event_type,
+        NewsDailySummary.articles,
+        NewsDailySummary.sentiment_score_sum,
+    ).filter(
+        NewsDailySummary.sentiment_label.in_(list(SENTIMENT_SIGNS)),
+        # Unattributed articles are archived under "Global"; live events only come from ticker links.
+        NewsDailySummary.symbol != "Global",
+    )
+    if since is not None:
+        query = query.filter(NewsDailySummary.session_date >= since.date())
+    if before is not None:
+        query = query.filter(NewsDailySummary.session_date < before)
+
+    rows = pd.DataFrame(
+        query.all(),
+        columns=["symbol", "published_at", "sentiment_label", "event_type", "articles", "sentiment_score_sum"],
+    )
+    # Midnight of the session date maps back to that session in event_day_indices.
+    rows["published_at"] = pd.to_datetime(rows["published_at"])
+    # Each archived article gets its group's mean score.
+    rows["sentiment_score"] = rows.pop("sentiment_score_sum") / rows["articles"]
+    return rows.loc[rows.index.repeat(rows.pop("articles"))].reset_index(drop=True)
+
+
+def _mirrored_events(db: Session, since: datetime | None):
+    """Events from the analytics mirror, which keeps archived articles; None when it is not usable."""
+    if not analytics_ready():
+        return None
+    try:
+        events, first = attributed_events(list(SENTIMENT_SIGNS), since)
+    except AnalyticsBusy:
+        return None
+    # Summaries only add the articles archived before the mirror's first sync.
+    return events, load_archived_events(db, since, before=first.date() if first is not None else None)
+
+
+def load_events(db: Session, since: datetime | None = None):
+    """
+    One row per (article, attributed symbol) with a directional sentiment
+    label, archived articles included; ``sign`` is the confidence-weighted
+    direction (see ``sentiment_sign``).
+    """
+    mirrored = _mirrored_events(db, since)
+    if mirrored is not None:
+        events, archived = mirrored
+    else:
+        query = (
+            db.query(
+                ArticleTicker.symbol,
+                NewsArticle.published_at,
+                NewsArticle.sentiment_label,
+                NewsArticle.sentiment_score,
+                NewsArticle.event_type,
+            )
+            .join(NewsArticle, NewsArticle.id == ArticleTicker.article_id)
+            .filter(NewsArticle.sentiment_label.in_(list(SENTIMENT_SIGNS)))
+        )
+        if since is not None:
+            query = query.filter(NewsArticle.published_at >= since)
+        events = pd.DataFrame(
+            query.all(), columns=["symbol", "published_at", "sentiment_label", "sentiment_score", "event_type"],
+        )
+        archived = load_archived_events(db, since)
+
+    events["published_at"] = pd.to_datetime(events["published_at"])
+    if not archived.empty:
+        events = pd.concat([archived, events], ignore_index=True)
+    events["sign"] = sentiment_sign(events["sentiment_label"], events["sentiment_score"])
+    events["event_type"] = events["event_type"].fillna("other").str.lower()
+    return events
+
+
+def session_days(published_at: pd.Series):
+    """Calendar day of the first session that could price each article in."""
+    return (published_at + (timedelta(days=1) - MARKET_CLOSE_UTC)).dt.normalize()
+
+
+def event_day_indices(calendar: pd.DatetimeIndex, published_at: pd.Series):
+    """Index of the first session that could price each article in."""
+    return np.searchsorted(calendar.values, session_days(published_at).values, side="left")
+
+
+def abnormal_returns(closes: pd.DataFrame, events: pd.DataFrame, horizons=HORIZONS):
+    """
+    Cumulative log return from the close before the event session through
+    ``h`` sessions, minus the equal-weighted return of all symbols in
+    ``closes`` over the same window. Shape (events, horizons); NaN where the
+    window falls outside the stored bars.
+    """
+    log_closes = np.log(closes.ffill().to_numpy(dtype=float))
+    market_daily = pd.DataFrame(log_closes).diff().mean(axis=1).fillna(0.0).to_numpy()
+    market_cum = np.cumsum(market_daily)
+
+    rows = len(closes)
+    columns = closes.columns.get_indexer(events["symbol"])
+    start = event_day_indices(closes.index, events["published_at"])
+    base = start - 1
+
+    result = np.full((len(events), len(horizons)), np.nan)
+    for k, horizon in enumerate(horizons):
+        end = start + horizon - 1
+        valid = (columns >= 0) & (base >= 0) & (end < rows)
+        b, e, c = base[valid], end[valid], columns[valid]
+        result[valid, k] = (log_closes[e, c] - log_closes[b, c]) - (market_cum[e] - market_cum[b])
+    return result
+
+
+def abnormal_returns_task(closes: SharedFrameHandle, events: pd.DataFrame, horizons=HORIZONS) -> np.ndarray:
+    """Compute-pool entry point: ``abnormal_returns`` over a close matrix in shared memory."""
+    with attach_frame(closes) as frame:
+        return abnormal_returns(frame, events, horizons)
+
+
+def summarize_events(events: pd.DataFrame, car: np.ndarray, horizons=HORIZONS):
+    """Per event type and horizon: counts, mean and sentiment-signed abnormal return, t-stat, hit rate, weight."""
+    long = pd.DataFrame({
+        "event_type": np.repeat(events["event_type"].to_numpy(), len(horizons)),
+        "horizon": np.tile(horizons, len(events)),
+        "car": car.reshape(-1),
+        "signed": (car * events["sign"].to_numpy()[:, None]).reshape(-1),
+    }).dropna(subset=["car"])
+    if long.empty:
+        return pd.DataFrame()
+
+    long = pd.concat([long, long.assign(event_type=ALL_EVENTS)], ignore_index=True)
+    long["hit"] = (long["signed"] > 0).astype(float)
+    summary = long.groupby(["event_type", "horizon"]).agg(
+        events=("car", "size"),
+        mean_abnormal_return=("car", "mean"),
+        signed_abnormal_return=("signed", "mean"),
+        signed_std=("signed", "std"),
+        hit_rate=("hit", "mean"),
+    ).reset_index()
+
+    standard_error = summary["signed_std"] / np.sqrt(summary["events"])
+    summary["t_stat"] = (summary["signed_abnormal_return"] / standard_error).where(standard_error > 0, 0.0)
+    shrink = summary["events"] / (summary["events"] + SHRINKAGE_EVENTS)
+    summary["weight"] = (summary["t_stat"] / T_STAT_SCALE).clip(-1.0, 1.0) * shrink
+    return summary.drop(columns="signed_std")
+
+
+def _history_period(start: date):
+    days = (date.today() - start).days
+    for limit, period in HISTORY_PERIODS:
+        if days <= limit:
+            return period
+    return HISTORY_PERIODS[-1][1]
+
+
+def ensure_price_bars(db: Session, symbols: list[str], start: date):
+    """Backfill bars from ``start`` for symbols lacking them; top up the rest with the last month."""
+    coverage = dict(
+        (symbol, (first, last))
+        for symbol, first, last in db.query(PriceBar.symbol, func.min(PriceBar.date), func.max(PriceBar.date))
+        .filter(PriceBar.symbol.in_(symbols))
+        .group_by(PriceBar.symbol)
+        .all()
+    )
+    stale_after = date.today() - timedelta(days=1)
+    backfill = [symbol for symbol in symbols if symbol not in coverage or coverage[symbol][0] > start]
+    top_up = [symbol for symbol in symbols if symbol in coverage and symbol not in backfill and coverage[symbol][1] < stale_after]
+
+    stored = 0
+    if backfill:
+        stored += sync_price_bars_sync(db, backfill, period=_history_period(start))
+    if top_up:
+        stored += sync_price_bars_sync(db, top_up, period="1mo")
+    return stored
+
+
+def store_results(db: Session, summary: pd.DataFrame):
+    db.query(EventStudyResult).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    db.add_all(
+        EventStudyResult(computed_at=now, **record)
+        for record in summary.astype(object).where(summary.notna(), None).to_dict(orient="records")
+    )
+    db.commit()
+
+
+def run_event_study(db: Session, since: datetime | None = None, sync_bars: bool = True):
+    events = load_events(db, since)
+    if events.empty:
+        return pd.DataFrame()
+
+    symbols = sorted(events["symbol"].unique())
+    start = events["published_at"].min().date() - timedelta(days=7)
+    if sync_bars:
+        ensure_price_bars(db, symbols, start)
+
+    closes = load_close_matrix(db, symbols, start, date.today())
+    if closes.empty:
+        return pd.DataFrame()
+
+    with share_frame(closes) as handle:
+        car = run_cpu_sync(abnormal_returns_task, handle, events[["symbol", "published_at"]])
+    summary = summarize_events(events, car)
+    if not summary.empty:
+        store_results(db, summary)
+    return summary
+
+
+def load_event_weights(db: Session | None = None):
+    """Cache the stored weights for the prediction endpoint; empty until the first study has run."""
+    global _weights
+    owns_session = db is None
+    db = db or SessionLocal()
+    try:
+        rows = (
+            db.query(EventStudyResult.event_type, EventStudyResult.weight)
+            .filter(EventStudyResult.horizon == WEIGHT_HORIZON)
+            .all()
+        )
+    finally:
+        if owns_session:
+            db.close()
+
+    with _weights_lock:
+        _weights = dict(rows)
+    return len(rows)
+
+
+def current_event_weights():
+    """Snapshot of the loaded weights, for handing to compute-pool tasks."""
+    return dict(_weights)
+
+
+def event_weight(event_type: str | None, weights: dict | None = None):
+    """Weight for one headline; 1.0 (a plain vote) until calibrated, the all-events weight for unseen types."""
+    weights = _weights if weights is None else weights
+    if not weights:
+        return 1.0
+    return weights.get((event_type or "").lower(), weights.get(ALL_EVENTS, 1.0))
+
+
+def run_event_study_sync():
+    db = SessionLocal()
+    try:
+        summary = run_event_study(db)
+        load_event_weights(db)
+        return len(summary)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    from database import init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        result = run_event_study(db)
+    finally:
+        db.close()
+
+    if result.empty:
+        print("No events with stored prices to study.")
+    else:
+        with pd.option_context("display.width", 160, "display.max_rows", 200):
+            print(result.sort_values(["horizon", "events"], ascending=[True, False]).to_string(index=False))
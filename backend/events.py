@@ -0,0 +1,81 @@
+import asyncio
+import json
+import threading
+
+
+STREAM_QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, symbols: set, news: bool, queue_size: int):
+        self.symbols = symbols
+        self.news = news
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def wants(self, event: str, symbols: frozenset):
+        if event == "news":
+            # Articles that mention no listed ticker go to every news subscriber.
+            return self.news and (not symbols or not self.symbols or not self.symbols.isdisjoint(symbols))
+        return not self.symbols.isdisjoint(symbols)
+
+    def offer(self, message: str):
+        """Enqueue without blocking the publisher; a slow client loses its oldest events first."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class EventBroker:
+    """
+    In-process pub/sub that fans one upstream refresh out to every SSE client.
+    Publishers may run on worker threads; delivery always happens on the event loop.
+    """
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self, symbols: set, news: bool = True):
+        subscription = Subscription(symbols, news, self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscribed_symbols(self):
+        with self._lock:
+            return set().union(*(subscription.symbols for subscription in self._subscriptions))
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscriptions)
+
+    def publish(self, event: str, data: dict, symbol: str | None = None, symbols=()):
+        """Deliver once to each subscriber of ``symbol`` or any of ``symbols``."""
+        if self._loop is None or self._loop.is_closed() or not self.has_subscribers():
+            return
+
+        targets = frozenset(symbols) | ({symbol} if symbol else frozenset())
+        message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+        self._loop.call_soon_threadsafe(self._dispatch, event, targets, message)
+
+    def _dispatch(self, event: str, symbols: frozenset, message: str):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            if subscription.wants(event, symbols):
+                subscription.offer(message)
+
+
+broker = EventBroker()
@@ -0,0 +1,251 @@
+"""Staged news ingestion: fetch -> parse -> score -> enrich -> persist.
+
+Each stage runs its own workers and hands feeds to the next through a
+bounded asyncio queue, so a cycle takes about as long as its slowest stage
+rather than the sum of all of them, and a full queue holds back the stages
+before it. A feed that fails in any stage is logged, counted and dropped;
+the other feeds carry on.
+
+Feeds are polled adaptively. ``news_feed_checkpoints`` keeps each feed's
+polling interval and next due time, written in the same transaction as its
+articles, so a restarted worker resumes where the last cycle stopped. The
+interval halves after a poll that saved BUSY_FEED_ARTICLES or more new
+articles and doubles after one that saved none (or failed), between
+MIN_POLL_INTERVAL and MAX_POLL_INTERVAL. Outside IDX trading hours no feed
+is polled more often than OFF_HOURS_MIN_INTERVAL, and all polls share
+NEWS_POLL_BUDGET_PER_HOUR, most overdue feed first.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from compute import COMPUTE_WORKERS, run_cpu
+from database import NewsFeedCheckpoint, SessionLocal
+from market_data import in_trading_hours
+from metrics import INGESTION_FEEDS, INGESTION_STAGE_SECONDS
+from news_service import announce_articles, enrich_articles_with_ai, fetch_news_feed, parse_news_feed, score_articles, stage_articles
+
+
+QUEUE_SIZE = 4
+
+DEFAULT_POLL_INTERVAL = 15 * 60
+MIN_POLL_INTERVAL = 3 * 60
+MAX_POLL_INTERVAL = 2 * 3600
+OFF_HOURS_MIN_INTERVAL = 3600
+BUSY_FEED_ARTICLES = 2
+NEWS_POLL_BUDGET_PER_HOUR = int(os.getenv("NEWS_POLL_BUDGET_PER_HOUR", "60"))
+
+_recent_polls = deque()
+_recent_polls_lock = threading.Lock()
+
+
+@dataclass
+class FeedJob:
+    feed: str  # "Global" or a symbol; saved articles are related to it
+    query: str
+    limit: int
+    poll_interval: int = DEFAULT_POLL_INTERVAL
+    content: bytes = b""
+    articles: list = field(default_factory=list)
+    inserted: int = 0
+
+
+async def _fetch(job: FeedJob):
+    job.content = await fetch_news_feed(job.query)
+    return job
+
+
+async def _parse(job: FeedJob):
+    job.articles = await asyncio.to_thread(parse_news_feed, job.content, job.limit)
+    job.content = b""
+    return job
+
+
+async def _score(job: FeedJob):
+    if job.articles:
+        job.articles = await run_cpu(score_articles, job.articles)
+    return job
+
+
+async def _enrich(job: FeedJob):
+    job.articles = await enrich_articles_with_ai(job.articles)
+    return job
+
+
+def next_poll_interval(current: int, inserted: int):
+    """Halve a busy feed's interval, double an idle (or failing) one's, keep the rest."""
+    if inserted >= BUSY_FEED_ARTICLES:
+        return max(MIN_POLL_INTERVAL, current // 2)
+    if inserted == 0:
+        return min(MAX_POLL_INTERVAL, current * 2)
+    return current
+
+
+def next_poll_at(now: datetime, interval: int):
+    if not in_trading_hours(now):
+        interval = max(interval, OFF_HOURS_MIN_INTERVAL)
+    return now + timedelta(seconds=interval)
+
+
+def _checkpoint(job: FeedJob, now: datetime, inserted: int = 0, completed: bool = True):
+    interval = next_poll_interval(job.poll_interval, inserted)
+    values = {
+        "feed": job.feed,
+        "poll_interval_seconds": interval,
+        "next_poll_at": next_poll_at(now, interval),
+    }
+    if completed:
+        values.update(completed_at=now, articles_inserted=inserted)
+    return values
+
+
+def _persist_sync(job: FeedJob):
+    """Commit the feed's new articles and its checkpoint together, so a crash cannot leave one without the other."""
+    db = SessionLocal()
+    try:
+        try:
+            rows = stage_articles(db, job.articles, job.feed)
+        except IntegrityError:
+            # A concurrent writer stored some of these links first; the next poll picks up the rest.
+            db.rollback()
+            rows = []
+        db.merge(NewsFeedCheckpoint(**_checkpoint(job, datetime.utcnow(), len(rows))))
+        db.commit()
+        announce_articles(rows, job.feed)
+        return len(rows)
+    finally:
+        db.close()
+
+
+async def _persist(job: FeedJob):
+    job.inserted = await asyncio.to_thread(_persist_sync, job)
+    return job
+
+
+# (name, handler, concurrent workers). One persist worker keeps the
+# near-duplicate title check from racing between feeds.
+STAGES = [
+    ("fetch", _fetch, 4),
+    ("parse", _parse, 2),
+    ("score", _score, max(COMPUTE_WORKERS, 1)),
+    ("enrich", _enrich, 2),
+    ("persist", _persist, 1),
+]
+
+
+async def run_pipeline(jobs: list, stages: list = STAGES, queue_size: int = QUEUE_SIZE):
+    """Stream ``jobs`` through ``stages``; returns (completed jobs, [(job, stage, error)])."""
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+    completed, failed = [], []
+
+    async def work(index: int):
+        name, handler, _ = stages[index]
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        while True:
+            job = await inbox.get()
+            try:
+                with INGESTION_STAGE_SECONDS.time(stage=name):
+                    job = await handler(job)
+            except Exception as e:
+                INGESTION_FEEDS.inc(stage=name, result="error")
+                print(f"News ingestion: {job.feed} failed at {name}: {e}")
+                failed.append((job, name, str(e)))
+            else:
+                INGESTION_FEEDS.inc(stage=name, result="ok")
+                if outbox is None:
+                    completed.append(job)
+                else:
+                    await outbox.put(job)
+            finally:
+                inbox.task_done()
+
+    workers = [
+        [asyncio.create_task(work(index)) for _ in range(concurrency)]
+        for index, (_, _, concurrency) in enumerate(stages)
+    ]
+    try:
+        for job in jobs:
+            await queues[0].put(job)
+        # A stage's queue drains only after its workers forwarded every job,
+        # so joining the queues in order waits for the whole stream.
+        for queue, stage_workers in zip(queues, workers):
+            await queue.join()
+            for task in stage_workers:
+                task.cancel()
+    finally:
+        tasks = [task for stage_workers in workers for task in stage_workers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return completed, failed
+
+
+def _load_schedule_sync(feeds: list[str]):
+    db = SessionLocal()
+    try:
+        return {
+            row.feed: (row.poll_interval_seconds, row.next_poll_at)
+            for row in db.query(NewsFeedCheckpoint).filter(NewsFeedCheckpoint.feed.in_(feeds))
+        }
+    finally:
+        db.close()
+
+
+def _reschedule_failed_sync(jobs: list[FeedJob]):
+    """Back failed feeds off like idle ones, so a broken query is not retried every tick."""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        for job in jobs:
+            db.merge(NewsFeedCheckpoint(**_checkpoint(job, now, completed=False)))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _take_poll_budget(wanted: int):
+    """Reserve up to ``wanted`` polls from the rolling hourly budget; returns how many were granted."""
+    now = time.monotonic()
+    with _recent_polls_lock:
+        while _recent_polls and now - _recent_polls[0] > 3600:
+            _recent_polls.popleft()
+        granted = max(0, min(wanted, NEWS_POLL_BUDGET_PER_HOUR - len(_recent_polls)))
+        _recent_polls.extend([now] * granted)
+        return granted
+
+
+def due_feeds(jobs: list[FeedJob], schedule: dict, now: datetime):
+    """Feeds whose next poll has come (never-polled feeds first, then most overdue), with their intervals set."""
+    due = []
+    for job in jobs:
+        interval, next_at = schedule.get(job.feed, (DEFAULT_POLL_INTERVAL, None))
+        job.poll_interval = interval
+        if next_at is None or next_at <= now:
+            due.append((next_at or datetime.min, job))
+    due.sort(key=lambda entry: entry[0])
+    return [job for _, job in due]
+
+
+async def ingest_news(jobs: list[FeedJob]):
+    """Poll the due feeds among ``jobs`` through the pipeline and reschedule them."""
+    schedule = await asyncio.to_thread(_load_schedule_sync, [job.feed for job in jobs])
+    due = due_feeds(jobs, schedule, datetime.utcnow())
+    pending = due[:_take_poll_budget(len(due))]
+    completed, failed = await run_pipeline(pending)
+    if failed:
+        await asyncio.to_thread(_reschedule_failed_sync, [job for job, _, _ in failed])
+    return {
+        "inserted": sum(job.inserted for job in completed),
+        "completed": len(completed),
+        "failed": len(failed),
+        "deferred": len(due) - len(pending),
+    }
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import time
 from collections import defaultdict, deque
@@ -5,12 +6,18 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 
+from compute import shutdown_compute_pool, start_compute_pool
 from database import init_db
+from event_study import load_event_weights
+from events import broker
+from metrics import HTTP_REQUEST_SECONDS, render_metrics
 from news_service import load_ai_model
-from routers import analysis, news, portfolio, reviews, stocks
-from worker import start_scheduler
+from resilience import provider_status, request_deadline
+from routers import analysis, news, portfolio, reviews, stocks, stream
+from snapshots import restore_snapshot
+from worker import seed_known_symbols, snapshot_caches, start_scheduler
 
 
 RATE_WINDOW_SECONDS = 60
@@ -22,18 +29,34 @@ _rate_limit_hits = defaultdict(deque)
 async def lifespan(app: FastAPI):
     print("Starting AI Background Worker...")
     init_db()
-    load_ai_model()
+    seed_known_symbols()
+    if not start_compute_pool():
+        # Sentiment inference runs in the pool workers, which load the model themselves.
+        load_ai_model()
+    load_event_weights()
+    restore_snapshot()
+    broker.bind_loop(asyncio.get_running_loop())
     scheduler = start_scheduler()
     try:
         yield
     finally:
         scheduler.shutdown(wait=False)
+        snapshot_caches()
+        shutdown_compute_pool()
         print("Shutting down...")
 
 
 app = FastAPI(title="IndoStockSentiment API", version="1.0.0", lifespan=lifespan)
 
 
+@app.middleware("http")
+async def deadline_middleware(request: Request, call_next):
+    # Upstream calls made while serving the request (including from
+    # asyncio.to_thread) share one time budget instead of each taking its own timeout.
+    with request_deadline():
+        return await call_next(request)
+
+
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
     client_ip = request.client.host if request.client else "unknown"
@@ -53,6 +76,25 @@ async def rate_limit_middleware(request: Request, call_next):
     return await call_next(request)
 
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so /api/stocks/{symbol} is one series, not one per ticker.
+        route_path = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route_path,
+            status=status,
+        )
+
+
 allowed_origins = [
     origin.strip()
     for origin in os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
@@ -73,11 +115,22 @@ async def root():
     return {"message": "Welcome to IndoStockSentiment API", "status": "active"}
 
 
+@app.get("/api/status/upstreams")
+async def upstream_status():
+    return provider_status()
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(stocks.router)
 app.include_router(news.router)
 app.include_router(analysis.router)
 app.include_router(portfolio.router)
 app.include_router(reviews.router)
+app.include_router(stream.router)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,587 @@
+"""Market-data facade: the one module that talks to yfinance.
+
+Routers, the universe refresh, the portfolio engine and the worker ask for
+typed records by symbol (``Quote``, ``Fundamentals``, ``Holder``, price
+history as a ``BarWindow``) and all get the same behaviour: every upstream
+call goes through the provider guard, per-symbol data is cached with a TTL
+that matches how often it changes, identical calls already in flight are
+shared instead of repeated, and when the provider is down callers get the
+last cached value or what the worker stored (instrument quotes, daily bars).
+Daily history for IDX stocks is read from the in-process price store when
+it already holds every settled session of the requested span, and bars
+fetched upstream extend it.
+
+Symbols are IDX codes ("BBCA"); full tickers ("BBCA.JK", "^JKSE") pass
+through unchanged. Each ``*_sync`` method has an async twin for handlers.
+"""
+
+import asyncio
+import math
+import threading
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from cache import TTLCache
+from metrics import CACHE_REQUESTS, MARKET_DATA_SHARED_CALLS
+from price_store import BarWindow, day_number, loaded_price_store
+from resilience import call_budget_spent, call_remaining_time, upstream_call
+
+try:
+    from curl_cffi.requests import Session as _HttpSession
+
+    _SESSION_OPTIONS = {"impersonate": "chrome"}
+except ImportError:
+    from requests import Session as _HttpSession
+
+    _SESSION_OPTIONS = {}
+
+
+# Some IDX issuers report in USD while trading in IDR.
+USD_IDR_RATE = 16500
+HOLDERS_LIMIT = 10
+# Calendar days covered by each yfinance period, for reads from the price store.
+PERIOD_DAYS = {"5d": 7, "1mo": 31, "3mo": 93, "6mo": 186, "1y": 366, "2y": 731, "5y": 1827}
+# IDX sessions run 09:00-16:00 WIB on weekdays.
+TRADING_HOURS_UTC = (2, 9)
+# A stored span may start this many days after the period does (weekends, holidays).
+STORE_SPAN_SLACK_DAYS = 7
+
+_info_cache = TTLCache("stock_info", ttl_seconds=300, persist=True)
+_quote_cache = TTLCache("quote", ttl_seconds=15, persist=True)
+_last_price_cache = TTLCache("last_price", ttl_seconds=15, max_entries=2048, persist=True)
+_history_cache = TTLCache("price_history", ttl_seconds=300, persist=True)
+_fundamentals_cache = TTLCache("fundamentals", ttl_seconds=6 * 3600, persist=True)
+_holders_cache = TTLCache("holders", ttl_seconds=24 * 3600, persist=True)
+
+
+class _DeadlineSession(_HttpSession):
+    """
+    yfinance sends every request with its own 30 s timeout and takes no timeout
+    for info, fast_info or holders. Each request made inside an ``upstream_call``
+    is capped at what is left of that call's budget instead.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        remaining = call_remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise call_budget_spent(f"{method} {url}")
+            timeout = kwargs.get("timeout")
+            kwargs["timeout"] = remaining if timeout is None else min(timeout, remaining)
+        return super().request(method, url, *args, **kwargs)
+
+
+_session = _DeadlineSession(**_SESSION_OPTIONS)
+
+
+def _ticker(ticker: str):
+    return yf.Ticker(ticker, session=_session)
+
+
+def to_ticker(symbol: str):
+    symbol = symbol.strip().upper()
+    return symbol if "." in symbol or symbol.startswith("^") else f"{symbol}.JK"
+
+
+def _finite(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) or math.isinf(value) else value
+
+
+def _safe_int(value, default=0):
+    value = _finite(value)
+    return default if value is None else int(value)
+
+
+@dataclass(frozen=True, slots=True)
+class Quote:
+    symbol: str
+    price: float | None
+    previous_close: float | None
+    open: float | None = None
+    day_high: float | None = None
+    day_low: float | None = None
+    volume: int = 0
+    year_high: float | None = None
+    year_low: float | None = None
+    currency: str | None = None
+    # Served from the instruments table because the provider was unavailable.
+    stale: bool = False
+
+    @property
+    def change(self):
+        return self.price - self.previous_close if self.price and self.previous_close else 0
+
+    @property
+    def change_pct(self):
+        return (self.change / self.previous_close) * 100 if self.previous_close else 0
+
+
+@dataclass(frozen=True, slots=True)
+class Fundamentals:
+    symbol: str
+    name: str | None = None
+    sector: str | None = None
+    industry: str | None = None
+    price: float | None = None
+    previous_close: float | None = None
+    volume: int | None = None
+    market_cap: float | None = None
+    pe_ratio: float | None = None
+    pbv_ratio: float | None = None
+    roe: float | None = None
+    dividend_yield: float | None = None
+    revenue: float | None = None
+    net_income: float | None = None
+    book_value: float | None = None
+    shares_outstanding: int | None = None
+    float_shares: int | None = None
+    enterprise_value: float | None = None
+    ebitda: float | None = None
+    average_volume: int | None = None
+    beta: float | None = None
+    ipo_date: int | None = None
+    website: str | None = None
+    description: str | None = None
+    officers: list = field(default_factory=list)
+    # The provider's raw profile, for scoring rules and clients that read it directly.
+    info: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True)
+class Holder:
+    name: str
+    shares: int
+    date: str
+    type: str
+
+
+class _InFlight:
+    """Concurrent callers asking for the same key share one upstream call."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, method: str, func, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            MARKET_DATA_SHARED_CALLS.inc(method=method)
+            return future.result()
+
+        try:
+            result = func(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+def _load_info_sync(ticker: str):
+    with upstream_call("yfinance", "info"):
+        return _ticker(ticker).info or {}
+
+
+def _load_quote_sync(ticker: str):
+    fast_info = _ticker(ticker).fast_info
+    with upstream_call("yfinance", "fast_info"):
+        return asdict(Quote(
+            symbol=ticker.replace(".JK", ""),
+            price=_finite(fast_info.get("lastPrice")),
+            previous_close=_finite(fast_info.get("previousClose")),
+            open=_finite(fast_info.get("open")),
+            day_high=_finite(fast_info.get("dayHigh")),
+            day_low=_finite(fast_info.get("dayLow")),
+            volume=_safe_int(fast_info.get("lastVolume")),
+            year_high=_finite(fast_info.get("yearHigh")),
+            year_low=_finite(fast_info.get("yearLow")),
+            currency=fast_info.get("currency"),
+        ))
+
+
+def _stored_quote(ticker: str):
+    from universe import load_instrument_frame
+
+    frame = load_instrument_frame()
+    rows = frame[frame["symbol"] == ticker.replace(".JK", "")]
+    if rows.empty or pd.isna(rows["last_price"].iloc[0]):
+        return None
+
+    row = rows.iloc[0]
+    return Quote(
+        symbol=row["symbol"],
+        price=float(row["last_price"]),
+        previous_close=_finite(row["previous_close"]),
+        volume=_safe_int(row["volume"]),
+        stale=True,
+    )
+
+
+def _window_record(bars: BarWindow):
+    return {name: getattr(bars, name).tolist() for name in ("day", "open", "high", "low", "close", "volume")}
+
+
+def _window_from_record(record: dict):
+    return BarWindow(
+        day=np.asarray(record["day"], dtype=np.int32),
+        open=np.asarray(record["open"], dtype=float),
+        high=np.asarray(record["high"], dtype=float),
+        low=np.asarray(record["low"], dtype=float),
+        close=np.asarray(record["close"], dtype=float),
+        volume=np.asarray(record["volume"], dtype=np.int64),
+    )
+
+
+def window_from_frame(hist: pd.DataFrame):
+    """A ``yf.Ticker.history``-shaped frame as a BarWindow, dated by the exchange's local day."""
+    if hist.empty:
+        return _window_from_record({name: [] for name in ("day", "open", "high", "low", "close", "volume")})
+    index = hist.index.tz_localize(None) if getattr(hist.index, "tz", None) is not None else hist.index
+    return BarWindow(
+        day=day_number(index.to_numpy()),
+        open=hist["Open"].to_numpy(dtype=float),
+        high=hist["High"].to_numpy(dtype=float),
+        low=hist["Low"].to_numpy(dtype=float),
+        close=hist["Close"].to_numpy(dtype=float),
+        volume=hist["Volume"].fillna(0).to_numpy(dtype=np.int64),
+    )
+
+
+def in_trading_hours(now: datetime):
+    return now.weekday() < 5 and TRADING_HOURS_UTC[0] <= now.hour < TRADING_HOURS_UTC[1]
+
+
+def settled_session_day(now: datetime):
+    """The last weekday whose session has closed, as of ``now`` (UTC); exchange holidays are not known."""
+    day = now.date() if now.hour >= TRADING_HOURS_UTC[1] else now.date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def _stored_history(store, symbol: str, since: date, now: datetime):
+    """The store's window when it covers ``since`` through the last settled session, else None."""
+    span = store.span(symbol)
+    if span is None or in_trading_hours(now):
+        return None
+    first, last = span
+    if first > since + timedelta(days=STORE_SPAN_SLACK_DAYS) or last < settled_session_day(now):
+        return None
+    return store.window(symbol, since)
+
+
+def _extend_store(store, symbol: str, bars: BarWindow, now: datetime):
+    """Add fetched settled bars from outside the store's span (today's bar is still moving during a session)."""
+    keep = bars.day <= day_number(settled_session_day(now))
+    span = store.span(symbol)
+    if span is not None:
+        keep &= (bars.day < day_number(span[0])) | (bars.day > day_number(span[1]))
+    if not keep.any():
+        return
+    store.upsert(symbol, pd.DataFrame({
+        "date": bars.dates[keep],
+        "open": bars.open[keep],
+        "high": bars.high[keep],
+        "low": bars.low[keep],
+        "close": bars.close[keep],
+        "volume": bars.volume[keep],
+    }))
+
+
+def _load_history_sync(ticker: str, period: str):
+    with upstream_call("yfinance", "history") as timeout:
+        # Unadjusted, like the bulk download: both feed price_bars and the price store.
+        hist = _ticker(ticker).history(period=period, timeout=timeout, auto_adjust=False)
+    return _window_record(window_from_frame(hist))
+
+
+def _local_amount(info: dict, value):
+    """Convert a USD-reported amount for an IDR-quoted stock, as the rest of the profile is in IDR."""
+    if value is None:
+        return None
+    if info.get("currency") == "IDR" and info.get("financialCurrency") == "USD":
+        return value * USD_IDR_RATE
+    return value
+
+
+def _fundamentals_from_info(ticker: str, info: dict, **overrides):
+    values = dict(
+        symbol=ticker.replace(".JK", ""),
+        name=info.get("longName"),
+        sector=info.get("sector"),
+        industry=info.get("industry"),
+        price=info.get("currentPrice") or info.get("regularMarketPrice"),
+        previous_close=info.get("previousClose") or info.get("regularMarketPreviousClose"),
+        volume=info.get("volume"),
+        market_cap=info.get("marketCap"),
+        pe_ratio=info.get("trailingPE"),
+        pbv_ratio=info.get("priceToBook"),
+        roe=info.get("returnOnEquity"),
+        dividend_yield=info.get("dividendYield"),
+        revenue=info.get("totalRevenue"),
+        net_income=info.get("netIncomeToCommon"),
+        book_value=_local_amount(info, info.get("bookValue")),
+        shares_outstanding=info.get("sharesOutstanding"),
+        float_shares=info.get("floatShares"),
+        enterprise_value=_local_amount(info, info.get("enterpriseValue")),
+        ebitda=_local_amount(info, info.get("ebitda")),
+        average_volume=info.get("averageVolume"),
+        beta=info.get("beta"),
+        ipo_date=info.get("firstTradeDateEpochUtc"),
+        website=info.get("website"),
+        description=info.get("longBusinessSummary"),
+        officers=info.get("companyOfficers", []),
+        info=info,
+    )
+    values.update(overrides)
+    return Fundamentals(**values)
+
+
+def _statement_ebitda(stock):
+    with upstream_call("yfinance", "income_stmt"):
+        stmt = stock.income_stmt
+    if stmt.empty:
+        return None
+    if "EBITDA" in stmt.index:
+        return stmt.loc["EBITDA"].iloc[0]
+    if "Normalized EBITDA" in stmt.index:
+        return stmt.loc["Normalized EBITDA"].iloc[0]
+    if "Pretax Income" in stmt.index:
+        pretax = stmt.loc["Pretax Income"].iloc[0]
+        interest = stmt.loc["Interest Expense"].iloc[0] if "Interest Expense" in stmt.index else 0
+        depreciation = stmt.loc["Reconciled Depreciation"].iloc[0] if "Reconciled Depreciation" in stmt.index else 0
+        return pretax + interest + depreciation
+    return None
+
+
+def _load_complete_fundamentals_sync(ticker: str, info: dict):
+    """The profile with gaps (EBITDA, share count) filled from the income statement and fast_info."""
+    stock = _ticker(ticker)
+    overrides = {}
+    if info.get("ebitda") is None:
+        try:
+            overrides["ebitda"] = _local_amount(info, _finite(_statement_ebitda(stock)))
+        except Exception:
+            pass
+    if not info.get("sharesOutstanding"):
+        try:
+            with upstream_call("yfinance", "fast_info"):
+                overrides["shares_outstanding"] = _safe_int(stock.fast_info["shares"], None)
+        except Exception:
+            pass
+    return asdict(_fundamentals_from_info(ticker, info, **overrides))
+
+
+def _holder_rows(frame, holder_type: str):
+    if frame is None or frame.empty:
+        return []
+    return [
+        asdict(Holder(
+            name=str(row.get("Holder", "Unknown")),
+            shares=_safe_int(row.get("Shares", 0)),
+            date=str(row.get("Date Reported", "")),
+            type=holder_type,
+        ))
+        for _, row in frame.iterrows()
+    ]
+
+
+def _load_holders_sync(ticker: str):
+    stock = _ticker(ticker)
+    with upstream_call("yfinance", "institutional_holders"):
+        institutions = stock.institutional_holders
+    with upstream_call("yfinance", "mutualfund_holders"):
+        funds = stock.mutualfund_holders
+    return (_holder_rows(institutions, "Institution") + _holder_rows(funds, "Mutual Fund"))[:HOLDERS_LIMIT]
+
+
+def _download_daily_sync(tickers: list[str], period: str):
+    with upstream_call("yfinance", "download") as timeout:
+        frame = yf.download(
+            tickers,
+            period=period,
+            interval="1d",
+            auto_adjust=False,
+            group_by="ticker",
+            threads=True,
+            progress=False,
+            timeout=timeout,
+            session=_session,
+        )
+    if frame is None or frame.empty:
+        return {}
+    if not isinstance(frame.columns, pd.MultiIndex):
+        return {tickers[0]: frame}
+    downloaded = set(frame.columns.get_level_values(0))
+    return {ticker: frame[ticker] for ticker in tickers if ticker in downloaded}
+
+
+class MarketData:
+    def __init__(self):
+        self._in_flight = _InFlight()
+
+    def info_sync(self, symbol: str):
+        ticker = to_ticker(symbol)
+        return _info_cache.get_or_load(ticker, lambda: _load_info_sync(ticker), serve_stale=True)
+
+    def quote_sync(self, symbol: str):
+        """Live quote, else the last cached one, else the worker's stored quote (``stale=True``)."""
+        ticker = to_ticker(symbol)
+        try:
+            return Quote(**_quote_cache.get_or_load(ticker, lambda: _load_quote_sync(ticker), serve_stale=True))
+        except Exception:
+            stored = _stored_quote(ticker)
+            if stored is None:
+                raise
+            return stored
+
+    def history_sync(self, symbol: str, period: str = "1mo"):
+        """
+        Daily bars for a yfinance period: from the price store when it covers
+        the span (IDX stocks outside trading hours), else upstream, falling
+        back to whatever the store has for that span.
+        """
+        ticker = to_ticker(symbol)
+        # Index levels are not whole rupiah, so only stocks go through the float32 store.
+        store = loaded_price_store() if ticker.endswith(".JK") else None
+        stored_symbol = ticker.replace(".JK", "")
+        now = datetime.now(timezone.utc)
+        since = now.date() - timedelta(days=PERIOD_DAYS.get(period, 31))
+        if store is not None and period in PERIOD_DAYS:
+            bars = _stored_history(store, stored_symbol, since, now)
+            if bars is not None:
+                return bars
+
+        try:
+            record = _history_cache.get_or_load(
+                f"{ticker}:{period}", lambda: _load_history_sync(ticker, period), serve_stale=True,
+            )
+        except Exception:
+            bars = store.window(stored_symbol, since) if store is not None else None
+            if not bars:
+                raise
+            return bars
+
+        bars = _window_from_record(record)
+        if store is not None:
+            _extend_store(store, stored_symbol, bars, now)
+        return bars
+
+    def fundamentals_sync(self, symbol: str, complete: bool = False):
+        """
+        Profile and valuation figures from the provider's info. ``complete``
+        also fills a missing EBITDA or share count from other endpoints
+        (extra upstream calls, so it is cached for hours).
+        """
+        ticker = to_ticker(symbol)
+        if not complete:
+            return _fundamentals_from_info(ticker, self.info_sync(ticker))
+        record = _fundamentals_cache.get_or_load(
+            ticker, lambda: _load_complete_fundamentals_sync(ticker, self.info_sync(ticker)), serve_stale=True,
+        )
+        return Fundamentals(**record)
+
+    def holders_sync(self, symbol: str):
+        ticker = to_ticker(symbol)
+        return [Holder(**row) for row in _holders_cache.get_or_load(ticker, lambda: _load_holders_sync(ticker), serve_stale=True)]
+
+    def daily_bars_sync(self, symbols: list[str], period: str = "1mo"):
+        """{symbol: yf-shaped daily bar frame} from one bulk download; symbols the provider lacks are absent."""
+        tickers = {to_ticker(symbol): symbol for symbol in dict.fromkeys(symbols)}
+        if not tickers:
+            return {}
+        frames = self._in_flight.run(
+            ("daily_bars", tuple(sorted(tickers)), period), "daily_bars",
+            _download_daily_sync, list(tickers), period,
+        )
+        return {tickers[ticker]: frame for ticker, frame in frames.items() if ticker in tickers}
+
+    def _stored_last_prices(self, symbols: list[str], prices: dict):
+        """Fill ``prices`` from stale quotes, then the instruments table."""
+        from universe import load_instrument_frame
+
+        frame = load_instrument_frame()
+        stored = frame.dropna(subset=["last_price"]).set_index("symbol")["last_price"] if not frame.empty else {}
+        for symbol in symbols:
+            ticker = to_ticker(symbol)
+            price = (_quote_cache.get_stale(ticker) or {}).get("price") or _last_price_cache.get_stale(ticker)
+            if not price:
+                price = stored.get(ticker.replace(".JK", ""))
+            if price:
+                prices[symbol] = float(price)
+        return prices
+
+    def quotes_bulk_sync(self, symbols: list[str]):
+        """
+        {symbol: last price}, reusing cached quotes and bulk-downloading the
+        rest; symbols the download misses get their last stored price.
+        """
+        prices = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            ticker = to_ticker(symbol)
+            price = (_quote_cache.get(ticker) or {}).get("price") or _last_price_cache.get(ticker)
+            if price:
+                prices[symbol] = price
+                CACHE_REQUESTS.inc(cache="last_price", result="hit")
+            else:
+                missing.append(symbol)
+                CACHE_REQUESTS.inc(cache="last_price", result="miss")
+
+        if not missing:
+            return prices
+
+        try:
+            frames = self.daily_bars_sync(missing, period="5d")
+        except Exception as e:
+            print(f"Bulk quote download failed, using stored prices: {e}")
+            frames = {}
+
+        for symbol, frame in frames.items():
+            closes = frame["Close"].dropna()
+            if closes.empty:
+                continue
+            price = float(closes.iloc[-1])
+            _last_price_cache.set(to_ticker(symbol), price)
+            prices[symbol] = price
+
+        unpriced = [symbol for symbol in missing if symbol not in prices]
+        if unpriced:
+            self._stored_last_prices(unpriced, prices)
+        return prices
+
+    async def quote(self, symbol: str):
+        return await asyncio.to_thread(self.quote_sync, symbol)
+
+    async def history(self, symbol: str, period: str = "1mo"):
+        return await asyncio.to_thread(self.history_sync, symbol, period)
+
+    async def fundamentals(self, symbol: str, complete: bool = False):
+        return await asyncio.to_thread(self.fundamentals_sync, symbol, complete)
+
+    async def holders(self, symbol: str):
+        return await asyncio.to_thread(self.holders_sync, symbol)
+
+    async def quotes_bulk(self, symbols: list[str]):
+        return await asyncio.to_thread(self.quotes_bulk_sync, symbols)
+
+
+market_data = MarketData()
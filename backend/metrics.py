@@ -0,0 +1,227 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+
+_registry = []
+_capture = threading.local()
+
+
+def _escape_label(value: str):
+    """Escape a label value as the Prometheus text format requires."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: str = ""):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _captured(metric, value: float, labels: dict):
+    observations = getattr(_capture, "observations", None)
+    if observations is None:
+        return False
+    observations.append((metric.name, value, labels))
+    return True
+
+
+@contextmanager
+def capture_observations():
+    """
+    Collect counter increments and histogram observations made on this thread
+    instead of recording them, so a compute worker process can hand them back
+    to the API process (see ``replay_observations``).
+    """
+    observations = []
+    _capture.observations = observations
+    try:
+        yield observations
+    finally:
+        _capture.observations = None
+
+
+def replay_observations(observations: list):
+    metrics = {metric.name: metric for metric in _registry}
+    for name, value, labels in observations:
+        metric = metrics[name]
+        if isinstance(metric, Histogram):
+            metric.observe(value, **labels)
+        else:
+            metric.inc(value, **labels)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        if _captured(self, amount, labels):
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        if _captured(self, value, labels):
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[key] = series
+
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {series['count']}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time values; ``collector(gauge)``, if set, refreshes them on every scrape."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.collector = None
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self.collector is not None:
+            self.collector(self)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "API request latency by route.", ("method", "route", "status"),
+)
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "upstream_request_duration_seconds", "Upstream call latency by provider and method.", ("provider", "method"),
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total", "Failed upstream calls by provider and method.", ("provider", "method"),
+)
+UPSTREAM_REJECTED = Counter(
+    "upstream_rejected_total", "Upstream calls short-circuited before reaching the provider.", ("provider", "reason"),
+)
+SENTIMENT_INFERENCE_SECONDS = Histogram(
+    "sentiment_inference_seconds", "Per-article sentiment scoring time.", ("engine",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Database statement latency by statement type and pool.", ("operation", "pool"),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connections per database pool by state (in_use, idle, overflow).", ("pool", "state"),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache name and result.", ("cache", "result"),
+)
+MARKET_DATA_SHARED_CALLS = Counter(
+    "market_data_shared_calls_total", "Market-data calls answered by an identical call already in flight.", ("method",),
+)
+WORKER_CYCLE_SECONDS = Histogram(
+    "worker_cycle_duration_seconds", "Background job duration.", ("job",),
+    buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+WORKER_ARTICLES_INSERTED = Counter(
+    "worker_articles_inserted_total", "Articles inserted by background jobs.", ("job",),
+)
+AI_ENRICHMENT_ARTICLES = Counter(
+    "ai_enrichment_articles_total", "Articles sent for LLM enrichment by outcome (enriched, retried, unenriched).", ("result",),
+)
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_duration_seconds", "Time one news feed spends in each ingestion stage.", ("stage",),
+)
+INGESTION_FEEDS = Counter(
+    "ingestion_feeds_total", "News feeds handled by each ingestion stage, by result.", ("stage", "result"),
+)
+
+
+@contextmanager
+def track_upstream(provider: str, method: str):
+    """Time one upstream call and count it as an error if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(provider=provider, method=method)
+        raise
+    finally:
+        UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - started, provider=provider, method=method)
+
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,169 @@
+import hashlib
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from database import ArticleTicker, NewsArticle
+from routers.stocks import POPULAR_TICKERS, SMALL_CAP_TICKERS
+
+
+# IDX codes are four uppercase letters; matching the raw-case text keeps
+# ordinary Indonesian words out of the candidate set.
+TICKER_TOKEN_RE = re.compile(r"\b[A-Z]{4}\b")
+TITLE_WORD_RE = re.compile(r"\w+")
+
+SIMHASH_BITS = 64
+SIMHASH_MASK = (1 << SIMHASH_BITS) - 1
+NEAR_DUPLICATE_DISTANCE = 3
+DUPLICATE_LOOKBACK = timedelta(days=3)
+
+_known_symbols = frozenset(ticker.replace(".JK", "") for ticker in POPULAR_TICKERS + SMALL_CAP_TICKERS)
+
+
+def known_symbols():
+    return _known_symbols
+
+
+def set_known_symbols(symbols):
+    global _known_symbols
+    _known_symbols = frozenset(symbols)
+
+
+def extract_tickers(*texts: str):
+    symbols = known_symbols()
+    found = set()
+    for text in texts:
+        if text:
+            found.update(token for token in TICKER_TOKEN_RE.findall(text) if token in symbols)
+    return found
+
+
+def title_simhash(title: str):
+    """64-bit SimHash over lower-cased title words; syndicated rewrites land within a few bits."""
+    weights = [0] * SIMHASH_BITS
+    for word in TITLE_WORD_RE.findall((title or "").lower()):
+        digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if digest >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def fingerprint_to_db(fingerprint: int):
+    """Fold an unsigned fingerprint into the signed range of a BIGINT column."""
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint >> (SIMHASH_BITS - 1) else fingerprint
+
+
+def fingerprint_from_db(value: int):
+    return value & SIMHASH_MASK
+
+
+def hamming_distance(left: int, right: int):
+    return (left ^ right).bit_count()
+
+
+class DuplicateIndex:
+    """Recent title fingerprints; ``match`` returns the article id of a near-duplicate, if any."""
+
+    def __init__(self, fingerprints: list[tuple[int, int]] | None = None):
+        self._fingerprints = list(fingerprints or [])
+
+    @classmethod
+    def load_recent(cls, db: Session, now: datetime | None = None):
+        """Fingerprints stored with articles published inside DUPLICATE_LOOKBACK."""
+        since = (now or datetime.utcnow()) - DUPLICATE_LOOKBACK
+        rows = (
+            db.query(NewsArticle.id, NewsArticle.title_fingerprint)
+            .filter(NewsArticle.published_at >= since, NewsArticle.title_fingerprint.is_not(None))
+            .all()
+        )
+        return cls([(article_id, fingerprint_from_db(value)) for article_id, value in rows])
+
+    def match(self, fingerprint: int):
+        for article_id, existing in self._fingerprints:
+            if hamming_distance(fingerprint, existing) <= NEAR_DUPLICATE_DISTANCE:
+                return article_id
+        return None
+
+    def add(self, article_id: int, fingerprint: int):
+        self._fingerprints.append((article_id, fingerprint))
+
+
+def link_article_tickers(db: Session, links: dict[int, set]):
+    """Insert missing (symbol, article_id) pairs; ``links`` maps article id to symbols."""
+    links = {article_id: symbols for article_id, symbols in links.items() if symbols}
+    if not links:
+        return 0
+
+    existing = set(
+        db.query(ArticleTicker.article_id, ArticleTicker.symbol)
+        .filter(ArticleTicker.article_id.in_(list(links)))
+        .all()
+    )
+    new_rows = [
+        ArticleTicker(article_id=article_id, symbol=symbol)
+        for article_id, symbols in links.items()
+        for symbol in symbols
+        if (article_id, symbol) not in existing
+    ]
+    db.add_all(new_rows)
+    return len(new_rows)
+
+
+def backfill_article_tickers(db: Session, batch_size: int = 1000):
+    """
+    Attribute tickers for articles saved before the association table existed.
+    Every scanned article is flagged ``tickers_linked``, so articles that name no
+    ticker are not scanned again on the next start.
+    """
+    total = 0
+    last_id = 0
+
+    while True:
+        rows = (
+            db.query(NewsArticle.id, NewsArticle.title, NewsArticle.description, NewsArticle.related_stock)
+            .filter(NewsArticle.id > last_id, NewsArticle.tickers_linked.is_(False))
+            .order_by(NewsArticle.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+
+        links = {}
+        for article_id, title, description, related_stock in rows:
+            symbols = extract_tickers(title, description)
+            if related_stock and related_stock != "Global":
+                symbols.add(related_stock)
+            links[article_id] = symbols
+
+        total += link_article_tickers(db, links)
+        db.query(NewsArticle).filter(NewsArticle.id.in_(list(links))).update(
+            {NewsArticle.tickers_linked: True}, synchronize_session=False
+        )
+        db.commit()
+        last_id = rows[-1][0]
+
+    return total
+
+
+def backfill_title_fingerprints(db: Session, now: datetime | None = None):
+    """Fingerprint recent articles saved before titles were fingerprinted on insert."""
+    since = (now or datetime.utcnow()) - DUPLICATE_LOOKBACK
+    rows = (
+        db.query(NewsArticle.id, NewsArticle.title)
+        .filter(NewsArticle.published_at >= since, NewsArticle.title_fingerprint.is_(None))
+        .all()
+    )
+    if rows:
+        db.bulk_update_mappings(NewsArticle, [
+            {"id": article_id, "title_fingerprint": fingerprint_to_db(title_simhash(title))}
+            for article_id, title in rows
+        ])
+        db.commit()
+    return len(rows)
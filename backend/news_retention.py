@@ -0,0 +1,132 @@
+"""Retention for ``news_articles``: roll old rows into daily summaries, then delete them.
+
+The feed, recaps and near-duplicate checks only look back days, so the hot
+table keeps NEWS_RETENTION_DAYS of full articles. Older articles survive as
+``NewsDailySummary`` rows (per session, symbol, event type and sentiment),
+which is all the event study and backtester read from them. Runs nightly
+from the worker, or on demand:
+
+    python -m news_retention
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import ArticleTicker, ArticleTokenCounts, NewsArticle, NewsDailySummary, SessionLocal, primary_engine
+from event_study import session_days
+
+
+NEWS_RETENTION_DAYS = int(os.getenv("NEWS_RETENTION_DAYS", "180"))
+# Small batches keep each transaction (and its row locks and WAL) short, so
+# the worker's inserts never wait on the purge.
+DELETE_BATCH_SIZE = 1000
+GLOBAL_SYMBOL = "Global"
+SUMMARY_KEYS = ["session_date", "symbol", "event_type", "sentiment_label"]
+VACUUM_TABLES = ["news_articles", "article_tickers", "article_token_counts"]
+
+
+def summarize_articles(db: Session, article_ids: list[int]):
+    """Daily summary rows for a batch of articles; articles with no attributed ticker count under "Global"."""
+    rows = (
+        db.query(
+            ArticleTicker.symbol,
+            NewsArticle.published_at,
+            NewsArticle.event_type,
+            NewsArticle.sentiment_label,
+            NewsArticle.sentiment_score,
+        )
+        .outerjoin(ArticleTicker, ArticleTicker.article_id == NewsArticle.id)
+        .filter(NewsArticle.id.in_(article_ids))
+        .all()
+    )
+    articles = pd.DataFrame(rows, columns=["symbol", "published_at", "event_type", "sentiment_label", "sentiment_score"])
+    if articles.empty:
+        return articles
+
+    articles["session_date"] = session_days(pd.to_datetime(articles["published_at"])).dt.date
+    articles["symbol"] = articles["symbol"].fillna(GLOBAL_SYMBOL)
+    articles["event_type"] = articles["event_type"].fillna("other").str.lower()
+    articles["sentiment_label"] = articles["sentiment_label"].fillna("NEUTRAL")
+    return articles.groupby(SUMMARY_KEYS).agg(
+        articles=("published_at", "size"),
+        sentiment_score_sum=("sentiment_score", "sum"),
+    ).reset_index()
+
+
+def merge_summaries(db: Session, summary: pd.DataFrame):
+    """Add a batch's counts onto the stored summaries (several batches can hit the same day)."""
+    existing = {
+        tuple(getattr(row, key) for key in SUMMARY_KEYS): row
+        for row in db.query(NewsDailySummary).filter(
+            NewsDailySummary.session_date.in_(summary["session_date"].unique().tolist()),
+            NewsDailySummary.symbol.in_(summary["symbol"].unique().tolist()),
+        )
+    }
+    for record in summary.to_dict(orient="records"):
+        row = existing.get(tuple(record[key] for key in SUMMARY_KEYS))
+        if row is None:
+            db.add(NewsDailySummary(**record))
+        else:
+            row.articles += int(record["articles"])
+            row.sentiment_score_sum += float(record["sentiment_score_sum"])
+
+
+def _vacuum():
+    # VACUUM cannot run inside a transaction; ANALYZE refreshes the planner's
+    # row estimates after a large delete.
+    engine = primary_engine()
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in VACUUM_TABLES:
+            conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+
+
+def archive_old_articles(db: Session, retention_days: int = NEWS_RETENTION_DAYS, batch_size: int = DELETE_BATCH_SIZE):
+    """Summarize and delete articles older than ``retention_days``, one committed batch at a time."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    archived = 0
+    while True:
+        article_ids = [
+            row[0]
+            for row in db.query(NewsArticle.id)
+            .filter(NewsArticle.published_at < cutoff)
+            .order_by(NewsArticle.id)
+            .limit(batch_size)
+            .all()
+        ]
+        if not article_ids:
+            break
+
+        summary = summarize_articles(db, article_ids)
+        if not summary.empty:
+            merge_summaries(db, summary)
+        # Dependents are deleted explicitly: SQLite does not enforce ON DELETE CASCADE by default.
+        db.query(ArticleTicker).filter(ArticleTicker.article_id.in_(article_ids)).delete(synchronize_session=False)
+        db.query(ArticleTokenCounts).filter(ArticleTokenCounts.article_id.in_(article_ids)).delete(synchronize_session=False)
+        db.query(NewsArticle).filter(NewsArticle.id.in_(article_ids)).delete(synchronize_session=False)
+        db.commit()
+        archived += len(article_ids)
+
+    if archived:
+        _vacuum()
+    return archived
+
+
+def archive_old_articles_sync():
+    db = SessionLocal()
+    try:
+        return archive_old_articles(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    from database import init_db
+
+    init_db()
+    print(f"Archived {archive_old_articles_sync()} articles older than {NEWS_RETENTION_DAYS} days.")
@@ -1,7 +1,10 @@
 import asyncio
+import html
+import io
 import json
 import os
 import re
+import time
 import xml.etree.ElementTree as ET
 from datetime import datetime
 
@@ -10,7 +13,13 @@ from dotenv import load_dotenv
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from compute import run_cpu
 from database import NewsArticle
+from events import broker
+from metrics import AI_ENRICHMENT_ARTICLES, SENTIMENT_INFERENCE_SECONDS
+from resilience import UpstreamUnavailable, async_upstream_call, upstream_call
+from news_index import DuplicateIndex, extract_tickers, fingerprint_to_db, link_article_tickers, title_simhash
+from recap import mark_articles_changed, store_article_tokens
 
 try:
     from litellm import completion
@@ -31,6 +40,10 @@ except ImportError:
 
 
 MODEL_NAME = "w11wo/indonesian-roberta-base-sentiment-classifier"
+ENRICH_CALL_TIMEOUT_SECONDS = 25
+# Whole-enrichment budget: the first call plus retries of what it missed.
+ENRICH_BUDGET_SECONDS = 40
+ENRICH_MAX_ROUNDS = 3
 tokenizer = None
 model = None
 
@@ -51,9 +64,10 @@ Use only the provided text. Do not invent ticker links or facts. Return structur
 STRICT JSON FORMAT:
 - Return exactly one valid JSON object, with no markdown fences and no extra text.
 - The root object must contain exactly one key: "articles".
-- "articles" must be an array with the same length and order as the input articles.
+- "articles" must be an array with one item per input article.
 - Each item in "articles" must contain exactly these keys:
-  sentiment_label, sentiment_score, summary, event_type, market_impact, ai_rationale.
+  id, sentiment_label, sentiment_score, summary, event_type, market_impact, ai_rationale.
+- id must be copied unchanged from the input article the item describes.
 - sentiment_label must be POSITIVE, NEUTRAL, or NEGATIVE.
 - sentiment_score must be a number between -1.0 and 1.0.
 - market_impact must be LOW, MEDIUM, or HIGH.
@@ -97,6 +111,19 @@ def load_ai_model():
 
 
 def analyze_sentiment_bert(text):
+    with SENTIMENT_INFERENCE_SECONDS.time(engine="keyword"):
+        keyword_result = _analyze_sentiment_keywords(text)
+    if keyword_result:
+        return keyword_result
+
+    if TRANSFORMERS_AVAILABLE and model:
+        with SENTIMENT_INFERENCE_SECONDS.time(engine="model"):
+            return _analyze_sentiment_model(text)
+
+    return {"label": "NEUTRAL", "score": 0.0}
+
+
+def _analyze_sentiment_keywords(text):
     text_lower = text.lower()
 
     for word in POSITIVE_KEYWORDS:
@@ -107,24 +134,27 @@ def analyze_sentiment_bert(text):
         if word in text_lower:
             return {"label": "NEGATIVE", "score": 0.95}
 
-    if TRANSFORMERS_AVAILABLE and model:
-        try:
-            result = model(text, truncation=True, max_length=512)[0]
-            top_label_str = str(result.get("label", "NEUTRAL")).upper()
-            confidence = float(result.get("score", 0.0))
+    return None
+
 
+def _analyze_sentiment_model(text):
+    try:
+        result = model(text, truncation=True, max_length=512)[0]
+        top_label_str = str(result.get("label", "NEUTRAL")).upper()
+        confidence = float(result.get("score", 0.0))
+
+        final_label = "NEUTRAL"
+        if "POSITIVE" in top_label_str or "LABEL_2" in top_label_str:
+            final_label = "POSITIVE"
+        elif "NEGATIVE" in top_label_str or "LABEL_0" in top_label_str:
+            final_label = "NEGATIVE"
+        elif "NEUTRAL" in top_label_str or "LABEL_1" in top_label_str:
             final_label = "NEUTRAL"
-            if "POSITIVE" in top_label_str or "LABEL_2" in top_label_str:
-                final_label = "POSITIVE"
-            elif "NEGATIVE" in top_label_str or "LABEL_0" in top_label_str:
-                final_label = "NEGATIVE"
-            elif "NEUTRAL" in top_label_str or "LABEL_1" in top_label_str:
-                final_label = "NEUTRAL"
-
-            sentiment_score = confidence if final_label == "POSITIVE" else -confidence if final_label == "NEGATIVE" else 0
-            return {"label": final_label, "score": sentiment_score}
-        except Exception as e:
-            print(f"AI Error: {e}")
+
+        sentiment_score = confidence if final_label == "POSITIVE" else -confidence if final_label == "NEGATIVE" else 0
+        return {"label": final_label, "score": sentiment_score}
+    except Exception as e:
+        print(f"AI Error: {e}")
 
     return {"label": "NEUTRAL", "score": 0.0}
 
@@ -188,19 +218,81 @@ def _parse_ai_json(text: str):
     raise ValueError("AI response does not contain an article array.")
 
 
-def _extract_litellm_content(response):
+def _salvage_ai_items(text: str):
+    """
+    Every complete JSON object in the response's article array, even when
+    the whole document does not parse (cut off mid-stream, one malformed
+    item). Items are flat objects, so each "{" after the array opens starts one.
+    """
     try:
-        return response.choices[0].message.content or ""
+        return _parse_ai_json(text)
+    except (ValueError, TypeError):
+        pass
+
+    text = _strip_json_fences(text)
+    start = text.find("[")
+    if start < 0:
+        return []
+
+    decoder = json.JSONDecoder()
+    items = []
+    position = text.find("{", start)
+    while position >= 0:
+        try:
+            item, end = decoder.raw_decode(text, position)
+        except ValueError:
+            end = position + 1
+        else:
+            items.append(item)
+        position = text.find("{", end)
+    return items
+
+
+def _enrichment_id(item):
+    try:
+        return int(item.get("id"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _valid_enrichment(item, wanted: set):
+    return (
+        isinstance(item, dict)
+        and _enrichment_id(item) in wanted
+        and str(item.get("sentiment_label") or "").upper() in {"POSITIVE", "NEUTRAL", "NEGATIVE"}
+    )
+
+
+def _extract_litellm_delta(chunk):
+    try:
+        return chunk.choices[0].delta.content or ""
     except (AttributeError, IndexError, TypeError):
         pass
 
     try:
-        return response["choices"][0]["message"]["content"] or ""
+        return chunk["choices"][0]["delta"]["content"] or ""
     except (KeyError, IndexError, TypeError):
         return ""
 
 
-def _call_litellm_completion(payload: list[dict]):
+def _close_stream(stream):
+    """Drop the connection behind a stream we stopped reading; LiteLLM's sync wrapper has no close() of its own."""
+    for target in (stream, getattr(stream, "completion_stream", None)):
+        close = getattr(target, "close", None)
+        if callable(close):
+            close()
+            return
+
+
+def _stream_litellm_completion(payload: list[dict], chunks: list[str], deadline: float):
+    """
+    Stream the completion into ``chunks`` so a caller that gives up early
+    still has the text so far. Past ``deadline`` (``time.monotonic()``) the
+    stream is closed, so the thread and its litellm slot are released
+    instead of reading on after the caller has left. That raises
+    UpstreamUnavailable when the caller's deadline came before the provider
+    timeout (the breaker ignores it), else TimeoutError.
+    """
     if completion is None:
         raise RuntimeError("LiteLLM is not available.")
 
@@ -210,107 +302,207 @@ def _call_litellm_completion(payload: list[dict]):
         f"{json.dumps({'articles': payload}, ensure_ascii=False)}"
     )
 
-    return completion(
-        model=_get_ai_model_name(),
-        messages=[
-            {"role": "system", "content": AI_SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.1,
-        response_format={"type": "json_object"},
-        timeout=20,
-        num_retries=1,
-        drop_params=True,
-    )
-
-
-async def enrich_articles_with_ai(articles: list[dict]) -> list[dict]:
-    if not articles or not LITELLM_AVAILABLE:
-        return articles
-
+    with upstream_call("litellm", "completion") as timeout:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise UpstreamUnavailable("litellm", "deadline exceeded")
+        cut_short = remaining < timeout
+        stream = completion(
+            model=_get_ai_model_name(),
+            messages=[
+                {"role": "system", "content": AI_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.1,
+            response_format={"type": "json_object"},
+            timeout=min(timeout, remaining),
+            num_retries=1,
+            drop_params=True,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                delta = _extract_litellm_delta(chunk)
+                if delta:
+                    chunks.append(delta)
+                if time.monotonic() >= deadline:
+                    if cut_short:
+                        raise UpstreamUnavailable("litellm", "deadline exceeded")
+                    raise TimeoutError(f"AI enrichment deadline passed after {len(chunks)} chunks.")
+        except BaseException:
+            _close_stream(stream)
+            raise
+    return "".join(chunks)
+
+
+async def _request_enrichment(articles: list[dict], ids: list[int], timeout: float):
+    """One LLM call for the articles at ``ids``; returns {id: item} for every item that validated."""
     payload = [
         {
-            "title": article.get("title", ""),
-            "description": article.get("description", ""),
-            "source": article.get("source", ""),
-            "published_at": article.get("published_at", ""),
+            "id": index,
+            "title": articles[index].get("title", ""),
+            "description": articles[index].get("description", ""),
+            "source": articles[index].get("source", ""),
+            "published_at": articles[index].get("published_at", ""),
         }
-        for article in articles
+        for index in ids
     ]
 
+    chunks = []
     try:
-        response = await asyncio.wait_for(
-            asyncio.to_thread(_call_litellm_completion, payload),
-            timeout=25,
-        )
-        content = _extract_litellm_content(response)
-        enriched_items = _parse_ai_json(content)
+        content = await asyncio.to_thread(_stream_litellm_completion, payload, chunks, time.monotonic() + timeout)
     except Exception as e:
-        print(f"AI enrichment failed: {e}")
-        return articles
+        content = "".join(chunks)
+        print(f"AI enrichment call failed after {len(content)} characters: {e!r}")
+
+    wanted = set(ids)
+    return {
+        _enrichment_id(item): item
+        for item in _salvage_ai_items(content)
+        if _valid_enrichment(item, wanted)
+    }
+
+
+def _merge_enrichment(article: dict, enriched: dict):
+    return {
+        **article,
+        "sentiment_label": _coerce_sentiment_label(enriched.get("sentiment_label")),
+        "sentiment_score": _coerce_sentiment_score(enriched.get("sentiment_score"), article.get("sentiment_score", 0.0)),
+        "summary": enriched.get("summary") or article.get("summary"),
+        "event_type": str(enriched.get("event_type") or "other").lower(),
+        "market_impact": _coerce_market_impact(enriched.get("market_impact")),
+        "ai_rationale": enriched.get("ai_rationale") or article.get("ai_rationale"),
+    }
+
 
-    if len(enriched_items) != len(articles):
-        print("AI enrichment returned a mismatched article count.")
+async def enrich_articles_with_ai(articles: list[dict]) -> list[dict]:
+    """
+    LLM labels for ``articles``. Every item that validates is kept, even from
+    a partial response; only the articles still missing are sent again, in
+    smaller batches, while the budget lasts. The rest keep their model scores.
+    """
+    if not articles or not LITELLM_AVAILABLE:
         return articles
 
-    enriched_articles = []
-    for article, enriched in zip(articles, enriched_items):
-        if not isinstance(enriched, dict):
-            enriched_articles.append(article)
+    enriched = {}
+    pending = list(range(len(articles)))
+    batch_size = len(pending)
+    deadline = time.monotonic() + ENRICH_BUDGET_SECONDS
+
+    for _ in range(ENRICH_MAX_ROUNDS):
+        remaining = deadline - time.monotonic()
+        if remaining <= 1:
+            break
+
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+        timeout = min(ENRICH_CALL_TIMEOUT_SECONDS, remaining)
+        for result in await asyncio.gather(*(_request_enrichment(articles, batch, timeout) for batch in batches)):
+            enriched.update(result)
+
+        missing = [index for index in pending if index not in enriched]
+        if not missing or len(missing) == len(pending):
+            # Done, or a round with no usable output: the provider is down or
+            # confused, and retrying would only add latency.
+            pending = missing
+            break
+        pending = missing
+        batch_size = max(1, (len(pending) + 1) // 2)
+        AI_ENRICHMENT_ARTICLES.inc(len(pending), result="retried")
+
+    AI_ENRICHMENT_ARTICLES.inc(len(enriched), result="enriched")
+    if pending:
+        AI_ENRICHMENT_ARTICLES.inc(len(pending), result="unenriched")
+        print(f"AI enrichment kept {len(enriched)} of {len(articles)} articles.")
+
+    return [
+        _merge_enrichment(article, enriched[index]) if index in enriched else article
+        for index, article in enumerate(articles)
+    ]
+
+
+_HTML_TAG_RE = re.compile(r"<[^<]+?>")
+
+
+def _clean_description(raw_description: str):
+    text = html.unescape(_HTML_TAG_RE.sub("", raw_description))
+    return text.replace("\xa0", " ").strip()
+
+
+def _iter_rss_items(content: bytes, limit: int):
+    """
+    Yield raw <item> fields incrementally and stop after ``limit`` items,
+    so parse time and memory depend on ``limit`` rather than on feed size.
+    """
+    if limit <= 0:
+        return
+
+    parsed = 0
+    for _, element in ET.iterparse(io.BytesIO(content), events=("end",)):
+        if element.tag != "item":
             continue
 
-        fallback_score = article.get("sentiment_score", 0.0)
-        merged = {
-            **article,
-            "sentiment_label": _coerce_sentiment_label(enriched.get("sentiment_label")),
-            "sentiment_score": _coerce_sentiment_score(enriched.get("sentiment_score"), fallback_score),
-            "summary": enriched.get("summary") or article.get("summary"),
-            "event_type": str(enriched.get("event_type") or "other").lower(),
-            "market_impact": _coerce_market_impact(enriched.get("market_impact")),
-            "ai_rationale": enriched.get("ai_rationale") or article.get("ai_rationale"),
+        yield {
+            "title": element.findtext("title", ""),
+            "link": element.findtext("link", ""),
+            "pub_date": element.findtext("pubDate", ""),
+            "description": element.findtext("description", ""),
         }
-        enriched_articles.append(merged)
+        element.clear()
 
-    return enriched_articles
+        parsed += 1
+        if parsed >= limit:
+            return
 
 
-def _parse_google_news_xml(content: bytes, limit: int):
-    root = ET.fromstring(content)
+def parse_news_feed(content: bytes, limit: int):
+    """RSS items as unscored article dicts; ``sentiment_text`` carries the full text for ``score_articles``."""
     articles = []
 
-    for item in root.findall(".//item")[:limit]:
-        title = item.findtext("title", "")
-        link = item.findtext("link", "")
-        pub_date = item.findtext("pubDate", "")
-        raw_description = item.findtext("description", "")
-        description_text = re.sub("<[^<]+?>", "", raw_description)
-        description_text = description_text.replace("&nbsp;", " ").strip()
-
-        sentiment = analyze_sentiment_bert(f"{title}. {description_text}")
+    for item in _iter_rss_items(content, limit):
+        title = item["title"]
+        description_text = _clean_description(item["description"])
         source_parts = title.rsplit("-", 1)
 
         articles.append({
             "title": source_parts[0].strip(),
             "description": description_text[:150] + "..." if len(description_text) > 150 else description_text,
             "source": source_parts[1].strip() if len(source_parts) > 1 else "Unknown",
-            "link": link,
-            "published_at": pub_date,
-            "sentiment_label": sentiment["label"],
-            "sentiment_score": sentiment["score"],
+            "link": item["link"],
+            "published_at": item["pub_date"],
+            "sentiment_text": f"{title}. {description_text}",
         })
 
     return articles
 
 
-async def fetch_google_news(query: str, limit: int = 10):
+def score_articles(articles: list[dict]):
+    for article in articles:
+        sentiment = analyze_sentiment_bert(article.pop("sentiment_text"))
+        article["sentiment_label"] = sentiment["label"]
+        article["sentiment_score"] = sentiment["score"]
+    return articles
+
+
+def _parse_google_news_xml(content: bytes, limit: int):
+    return score_articles(parse_news_feed(content, limit))
+
+
+async def fetch_news_feed(query: str):
+    """Raw Google News RSS for ``query``; raises on any upstream failure."""
     rss_url = f"https://news.google.com/rss/search?q={query}&hl=id&gl=ID&ceid=ID:id"
 
-    try:
-        async with httpx.AsyncClient(timeout=3.0, follow_redirects=True) as client:
+    async with async_upstream_call("google_news", "rss") as timeout:
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
             response = await client.get(rss_url)
             response.raise_for_status()
+    return response.content
 
-        return await asyncio.to_thread(_parse_google_news_xml, response.content, limit)
+
+async def fetch_google_news(query: str, limit: int = 10):
+    try:
+        content = await fetch_news_feed(query)
+        # Parsing plus per-item sentiment inference is the CPU-heavy part of ingestion.
+        return await run_cpu(_parse_google_news_xml, content, limit)
     except Exception as e:
         print(f"Error fetching news for {query}: {e}")
         return []
@@ -323,28 +515,63 @@ def _parse_published_at(value: str):
         return datetime.utcnow()
 
 
-def save_articles_to_db(db: Session, articles: list, related_stock: str = "Global"):
+def _article_symbols(article: dict, related_stock: str):
+    symbols = extract_tickers(article.get("title"), article.get("description"))
+    if related_stock and related_stock != "Global":
+        symbols.add(related_stock)
+    return symbols
+
+
+def stage_articles(db: Session, articles: list, related_stock: str = "Global"):
+    """
+    Add unseen articles to ``db``'s transaction and attribute every article
+    to its tickers; flushed, not committed, so a caller can commit its own
+    rows with them. Links that already exist, and syndicated near-duplicates
+    of recent titles, only gain ticker associations instead of being dropped
+    or stored twice. Returns the new rows.
+    """
     if not articles:
-        return 0
+        return []
 
     links = [article["link"] for article in articles if article.get("link")]
     if not links:
-        return 0
+        return []
 
-    existing_links = {
-        row[0]
-        for row in db.query(NewsArticle.link)
+    existing_ids = dict(
+        db.query(NewsArticle.link, NewsArticle.id)
         .filter(NewsArticle.link.in_(links))
         .all()
-    }
+    )
+    recent_titles = DuplicateIndex.load_recent(db)
+    batch_titles = DuplicateIndex()
+    ticker_links = {}
 
     new_articles = []
+    seen_links = set()
     for article in articles:
         link = article.get("link")
-        if not link or link in existing_links:
+        if not link or link in seen_links:
+            continue
+        seen_links.add(link)
+        symbols = _article_symbols(article, related_stock)
+
+        if link in existing_ids:
+            ticker_links.setdefault(existing_ids[link], set()).update(symbols)
+            continue
+
+        fingerprint = title_simhash(article["title"])
+        duplicate_id = recent_titles.match(fingerprint)
+        if duplicate_id is not None:
+            ticker_links.setdefault(duplicate_id, set()).update(symbols)
             continue
 
-        new_articles.append(NewsArticle(
+        duplicate_position = batch_titles.match(fingerprint)
+        if duplicate_position is not None:
+            new_articles[duplicate_position][1].update(symbols)
+            continue
+
+        batch_titles.add(len(new_articles), fingerprint)
+        new_articles.append((NewsArticle(
             title=article["title"],
             description=article["description"],
             summary=article.get("summary"),
@@ -357,15 +584,46 @@ def save_articles_to_db(db: Session, articles: list, related_stock: str = "Globa
             market_impact=article.get("market_impact"),
             ai_rationale=article.get("ai_rationale"),
             related_stock=related_stock,
-        ))
+            title_fingerprint=fingerprint_to_db(fingerprint),
+            tickers_linked=True,
+        ), symbols))
+
+    db.add_all([row for row, _ in new_articles])
+    db.flush()
+    for row, symbols in new_articles:
+        ticker_links.setdefault(row.id, set()).update(symbols)
+    link_article_tickers(db, ticker_links)
+    store_article_tokens(db, [row for row, _ in new_articles])
+    return [row for row, _ in new_articles]
+
+
+def announce_articles(rows: list, related_stock: str = "Global"):
+    """After the commit: invalidate recaps and push each new article to subscribers of any ticker it links."""
+    if rows:
+        mark_articles_changed()
+
+    for article in rows:
+        symbols = _article_symbols({"title": article.title, "description": article.description}, related_stock)
+        broker.publish("news", {
+            "title": article.title,
+            "source": article.source,
+            "link": article.link,
+            "published_at": article.published_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "sentiment_label": article.sentiment_label,
+            "sentiment_score": article.sentiment_score,
+            "related_stock": article.related_stock,
+            "symbols": sorted(symbols),
+        }, symbols=symbols)
 
-    if not new_articles:
-        return 0
 
+def save_articles_to_db(db: Session, articles: list, related_stock: str = "Global"):
+    """Insert unseen articles with their ticker links (see ``stage_articles``); returns how many were new."""
     try:
-        db.add_all(new_articles)
+        rows = stage_articles(db, articles, related_stock)
         db.commit()
-        return len(new_articles)
     except IntegrityError:
         db.rollback()
         return 0
+
+    announce_articles(rows, related_stock)
+    return len(rows)
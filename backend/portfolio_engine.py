@@ -0,0 +1,310 @@
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from database import Portfolio, PortfolioSnapshot, PriceBar, SessionLocal, Transaction
+from market_data import market_data
+from price_store import record_price_bars
+
+
+BUY = "BUY"
+SELL = "SELL"
+SNAPSHOT_COLUMNS = ["market_value", "invested", "realized_pnl", "net_flow"]
+
+
+def _seed_opening_transaction(db: Session, position: Portfolio):
+    """Record a pre-ledger position as one opening BUY so the ledger matches the Portfolio row."""
+    has_history = db.query(Transaction.id).filter(Transaction.symbol == position.symbol).first()
+    if has_history or not position.total_shares:
+        return
+
+    invested = position.total_invested or position.avg_price * position.total_shares
+    db.add(Transaction(
+        symbol=position.symbol,
+        side=BUY,
+        shares=position.total_shares,
+        price=invested / position.total_shares,
+        executed_at=datetime.utcnow(),
+        invested_delta=invested,
+        realized_pnl=0.0,
+    ))
+    db.flush()
+
+
+def seed_ledger_from_positions(db: Session):
+    for position in db.query(Portfolio).all():
+        _seed_opening_transaction(db, position)
+    db.commit()
+
+
+def apply_transaction(db: Session, symbol: str, side: str, shares: int, price: float, executed_at: datetime | None = None):
+    """
+    Record a transaction and update the running position incrementally (average-cost method).
+    Snapshots from the transaction date onwards are rebuilt before returning, so
+    reads never have to replay the ledger.
+    """
+    symbol = symbol.upper()
+    side = side.upper()
+    executed_at = executed_at or datetime.utcnow()
+    position = db.query(Portfolio).filter(Portfolio.symbol == symbol).first()
+    if position:
+        _seed_opening_transaction(db, position)
+
+    if side == BUY:
+        invested_delta = shares * price
+        realized_pnl = 0.0
+        if position:
+            position.total_shares += shares
+            position.total_invested = (position.total_invested or 0.0) + invested_delta
+            position.avg_price = position.total_invested / position.total_shares
+        else:
+            db.add(Portfolio(symbol=symbol, total_shares=shares, total_invested=invested_delta, avg_price=price))
+    elif side == SELL:
+        if not position or position.total_shares < shares:
+            raise ValueError("Cannot sell more shares than held.")
+
+        avg_cost = (position.total_invested or position.avg_price * position.total_shares) / position.total_shares
+        invested_delta = -avg_cost * shares
+        realized_pnl = (price - avg_cost) * shares
+        position.total_shares -= shares
+        position.total_invested = (position.total_invested or 0.0) + invested_delta
+        if position.total_shares == 0:
+            db.delete(position)
+    else:
+        raise ValueError(f"Unknown transaction side: {side}")
+
+    transaction = Transaction(
+        symbol=symbol,
+        side=side,
+        shares=shares,
+        price=price,
+        executed_at=executed_at,
+        invested_delta=invested_delta,
+        realized_pnl=realized_pnl,
+    )
+    db.add(transaction)
+    db.query(PortfolioSnapshot).filter(PortfolioSnapshot.date >= executed_at.date()).delete(synchronize_session=False)
+    db.commit()
+    refresh_portfolio_snapshots(db)
+    db.refresh(transaction)
+    return transaction
+
+
+def store_price_bars(db: Session, symbol: str, frame: pd.DataFrame):
+    frame = frame.dropna(subset=["Close"])
+    if frame.empty:
+        return 0
+
+    dates = [timestamp.date() for timestamp in frame.index]
+    db.query(PriceBar).filter(
+        PriceBar.symbol == symbol,
+        PriceBar.date >= min(dates),
+        PriceBar.date <= max(dates),
+    ).delete(synchronize_session=False)
+
+    records = [
+        {
+            "symbol": symbol,
+            "date": bar_date,
+            "open": float(row["Open"]),
+            "high": float(row["High"]),
+            "low": float(row["Low"]),
+            "close": float(row["Close"]),
+            "volume": int(row["Volume"]) if pd.notna(row["Volume"]) else 0,
+        }
+        for bar_date, (_, row) in zip(dates, frame.iterrows())
+    ]
+    db.execute(insert(PriceBar), records)
+    db.commit()
+    record_price_bars(symbol, pd.DataFrame(records))
+    return len(records)
+
+
+def sync_price_bars_sync(db: Session, symbols: list[str], period: str = "1mo"):
+    """Download daily bars for IDX symbols (without the .JK suffix) and upsert them into price_bars."""
+    if not symbols:
+        return 0
+
+    stored = 0
+    for symbol, frame in market_data.daily_bars_sync(symbols, period=period).items():
+        stored += store_price_bars(db, symbol, frame)
+    return stored
+
+
+def load_close_matrix(db: Session, symbols: list[str], start: date, end: date):
+    """Daily closes as a date x symbol frame."""
+    rows = (
+        db.query(PriceBar.date, PriceBar.symbol, PriceBar.close)
+        .filter(PriceBar.symbol.in_(symbols), PriceBar.date >= start, PriceBar.date <= end)
+        .all()
+    )
+    if not rows:
+        return pd.DataFrame(columns=symbols, dtype=float)
+
+    bars = pd.DataFrame(rows, columns=["date", "symbol", "close"])
+    bars["date"] = pd.to_datetime(bars["date"])
+    return bars.pivot_table(index="date", columns="symbol", values="close", aggfunc="last")
+
+
+def _load_transactions_frame(db: Session):
+    rows = db.query(
+        Transaction.symbol,
+        Transaction.side,
+        Transaction.shares,
+        Transaction.price,
+        Transaction.executed_at,
+        Transaction.invested_delta,
+        Transaction.realized_pnl,
+    ).all()
+    columns = ["symbol", "side", "shares", "price", "executed_at", "invested_delta", "realized_pnl"]
+    frame = pd.DataFrame(rows, columns=columns)
+    if frame.empty:
+        return frame
+
+    is_buy = frame["side"] == BUY
+    gross = frame["shares"] * frame["price"]
+    frame["day"] = pd.to_datetime(frame["executed_at"]).dt.normalize() + pd.offsets.BDay(0)
+    frame["signed_shares"] = frame["shares"].where(is_buy, -frame["shares"])
+    frame["cash_flow"] = gross.where(is_buy, -gross)
+    return frame
+
+
+def _as_of(matrix: pd.DataFrame, calendar: pd.DatetimeIndex):
+    """Reindex a sparse date-indexed matrix onto the calendar, carrying the last known value forward."""
+    if matrix.empty:
+        return pd.DataFrame(index=calendar, columns=matrix.columns, dtype=float)
+    return matrix.reindex(matrix.index.union(calendar)).sort_index().ffill().reindex(calendar)
+
+
+def build_daily_value_series(db: Session, start: date | None = None, end: date | None = None):
+    """
+    Daily market value, cost basis, cumulative realized P&L and net cash flow.
+    Positions are cumulative sums of the ledger joined against stored closes;
+    holdings without a stored bar are marked at their last transaction price.
+    """
+    transactions = _load_transactions_frame(db)
+    if transactions.empty:
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+
+    end = pd.Timestamp(end or date.today())
+    start = pd.Timestamp(start) if start else transactions["day"].min()
+    start = start + pd.offsets.BDay(0)
+    calendar = pd.bdate_range(start, end)
+    if calendar.empty:
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+
+    symbols = sorted(transactions["symbol"].unique())
+    before = transactions[transactions["day"] < start]
+    within = transactions[(transactions["day"] >= start) & (transactions["day"] <= end)]
+
+    opening_shares = before.groupby("symbol")["signed_shares"].sum().reindex(symbols, fill_value=0)
+    share_changes = (
+        within.pivot_table(index="day", columns="symbol", values="signed_shares", aggfunc="sum")
+        .reindex(index=calendar, columns=symbols)
+        .fillna(0)
+    )
+    shares = share_changes.cumsum() + opening_shares
+
+    history_start = (start - pd.Timedelta(days=14)).date()
+    closes = _as_of(load_close_matrix(db, symbols, history_start, end.date()), calendar)
+    trade_prices = _as_of(
+        transactions[transactions["day"] <= end].pivot_table(index="day", columns="symbol", values="price", aggfunc="last"),
+        calendar,
+    )
+    marks = closes.reindex(columns=symbols).combine_first(trade_prices.reindex(columns=symbols))
+
+    def daily_cumulative(column: str):
+        opening = before[column].sum()
+        return within.groupby("day")[column].sum().reindex(calendar, fill_value=0.0).cumsum() + opening
+
+    series = pd.DataFrame(index=calendar)
+    series["market_value"] = (shares * marks).sum(axis=1)
+    series["invested"] = daily_cumulative("invested_delta")
+    series["realized_pnl"] = daily_cumulative("realized_pnl")
+    series["net_flow"] = within.groupby("day")["cash_flow"].sum().reindex(calendar, fill_value=0.0)
+    return series
+
+
+def refresh_portfolio_snapshots(db: Session, end: date | None = None):
+    """Extend the snapshot table up to ``end``, recomputing only from the latest stored day."""
+    seed_ledger_from_positions(db)
+    end = end or date.today()
+    last = db.query(func.max(PortfolioSnapshot.date)).scalar()
+    series = build_daily_value_series(db, start=last, end=end)
+    if series.empty:
+        return 0
+
+    first_day = series.index[0].date()
+    db.query(PortfolioSnapshot).filter(PortfolioSnapshot.date >= first_day).delete(synchronize_session=False)
+    records = [
+        {"date": day.date(), **{column: float(row[column]) for column in SNAPSHOT_COLUMNS}}
+        for day, row in series.iterrows()
+    ]
+    db.execute(insert(PortfolioSnapshot), records)
+    db.commit()
+    return len(records)
+
+
+def get_performance(db: Session, start: date | None = None, end: date | None = None):
+    """Equity curve and time-weighted return for a date range, read from stored snapshots."""
+    query = db.query(
+        PortfolioSnapshot.date,
+        PortfolioSnapshot.market_value,
+        PortfolioSnapshot.invested,
+        PortfolioSnapshot.realized_pnl,
+        PortfolioSnapshot.net_flow,
+    )
+    if start:
+        # One extra day before the range anchors the first daily return.
+        previous = db.query(func.max(PortfolioSnapshot.date)).filter(PortfolioSnapshot.date < start).scalar()
+        query = query.filter(PortfolioSnapshot.date >= (previous or start))
+    if end:
+        query = query.filter(PortfolioSnapshot.date <= end)
+
+    snapshots = pd.DataFrame(query.order_by(PortfolioSnapshot.date).all(), columns=["date", *SNAPSHOT_COLUMNS])
+    if snapshots.empty:
+        return {"equity_curve": [], "time_weighted_return_pct": 0.0, "realized_pnl": 0.0, "unrealized_pnl": 0.0}
+
+    previous_value = snapshots["market_value"].shift(1)
+    daily_returns = ((snapshots["market_value"] - snapshots["net_flow"]) / previous_value - 1).where(previous_value > 0)
+    twr = float((1 + daily_returns.fillna(0.0)).prod() - 1)
+
+    in_range = snapshots if not start else snapshots[snapshots["date"] >= start]
+    if in_range.empty:
+        in_range = snapshots.tail(1)
+    first, last = in_range.iloc[0], in_range.iloc[-1]
+    realized_before = snapshots["realized_pnl"].iloc[0] if len(snapshots) > len(in_range) else 0.0
+
+    return {
+        "start": str(first["date"]),
+        "end": str(last["date"]),
+        "start_value": float(first["market_value"]),
+        "end_value": float(last["market_value"]),
+        "time_weighted_return_pct": twr * 100,
+        "realized_pnl": float(last["realized_pnl"] - realized_before),
+        "unrealized_pnl": float(last["market_value"] - last["invested"]),
+        "equity_curve": [
+            {"date": str(row.date), "value": float(row.market_value), "invested": float(row.invested)}
+            for row in in_range.itertuples()
+        ],
+    }
+
+
+def refresh_portfolio_history_sync(lookback_days: int = 31):
+    """
+    Worker job: pull recent bars for traded symbols, then rebuild the snapshots
+    inside the refreshed window so late-arriving bars replace trade-price marks.
+    """
+    db = SessionLocal()
+    try:
+        symbols = sorted(row[0] for row in db.query(Transaction.symbol).distinct().all())
+        sync_price_bars_sync(db, symbols, period="1mo")
+
+        window_start = date.today() - timedelta(days=lookback_days)
+        db.query(PortfolioSnapshot).filter(PortfolioSnapshot.date >= window_start).delete(synchronize_session=False)
+        db.commit()
+        return refresh_portfolio_snapshots(db)
+    finally:
+        db.close()
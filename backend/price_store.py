@@ -0,0 +1,377 @@
+"""Compact in-process store of daily bars for the whole universe.
+
+Struct-of-arrays: one contiguous NumPy column per field (day numbers as
+int32, OHLC as float32 — IDX prices are whole rupiah, exact in float32 —
+and volume as int64), 28 bytes a bar. Each symbol owns a region of the
+columns found through ``_index``, with a quarter spare (REGION_HEADROOM) so
+appends after the last stored day fill it in place; a full region moves to
+the end of the columns with double the room. ``window`` slices are views,
+so reads copy nothing.
+
+Stored bars are never overwritten: appends only fill slots past a region's
+length, and an update that touches stored days is merged into a fresh
+region. Compaction (run when the columns would otherwise grow and at least
+half of them are gaps) builds new arrays. A window therefore stays valid and
+unchanged for as long as a caller holds it; it just stops seeing new bars.
+
+``save`` writes the columns to one .npy file that ``load`` memory-maps
+copy-on-write, so a restarted process serves history straight from the
+snapshot's pages (see snapshots.py) and only re-reads the recent price_bars
+the daily sync may have rewritten since.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from database import PriceBar, ReadSessionLocal
+
+
+FIELDS = {
+    "day": np.int32,
+    "open": np.float32,
+    "high": np.float32,
+    "low": np.float32,
+    "close": np.float32,
+    "volume": np.int64,
+}
+EPOCH = np.datetime64("1970-01-01", "D")
+RECORD_DTYPE = np.dtype(list(FIELDS.items()))
+MIN_REGION = 32
+REGION_HEADROOM = 0.25
+SNAPSHOT_INDEX_FILE = "price_store.json"
+# Days of price_bars re-read over a restored snapshot: the daily sync rewrites about a month.
+SNAPSHOT_TOP_UP_DAYS = 31
+
+
+def day_number(value):
+    """Days since 1970-01-01 for a date, datetime64 or array of them."""
+    return (np.asarray(value, dtype="datetime64[D]") - EPOCH).astype(np.int32)
+
+
+def region_capacity(length):
+    """Slots for a region of ``length`` bars, leaving REGION_HEADROOM spare for appends."""
+    return np.maximum(MIN_REGION, length + np.ceil(length * REGION_HEADROOM).astype(int))
+
+
+@dataclass(frozen=True)
+class BarWindow:
+    """Views into the store's columns for one symbol and date range."""
+
+    day: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self):
+        return len(self.day)
+
+    @property
+    def dates(self):
+        return EPOCH + self.day.astype("timedelta64[D]")
+
+    def to_frame(self):
+        """Copy out as a ``yf.Ticker.history``-shaped frame (Open/High/Low/Close/Volume by date)."""
+        return pd.DataFrame(
+            {
+                "Open": self.open.astype(float),
+                "High": self.high.astype(float),
+                "Low": self.low.astype(float),
+                "Close": self.close.astype(float),
+                "Volume": self.volume,
+            },
+            index=pd.DatetimeIndex(self.dates, name="Date"),
+        )
+
+
+class PriceHistoryStore:
+    def __init__(self, capacity: int = 4096):
+        self._columns = {field: np.zeros(capacity, dtype) for field, dtype in FIELDS.items()}
+        self._used = 0
+        # symbol -> [start, length, capacity] within the columns
+        self._index = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, bars: pd.DataFrame):
+        """Bulk build from a long frame with symbol, date, open, high, low, close, volume columns."""
+        bars = bars.sort_values(["symbol", "date"], kind="stable")
+        symbols = bars["symbol"].to_numpy()
+        boundaries = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+        starts = np.concatenate(([0], boundaries)) if len(bars) else np.array([], dtype=int)
+        lengths = np.diff(np.concatenate((starts, [len(bars)]))) if len(bars) else np.array([], dtype=int)
+        capacities = region_capacity(lengths)
+        offsets = np.cumsum(capacities) - capacities
+
+        used = int(capacities.sum())
+        store = cls(capacity=max(used, MIN_REGION))
+        # Row i of the sorted frame lands at its region's offset plus its rank within the symbol.
+        positions = np.repeat(offsets - starts, lengths) + np.arange(len(bars))
+        store._columns["day"][positions] = day_number(bars["date"].to_numpy())
+        for field in ("open", "high", "low", "close"):
+            store._columns[field][positions] = bars[field].to_numpy(dtype=float)
+        store._columns["volume"][positions] = bars["volume"].fillna(0).to_numpy(dtype=np.int64)
+
+        for start, offset, length, capacity in zip(starts, offsets, lengths, capacities):
+            store._index[symbols[start]] = [int(offset), int(length), int(capacity)]
+        store._used = used
+        return store
+
+    @classmethod
+    def from_db(cls, db: Session, symbols: list[str] | None = None, start: date | None = None):
+        return cls.from_frame(_query_bars(db, symbols, start))
+
+    @classmethod
+    def load(cls, directory: Path):
+        """
+        (store, written_at) from the snapshot ``save`` wrote to ``directory``,
+        or None when there is none. The columns stay memory-mapped until an
+        update needs more room than the snapshot has.
+        """
+        index_path = directory / SNAPSHOT_INDEX_FILE
+        if not index_path.exists():
+            return None
+        meta = json.loads(index_path.read_text(encoding="utf-8"))
+        table = np.load(directory / meta["file"], mmap_mode="c")
+
+        store = cls(capacity=0)
+        store._columns = {field: table[field] for field in FIELDS}
+        store._used = len(table)
+        store._index = meta["index"]
+        return store, meta["written_at"]
+
+    def save(self, directory: Path):
+        """
+        Write the columns to a new .npy file, then point the index file at it
+        (so a reader never pairs an index with the wrong columns) and delete
+        older column files; returns the number of bars.
+        """
+        with self._lock:
+            table = np.empty(self._used, RECORD_DTYPE)
+            for field, column in self._columns.items():
+                table[field] = column[:self._used]
+            index = {symbol: list(entry) for symbol, entry in self._index.items()}
+
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"price_store-{time.time_ns()}.npy"
+        np.save(directory / name, table)
+        meta = {"file": name, "written_at": time.time(), "index": index}
+        staging = directory / f"{SNAPSHOT_INDEX_FILE}.tmp"
+        staging.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(staging, directory / SNAPSHOT_INDEX_FILE)
+        for path in directory.glob("price_store-*.npy"):
+            if path.name != name:
+                path.unlink(missing_ok=True)
+        return sum(length for _, length, _ in index.values())
+
+    def __contains__(self, symbol):
+        return symbol in self._index
+
+    def symbols(self):
+        return list(self._index)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self._columns.values())
+
+    def _reserve(self, size: int):
+        """Start offset of ``size`` fresh slots at the end of the columns, growing (or compacting) them if needed."""
+        needed = self._used + size
+        capacity = len(self._columns["day"])
+        if needed > capacity and self._gaps() * 2 >= self._used:
+            self._compact(capacity)
+            needed = self._used + size
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+            for field, column in self._columns.items():
+                grown = np.zeros(capacity, column.dtype)
+                grown[:self._used] = column[:self._used]
+                self._columns[field] = grown
+        start = self._used
+        self._used = needed
+        return start
+
+    def _gaps(self):
+        return self._used - sum(capacity for _, _, capacity in self._index.values())
+
+    def upsert(self, symbol: str, bars: pd.DataFrame):
+        """
+        Add daily bars (date, open, high, low, close, volume columns). Bars
+        after the last stored day are appended in place; bars on or before it
+        replace the stored ones on those days, in a new region (see the
+        module docstring), so existing windows never change.
+        """
+        if bars.empty:
+            return
+        bars = bars.sort_values("date")
+        incoming = {"day": day_number(bars["date"].to_numpy())}
+        for field in ("open", "high", "low", "close"):
+            incoming[field] = bars[field].to_numpy(dtype=np.float32)
+        incoming["volume"] = bars["volume"].fillna(0).to_numpy(dtype=np.int64)
+
+        with self._lock:
+            entry = self._index.get(symbol)
+            if entry is not None:
+                start, length, capacity = entry
+                days = self._columns["day"][start:start + length]
+                if incoming["day"][0] > days[-1] and length + len(bars) <= capacity:
+                    for field, values in incoming.items():
+                        self._columns[field][start + length:start + length + len(bars)] = values
+                    entry[1] = length + len(bars)
+                    return
+
+                # Merge: stored bars on days the update does not cover, then the update.
+                keep = ~np.isin(days, incoming["day"])
+                merged = {
+                    field: np.concatenate((self._columns[field][start:start + length][keep], values))
+                    for field, values in incoming.items()
+                }
+                order = np.argsort(merged["day"], kind="stable")
+                incoming = {field: values[order] for field, values in merged.items()}
+
+            size = len(incoming["day"])
+            capacity = int(region_capacity(size)) if entry is None else max(MIN_REGION, size * 2)
+            start = self._reserve(capacity)
+            for field, values in incoming.items():
+                self._columns[field][start:start + size] = values
+            self._index[symbol] = [start, size, capacity]
+
+    def window(self, symbol: str, start: date | None = None, end: date | None = None):
+        """Zero-copy views of ``symbol``'s bars with start <= date <= end; None when unknown."""
+        with self._lock:
+            entry = self._index.get(symbol)
+            if entry is None:
+                return None
+            offset, length, _ = entry
+            columns = dict(self._columns)
+        days = columns["day"][offset:offset + length]
+        first = 0 if start is None else int(np.searchsorted(days, day_number(start), side="left"))
+        last = length if end is None else int(np.searchsorted(days, day_number(end), side="right"))
+        return BarWindow(**{
+            field: column[offset + first:offset + last]
+            for field, column in columns.items()
+        })
+
+    def changed_bars(self, symbol: str, bars: pd.DataFrame):
+        """The rows of ``bars`` (date, open, high, low, close, volume) that differ from what is stored."""
+        stored = self.window(symbol)
+        if stored is None or not len(stored):
+            return bars
+        days = day_number(bars["date"].to_numpy())
+        offsets = np.minimum(np.searchsorted(stored.day, days), len(stored) - 1)
+        same = stored.day[offsets] == days
+        for field in ("open", "high", "low", "close"):
+            same &= getattr(stored, field)[offsets] == bars[field].to_numpy(dtype=FIELDS[field])
+        same &= stored.volume[offsets] == bars["volume"].fillna(0).to_numpy(dtype=np.int64)
+        return bars[~same]
+
+    def span(self, symbol: str):
+        """(first, last) stored date for ``symbol``, or None when it has no bars."""
+        with self._lock:
+            entry = self._index.get(symbol)
+            if entry is None or not entry[1]:
+                return None
+            offset, length, _ = entry
+            days = self._columns["day"][[offset, offset + length - 1]]
+        first, last = EPOCH + days.astype("timedelta64[D]")
+        return first.astype(date), last.astype(date)
+
+    def close_matrix(self, symbols: list[str], start: date | None = None, end: date | None = None):
+        """Daily closes as a date x symbol frame (the shape ``load_close_matrix`` returns)."""
+        series = {}
+        for symbol in symbols:
+            bars = self.window(symbol, start, end)
+            if bars is not None and len(bars):
+                series[symbol] = pd.Series(bars.close.astype(float), index=pd.DatetimeIndex(bars.dates))
+        if not series:
+            return pd.DataFrame(columns=symbols, dtype=float)
+        return pd.DataFrame(series).sort_index()
+
+    def compact(self):
+        """Drop the gaps left by relocated regions; returns the bytes reclaimed."""
+        with self._lock:
+            before = self.nbytes
+            self._compact()
+            return before - self.nbytes
+
+    def _compact(self, size: int = 0):
+        """
+        Copy every region, with fresh headroom, into new columns of at least
+        ``size`` slots (caller holds the lock).
+        """
+        lengths = np.array([length for _, length, _ in self._index.values()], dtype=int)
+        capacities = region_capacity(lengths)
+        total = int(capacities.sum())
+        columns = {field: np.zeros(max(total, size, MIN_REGION), dtype) for field, dtype in FIELDS.items()}
+        offset = 0
+        for entry, capacity in zip(self._index.values(), capacities):
+            start, length, _ = entry
+            for field, column in self._columns.items():
+                columns[field][offset:offset + length] = column[start:start + length]
+            entry[:] = [offset, length, int(capacity)]
+            offset += int(capacity)
+        self._columns, self._used = columns, offset
+
+
+def _query_bars(db: Session, symbols: list[str] | None = None, start: date | None = None):
+    query = db.query(PriceBar.symbol, PriceBar.date, PriceBar.open, PriceBar.high, PriceBar.low, PriceBar.close, PriceBar.volume)
+    if symbols is not None:
+        query = query.filter(PriceBar.symbol.in_(symbols))
+    if start is not None:
+        query = query.filter(PriceBar.date >= start)
+    return pd.DataFrame(query.all(), columns=["symbol", "date", "open", "high", "low", "close", "volume"])
+
+
+_store = None
+_restored_on = None
+
+
+def install_price_store(store: PriceHistoryStore, restored_on: date):
+    """Serve ``store``, restored from a snapshot written on ``restored_on``, until the worker tops it up."""
+    global _store, _restored_on
+    _store, _restored_on = store, restored_on
+
+
+def load_price_store():
+    """
+    Load the process-wide store from price_bars; the worker does this once at
+    startup. Over a store restored from a snapshot only the last
+    SNAPSHOT_TOP_UP_DAYS before the snapshot are re-read, and only bars that
+    changed are merged in.
+    """
+    global _store
+    db = ReadSessionLocal()
+    try:
+        if _store is None or _restored_on is None:
+            _store = PriceHistoryStore.from_db(db)
+            return _store
+        recent = _query_bars(db, start=_restored_on - timedelta(days=SNAPSHOT_TOP_UP_DAYS))
+    finally:
+        db.close()
+
+    for symbol, bars in recent.groupby("symbol", sort=False):
+        changed = _store.changed_bars(symbol, bars)
+        if not changed.empty:
+            _store.upsert(symbol, changed)
+    return _store
+
+
+def loaded_price_store():
+    """The process-wide store, or None until it has been restored or loaded."""
+    return _store
+
+
+def record_price_bars(symbol: str, bars: pd.DataFrame):
+    """Mirror freshly stored bars into the store, if it has been loaded."""
+    if _store is not None:
+        _store.upsert(symbol, bars)
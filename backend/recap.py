@@ -0,0 +1,181 @@
+import json
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from database import ArticleTicker, ArticleTokenCounts, NewsArticle
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+RECAP_WINDOWS = {
+    "today": timedelta(days=1),
+    "week": timedelta(days=7),
+}
+
+RECAP_TICKERS = frozenset([
+    "BBCA", "BBRI", "BMRI", "BBNI", "ARTO", "BRIS", "GOTO", "EMTK", "BUKA", "DCII",
+    "ADRO", "PGAS", "PTBA", "ANTM", "TINS", "INCO", "MEDC", "UNVR", "ICBP", "INDF",
+    "AMRT", "MYOR", "KLBF", "TLKM", "ISAT", "EXCL", "JSMR", "ASII", "UNTR", "IHSG",
+    "BREN", "TPIA", "BYAN",
+])
+
+IGNORED_WORDS = frozenset([
+    "di", "ke", "dan", "yang", "ini", "itu", "saham", "untuk", "pt", "tbk", "indonesia", "dengan", "akan", "pada",
+    "market", "bursa", "news", "hari", "juta", "miliar", "triliun", "rp", "persen", "naik", "turun", "stagnan",
+    "sesi", "pagi", "siang", "sore", "penutupan", "pembukaan", "transaksi", "investor", "asing", "dana",
+    "rekomendasi", "target", "harga", "potensi", "proyeksi", "prediksi", "jadwal", "dividen", "rups", "ipo",
+])
+
+_recap_cache = TTLCache("recap", ttl_seconds=600, max_entries=64)
+_articles_version = 0
+_version_lock = threading.Lock()
+
+
+def mark_articles_changed():
+    """Invalidate cached recaps; called whenever new articles are stored."""
+    global _articles_version
+    with _version_lock:
+        _articles_version += 1
+
+
+def count_title_tokens(title: str):
+    """Single tokenizer pass returning (ticker counts, topic keyword counts)."""
+    tickers = Counter()
+    keywords = Counter()
+    for token in TOKEN_RE.findall(title or ""):
+        upper = token.upper()
+        if upper in RECAP_TICKERS:
+            tickers[upper] += 1
+
+        lower = token.lower()
+        if len(lower) > 3 and lower not in IGNORED_WORDS and not lower.isdigit():
+            keywords[lower] += 1
+    return tickers, keywords
+
+
+def store_article_tokens(db: Session, articles: list[NewsArticle]):
+    """Persist per-article counters at ingestion so recaps never re-tokenize raw titles."""
+    rows = []
+    for article in articles:
+        tickers, keywords = count_title_tokens(article.title)
+        rows.append(ArticleTokenCounts(
+            article_id=article.id,
+            published_at=article.published_at,
+            sentiment_label=article.sentiment_label,
+            related_stock=article.related_stock,
+            ticker_counts=json.dumps(tickers),
+            keyword_counts=json.dumps(keywords),
+        ))
+    db.add_all(rows)
+    return len(rows)
+
+
+def backfill_article_tokens(db: Session, since: datetime | None = None, batch_size: int = 1000):
+    since = since or datetime.utcnow() - max(RECAP_WINDOWS.values())
+    counted = select(ArticleTokenCounts.article_id)
+    total = 0
+
+    while True:
+        articles = (
+            db.query(NewsArticle)
+            .filter(NewsArticle.published_at >= since, NewsArticle.id.not_in(counted))
+            .limit(batch_size)
+            .all()
+        )
+        if not articles:
+            break
+        total += store_article_tokens(db, articles)
+        db.commit()
+
+    if total:
+        mark_articles_changed()
+    return total
+
+
+def _merge_window_counts(db: Session, since: datetime, symbols: list[str] | None):
+    query = db.query(
+        ArticleTokenCounts.sentiment_label,
+        ArticleTokenCounts.related_stock,
+        ArticleTokenCounts.ticker_counts,
+        ArticleTokenCounts.keyword_counts,
+    ).filter(ArticleTokenCounts.published_at >= since)
+
+    if symbols is not None:
+        sector_articles = select(ArticleTicker.article_id).where(ArticleTicker.symbol.in_(symbols))
+        query = query.filter(ArticleTokenCounts.article_id.in_(sector_articles))
+
+    totals = {"total": 0, "POSITIVE": 0, "NEGATIVE": 0}
+    tickers = Counter()
+    keywords = Counter()
+    stocks = Counter()
+    for sentiment_label, related_stock, ticker_counts, keyword_counts in query.all():
+        totals["total"] += 1
+        if sentiment_label in totals:
+            totals[sentiment_label] += 1
+        if related_stock != "Global":
+            stocks[related_stock] += 1
+        tickers.update(json.loads(ticker_counts or "{}"))
+        keywords.update(json.loads(keyword_counts or "{}"))
+
+    return totals, tickers, keywords, stocks
+
+
+def _compose_recap(window: str, totals: dict, tickers: Counter, keywords: Counter, stocks: Counter):
+    if not totals["total"]:
+        return {"recap": "Belum ada cukup data berita hari ini untuk membuat rangkuman. Pasar terlihat tenang."}
+
+    total = totals["total"]
+    sentiment_score = totals["POSITIVE"] - totals["NEGATIVE"]
+
+    if tickers:
+        topic_str = ", ".join(ticker for ticker, _ in tickers.most_common(3))
+    else:
+        top_keyword = keywords.most_common(1)
+        topic_str = top_keyword[0][0].title() if top_keyword else "Ekonomi Global"
+
+    top_stock = stocks.most_common(1)
+    top_stock_name = top_stock[0][0] if top_stock else "Blue Chip"
+
+    if sentiment_score > total * 0.2:
+        mood = "Optimis"
+        desc = "didominasi sentimen positif"
+    elif sentiment_score < -total * 0.2:
+        mood = "Waspada"
+        desc = "cenderung tertekan"
+    else:
+        mood = "Netral"
+        desc = "bergerak sideways/netral"
+
+    title, period = ("Market Recap Pekan Ini", "7 hari") if window == "week" else ("Market Recap Hari Ini", "24 jam")
+    recap_text = (
+        f"{title}: Pasar terlihat **{mood}** dan {desc}. "
+        f"Fokus investor tertuju pada isu **{topic_str}**. "
+        f"Saham **{top_stock_name}** menjadi sorotan utama dalam pemberitaan {period} terakhir."
+    )
+
+    return {
+        "mood": mood,
+        "sentiment_score": sentiment_score,
+        "top_topic": topic_str,
+        "recap": recap_text,
+    }
+
+
+def build_recap(db: Session, window: str = "today", sector: str | None = None, symbols: list[str] | None = None):
+    """
+    Recap for a window, optionally restricted to a sector's symbols.
+    Cached until new articles are stored (or the TTL lets the window slide).
+    """
+    key = (window, sector, _articles_version)
+
+    def load():
+        since = datetime.utcnow() - RECAP_WINDOWS[window]
+        return _compose_recap(window, *_merge_window_counts(db, since, symbols))
+
+    return _recap_cache.get_or_load(key, load)
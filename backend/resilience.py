@@ -0,0 +1,330 @@
+"""Per-provider circuit breakers, adaptive concurrency limits and request deadlines.
+
+Every upstream call goes through ``upstream_call`` (or ``async_upstream_call``
+on the event loop). It raises ``UpstreamUnavailable`` without touching the
+network when the provider's breaker is open, its concurrency limit is
+saturated, or the request's deadline has already passed; callers catch that
+and serve cached or stored data instead. A slow provider therefore degrades
+only the endpoints that need it.
+
+Only provider-side trouble (transport errors, timeouts, rate limiting, 5xx)
+counts toward a breaker; a 404 for a mistyped symbol is the caller's problem
+and must not open the breaker for everyone. Neither is a timeout on a call
+whose budget the request deadline cut short: the request ran out of time,
+which says nothing about the provider.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+
+import httpx
+
+from metrics import UPSTREAM_REJECTED, track_upstream
+
+try:
+    from yfinance.exceptions import YFRateLimitError
+except ImportError:
+    YFRateLimitError = None
+
+try:
+    from requests.exceptions import Timeout as RequestsTimeout
+except ImportError:
+    RequestsTimeout = None
+
+try:
+    from curl_cffi.requests.exceptions import Timeout as CurlTimeout
+except ImportError:
+    CurlTimeout = None
+
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+
+_deadline = contextvars.ContextVar("upstream_deadline", default=None)
+# (provider, deadline, clipped): clipped when the request deadline left less than the provider timeout.
+_call_deadline = contextvars.ContextVar("upstream_call_deadline", default=None)
+
+# OSError covers socket, requests and curl_cffi transport errors.
+TRANSPORT_ERRORS = tuple(
+    error for error in (TimeoutError, OSError, httpx.TransportError, YFRateLimitError) if error is not None
+)
+TIMEOUT_ERRORS = tuple(
+    error for error in (TimeoutError, httpx.TimeoutException, RequestsTimeout, CurlTimeout) if error is not None
+)
+
+
+class UpstreamUnavailable(Exception):
+    """The call was short-circuited; nothing was sent upstream."""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} unavailable ({reason})")
+        self.provider = provider
+        self.reason = reason
+
+
+@contextmanager
+def request_deadline(seconds: float = REQUEST_DEADLINE_SECONDS):
+    """Bound every upstream call made while handling one request (threads inherit it via contextvars)."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_remaining_time():
+    """Seconds left for the innermost ``upstream_call`` on this thread, or None outside one."""
+    call = _call_deadline.get()
+    return None if call is None else call[1] - time.monotonic()
+
+
+def call_budget_spent(what: str):
+    """
+    The error for a request that would start after the innermost
+    ``upstream_call``'s budget ran out: ``UpstreamUnavailable`` when the
+    request deadline cut that budget short, else a TimeoutError.
+    """
+    provider, _, clipped = _call_deadline.get()
+    if clipped:
+        return UpstreamUnavailable(provider, "deadline exceeded")
+    return TimeoutError(f"{provider} budget spent before {what}")
+
+
+def _http_status(error: Exception):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_provider_failure(error: BaseException):
+    """Whether an upstream error says the provider is unhealthy, rather than that the request was bad."""
+    if not isinstance(error, Exception):
+        return True
+    status = _http_status(error)
+    if status is not None:
+        return status >= 500 or status in (408, 429)
+    return isinstance(error, TRANSPORT_ERRORS)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; one probe call is let through after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_probe(self):
+        """The admitted probe never ran (e.g. no concurrency slot); let the next call probe."""
+        with self._lock:
+            self._probing = False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: +1/limit per fast success (about +1 per round of
+    calls), halved on a failure or a call slower than ``latency_target`` — at
+    most once per ``latency_target`` so one slow burst does not collapse it.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def try_acquire(self):
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float, ok: bool):
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if ok and latency <= self.latency_target:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif now - self._last_decrease >= self.latency_target:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+            self._condition.notify_all()
+
+
+@dataclass
+class ProviderGuard:
+    timeout: float
+    latency_target: float
+    initial_limit: int
+    max_limit: int
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    limiter: AdaptiveLimiter = None
+
+    def __post_init__(self):
+        self.limiter = AdaptiveLimiter(self.initial_limit, 1, self.max_limit, self.latency_target)
+
+
+PROVIDERS = {
+    "yfinance": ProviderGuard(timeout=10.0, latency_target=3.0, initial_limit=8, max_limit=32),
+    "google_news": ProviderGuard(timeout=3.0, latency_target=1.5, initial_limit=4, max_limit=16),
+    "litellm": ProviderGuard(timeout=20.0, latency_target=15.0, initial_limit=2, max_limit=4),
+    "idx": ProviderGuard(timeout=30.0, latency_target=15.0, initial_limit=1, max_limit=1),
+}
+
+
+def _admit(provider: str):
+    guard = PROVIDERS[provider]
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        UPSTREAM_REJECTED.inc(provider=provider, reason="deadline")
+        raise UpstreamUnavailable(provider, "deadline exceeded")
+    if not guard.breaker.allow():
+        UPSTREAM_REJECTED.inc(provider=provider, reason="circuit_open")
+        raise UpstreamUnavailable(provider, "circuit open")
+    timeout = guard.timeout if remaining is None else min(guard.timeout, remaining)
+    return guard, timeout
+
+
+def _reject_saturated(provider: str, guard: ProviderGuard):
+    guard.breaker.release_probe()
+    UPSTREAM_REJECTED.inc(provider=provider, reason="saturated")
+    raise UpstreamUnavailable(provider, "concurrency limit reached")
+
+
+def _outcome(error: BaseException, clipped: bool):
+    """
+    (ok, counted) for a call that raised ``error``. ``ok`` is False only for
+    provider failures. A caller giving up (``UpstreamUnavailable`` from inside
+    the call) or a timeout of a call the request deadline had cut short is
+    not ``counted`` toward the breaker either way.
+    """
+    if isinstance(error, UpstreamUnavailable) or (clipped and isinstance(error, TIMEOUT_ERRORS)):
+        return True, False
+    return not is_provider_failure(error), True
+
+
+def _settle(guard: ProviderGuard, started: float, ok: bool, counted: bool = True):
+    """``ok`` is False only for provider failures; a call that raised for a bad request still settles as ok."""
+    latency = time.perf_counter() - started
+    guard.limiter.release(latency, ok)
+    if not counted:
+        guard.breaker.release_probe()
+        return
+    # A call that outlived its timeout counts against the breaker even if it
+    # eventually returned: that is exactly the stall the breaker is for.
+    if ok and latency <= guard.timeout:
+        guard.breaker.record_success()
+    else:
+        guard.breaker.record_failure()
+
+
+@contextmanager
+def upstream_call(provider: str, method: str):
+    """
+    Guard and time one blocking upstream call; yields the timeout (seconds) the
+    call should use. Clients that cannot take a timeout argument read the same
+    budget from ``call_remaining_time`` (see market_data's yfinance session).
+    """
+    guard, timeout = _admit(provider)
+    if not guard.limiter.acquire(timeout):
+        _reject_saturated(provider, guard)
+
+    started = time.perf_counter()
+    ok, counted = False, True
+    clipped = timeout < guard.timeout
+    token = _call_deadline.set((provider, time.monotonic() + timeout, clipped))
+    try:
+        with track_upstream(provider, method):
+            yield timeout
+        ok = True
+    except BaseException as e:
+        ok, counted = _outcome(e, clipped)
+        raise
+    finally:
+        _call_deadline.reset(token)
+        _settle(guard, started, ok, counted)
+
+
+@asynccontextmanager
+async def async_upstream_call(provider: str, method: str, poll_interval: float = 0.05):
+    """``upstream_call`` for coroutines: waits for a slot without blocking the event loop."""
+    guard, timeout = _admit(provider)
+    give_up_at = time.monotonic() + timeout
+    while not guard.limiter.try_acquire():
+        if time.monotonic() >= give_up_at:
+            _reject_saturated(provider, guard)
+        await asyncio.sleep(poll_interval)
+
+    started = time.perf_counter()
+    ok, counted = False, True
+    try:
+        with track_upstream(provider, method):
+            yield max(0.0, give_up_at - time.monotonic())
+        ok = True
+    except BaseException as e:
+        ok, counted = _outcome(e, timeout < guard.timeout)
+        raise
+    finally:
+        _settle(guard, started, ok, counted)
+
+
+def provider_status():
+    return {
+        provider: {"circuit": guard.breaker.state, "limit": int(guard.limiter.limit), "in_flight": guard.limiter.in_flight}
+        for provider, guard in PROVIDERS.items()
+    }
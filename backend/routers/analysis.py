@@ -1,15 +1,19 @@
 import asyncio
 import math
 import random
-import re
-from collections import Counter
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
-from fastapi import APIRouter
-import yfinance as yf
+from fastapi import APIRouter, Query
+import pandas as pd
 
-from database import NewsArticle, SessionLocal
+from database import ArticleTicker, NewsArticle, ReadSessionLocal
+from analytics_store import AnalyticsBusy, analytics_ready, daily_sentiment_history
+from event_study import current_event_weights, event_weight, sentiment_sign
+from market_data import market_data
+from resilience import UpstreamUnavailable
 from news_service import fetch_google_news
+from recap import build_recap
+from universe import record_symbol_view, sector_symbols
 
 
 router = APIRouter(prefix="/api/analysis", tags=["analysis"])
@@ -51,35 +55,26 @@ def _safe_market_cap(value):
         return 0
 
 
-def _fetch_prediction_market_data_sync(ticker: str):
-    stock = yf.Ticker(ticker)
-    return stock.history(period="1mo"), stock.info
-
-
-def _build_prediction_response(symbol: str, timeframe: str, hist, info, stock_news: list):
-    if hist.empty:
-        return {"error": "No data found"}
+# Scoring rules shared with the backtester (python -m backtest) so tuning them
+# is measured against exactly what the endpoint serves.
+STRONG_BUY_SCORE = 5
+BUY_SCORE = 4
+SELL_SCORE = 1
+STRONG_SELL_SCORE = -1
+TECH_MA_SHORT = 5
+# The endpoint's "MA20" averages its whole one-month history, about 21 sessions.
+TECH_MA_LONG = 21
 
-    current_price = float(hist["Close"].iloc[-1])
-    ma5 = float(hist["Close"].tail(5).mean())
-    ma20 = float(hist["Close"].mean())
-
-    tech_score = 0
-    tech_reasons = []
 
-    if ma5 > ma20:
-        tech_score += 1
-        tech_reasons.append("MA5 > MA20 (Uptrend)")
-    if current_price > ma20:
-        tech_score += 1
-        tech_reasons.append("Price > MA20")
+def classify_score(total_score):
+    if total_score >= BUY_SCORE:
+        return "STRONG BUY" if total_score >= STRONG_BUY_SCORE else "BUY"
+    if total_score <= SELL_SCORE:
+        return "STRONG SELL" if total_score <= STRONG_SELL_SCORE else "SELL"
+    return "HOLD"
 
-    tech_signal = "NEUTRAL"
-    if tech_score == 2:
-        tech_signal = "BULLISH"
-    elif tech_score == 0:
-        tech_signal = "BEARISH"
 
+def fundamental_score(info: dict):
     fund_score = 0
     fund_reasons = []
 
@@ -106,6 +101,76 @@ def _build_prediction_response(symbol: str, timeframe: str, hist, info, stock_ne
         fund_score += 1
         fund_reasons.append("Dividen Menarik")
 
+    return fund_score, fund_reasons
+
+
+def prediction_confidence(total_score):
+    return min(max(50 + (total_score * 7), 10), 98)
+
+
+STORED_NEWS_DAYS = 7
+
+
+def _fetch_prediction_market_data_sync(ticker: str):
+    # The facade already falls back to stored bars and the last cached profile.
+    try:
+        hist = market_data.history_sync(ticker, period="1mo").to_frame()
+    except UpstreamUnavailable as e:
+        print(f"No price history for {ticker}: {e}")
+        hist = pd.DataFrame()
+    try:
+        info = market_data.fundamentals_sync(ticker).info
+    except UpstreamUnavailable as e:
+        print(f"Prediction for {ticker} without fundamentals: {e}")
+        info = {}
+    return hist, info
+
+
+def _load_stored_news_sync(symbol: str, limit: int):
+    db = ReadSessionLocal()
+    try:
+        rows = (
+            db.query(NewsArticle.title, NewsArticle.sentiment_label, NewsArticle.event_type)
+            .join(ArticleTicker, ArticleTicker.article_id == NewsArticle.id)
+            .filter(
+                ArticleTicker.symbol == symbol,
+                NewsArticle.published_at >= datetime.utcnow() - timedelta(days=STORED_NEWS_DAYS),
+            )
+            .order_by(NewsArticle.published_at.desc())
+            .limit(limit)
+            .all()
+        )
+    finally:
+        db.close()
+    return [{"title": title, "sentiment_label": label, "event_type": event_type} for title, label, event_type in rows]
+
+
+def _build_prediction_response(symbol: str, timeframe: str, hist, info, stock_news: list, sentiment_weights: dict | None = None):
+    if hist.empty:
+        return {"error": "No data found"}
+
+    current_price = float(hist["Close"].iloc[-1])
+    ma5 = float(hist["Close"].tail(TECH_MA_SHORT).mean())
+    ma20 = float(hist["Close"].mean())
+
+    tech_score = 0
+    tech_reasons = []
+
+    if ma5 > ma20:
+        tech_score += 1
+        tech_reasons.append("MA5 > MA20 (Uptrend)")
+    if current_price > ma20:
+        tech_score += 1
+        tech_reasons.append("Price > MA20")
+
+    tech_signal = "NEUTRAL"
+    if tech_score == 2:
+        tech_signal = "BULLISH"
+    elif tech_score == 0:
+        tech_signal = "BEARISH"
+
+    fund_score, fund_reasons = fundamental_score(info)
+
     fund_signal = "NEUTRAL"
     if fund_score >= 3:
         fund_signal = "STRONG"
@@ -117,30 +182,27 @@ def _build_prediction_response(symbol: str, timeframe: str, hist, info, stock_ne
     pos_news = len([n for n in stock_news if n["sentiment_label"] == "POSITIVE"])
     neg_news = len([n for n in stock_news if n["sentiment_label"] == "NEGATIVE"])
 
-    sent_score = 0
+    # Each headline votes with its confidence-weighted direction times the
+    # weight the event study measured for its event type.
+    net_sentiment = sum(
+        sentiment_sign(n["sentiment_label"], n.get("sentiment_score")) * event_weight(n.get("event_type"), sentiment_weights)
+        for n in stock_news
+    )
+    sent_score = round(max(-1.0, min(1.0, net_sentiment)), 2)
     sent_reasons = []
-    if pos_news > neg_news:
-        sent_score += 1
-        sent_reasons.append(f"Berita Positif Dominan ({pos_news} vs {neg_news})")
-    elif neg_news > pos_news:
-        sent_score -= 1
-        sent_reasons.append(f"Berita Negatif Dominan ({neg_news} vs {pos_news})")
+    news_counts = f"skor {sent_score:+.2f}; {pos_news} positif vs {neg_news} negatif"
+    if sent_score > 0:
+        sent_reasons.append(f"Sentimen Berita Positif ({news_counts})")
+    elif sent_score < 0:
+        sent_reasons.append(f"Sentimen Berita Negatif ({news_counts})")
     else:
         sent_reasons.append("Sentimen Berita Netral")
 
     total_score = tech_score + fund_score + sent_score
     max_score = 7
-    confidence = min(max(50 + (total_score * 7), 10), 98)
-
-    if total_score >= 4:
-        prediction = "STRONG BUY" if total_score >= 5 else "BUY"
-        direction = "UP"
-    elif total_score <= 1:
-        prediction = "STRONG SELL" if total_score <= -1 else "SELL"
-        direction = "DOWN"
-    else:
-        prediction = "HOLD"
-        direction = "SIDEWAYS"
+    confidence = prediction_confidence(total_score)
+    prediction = classify_score(total_score)
+    direction = "UP" if "BUY" in prediction else "DOWN" if "SELL" in prediction else "SIDEWAYS"
 
     volatility = {
         "1m": 0.05,
@@ -211,89 +273,15 @@ def _rank_top_picks(results: list):
     }
 
 
-def _fetch_daily_recap_rows_sync():
-    db = SessionLocal()
+def _build_recap_sync(window: str, sector: str | None):
+    db = ReadSessionLocal()
     try:
-        since = datetime.utcnow() - timedelta(days=1)
-        articles = db.query(NewsArticle).filter(NewsArticle.published_at >= since).all()
-        return [
-            {
-                "title": article.title,
-                "sentiment_label": article.sentiment_label,
-                "related_stock": article.related_stock,
-            }
-            for article in articles
-        ]
+        symbols = sector_symbols(sector) if sector else None
+        return build_recap(db, window=window, sector=sector, symbols=symbols)
     finally:
         db.close()
 
 
-def _build_daily_recap(articles: list):
-    if not articles:
-        return {"recap": "Belum ada cukup data berita hari ini untuk membuat rangkuman. Pasar terlihat tenang."}
-
-    total = len(articles)
-    pos = len([a for a in articles if a["sentiment_label"] == "POSITIVE"])
-    neg = len([a for a in articles if a["sentiment_label"] == "NEGATIVE"])
-    sentiment_score = pos - neg
-    all_text = " ".join([a["title"] for a in articles])
-
-    interesting_tickers = [
-        "BBCA", "BBRI", "BMRI", "BBNI", "ARTO", "BRIS", "GOTO", "EMTK", "BUKA", "DCII",
-        "ADRO", "PGAS", "PTBA", "ANTM", "TINS", "INCO", "MEDC", "UNVR", "ICBP", "INDF",
-        "AMRT", "MYOR", "KLBF", "TLKM", "ISAT", "EXCL", "JSMR", "ASII", "UNTR", "IHSG",
-        "BREN", "TPIA", "BYAN",
-    ]
-
-    found_tickers = []
-    for word in all_text.split():
-        clean_word = re.sub(r"\W+", "", word).upper()
-        if clean_word in interesting_tickers:
-            found_tickers.append(clean_word)
-
-    if found_tickers:
-        top_topics = Counter(found_tickers).most_common(3)
-        topic_str = ", ".join([t[0] for t in top_topics])
-    else:
-        words = re.findall(r"\w+", all_text.lower())
-        ignored = [
-            "di", "ke", "dan", "yang", "ini", "itu", "saham", "untuk", "pt", "tbk", "indonesia", "dengan", "akan", "pada",
-            "market", "bursa", "news", "hari", "juta", "miliar", "triliun", "rp", "persen", "naik", "turun", "stagnan",
-            "sesi", "pagi", "siang", "sore", "penutupan", "pembukaan", "transaksi", "investor", "asing", "dana",
-            "rekomendasi", "target", "harga", "potensi", "proyeksi", "prediksi", "jadwal", "dividen", "rups", "ipo",
-        ]
-        keywords = [w for w in words if w not in ignored and len(w) > 3 and not w.isdigit()]
-        top_topics = Counter(keywords).most_common(1)
-        topic_str = top_topics[0][0].title() if top_topics else "Ekonomi Global"
-
-    stock_counts = Counter([a["related_stock"] for a in articles if a["related_stock"] != "Global"])
-    top_stock = stock_counts.most_common(1)
-    top_stock_name = top_stock[0][0] if top_stock else "Blue Chip"
-
-    if sentiment_score > total * 0.2:
-        mood = "Optimis"
-        desc = "didominasi sentimen positif"
-    elif sentiment_score < -total * 0.2:
-        mood = "Waspada"
-        desc = "cenderung tertekan"
-    else:
-        mood = "Netral"
-        desc = "bergerak sideways/netral"
-
-    recap_text = (
-        f"Market Recap Hari Ini: Pasar terlihat **{mood}** dan {desc}. "
-        f"Fokus investor tertuju pada isu **{topic_str}**. "
-        f"Saham **{top_stock_name}** menjadi sorotan utama dalam pemberitaan 24 jam terakhir."
-    )
-
-    return {
-        "mood": mood,
-        "sentiment_score": sentiment_score,
-        "top_topic": topic_str,
-        "recap": recap_text,
-    }
-
-
 @router.get("/prediction/{symbol}")
 async def get_stock_prediction(symbol: str, timeframe: str = "3m"):
     ticker = f"{symbol.upper()}.JK"
@@ -302,12 +290,41 @@ async def get_stock_prediction(symbol: str, timeframe: str = "3m"):
         market_data_task = asyncio.create_task(asyncio.to_thread(_fetch_prediction_market_data_sync, ticker))
         news_task = asyncio.create_task(fetch_google_news(f"{symbol} saham", limit=5))
         (hist, info), stock_news = await asyncio.gather(market_data_task, news_task)
-        return sanitize_for_json(_build_prediction_response(symbol, timeframe, hist, info, stock_news))
+        if not stock_news:
+            # Feed down or empty: score the headlines the worker already stored.
+            stock_news = await asyncio.to_thread(_load_stored_news_sync, symbol.upper(), 5)
+        # A few means and comparisons: cheaper on a thread than pickling the frame to the pool.
+        response = await asyncio.to_thread(
+            _build_prediction_response, symbol, timeframe, hist, info, stock_news, current_event_weights()
+        )
+        if "error" not in response:
+            record_symbol_view(symbol)
+        return sanitize_for_json(response)
     except Exception as e:
         print(f"Error in prediction: {e}")
         return {"error": str(e)}
 
 
+def _sentiment_history_sync(symbol: str, days: int):
+    if not analytics_ready():
+        return {"error": "Analytics store is not available yet."}
+
+    try:
+        history = daily_sentiment_history(symbol, date.today() - timedelta(days=days))
+    except AnalyticsBusy:
+        return {"error": "Analytics store is syncing; try again shortly."}
+    history["day"] = history["day"].astype(str)
+    return {"symbol": symbol, "days": days, "history": history.to_dict(orient="records")}
+
+
+@router.get("/sentiment-history/{symbol}")
+async def get_sentiment_history(symbol: str, days: int = Query(365, ge=7, le=1825)):
+    try:
+        return sanitize_for_json(await asyncio.to_thread(_sentiment_history_sync, symbol.upper(), days))
+    except Exception as e:
+        return {"error": str(e)}
+
+
 @router.get("/top-picks")
 async def get_top_picks():
     from routers.stocks import POPULAR_TICKERS, SMALL_CAP_TICKERS
@@ -339,9 +356,11 @@ async def get_ipo_rumors():
 
 
 @router.get("/recap")
-async def get_daily_recap():
+async def get_daily_recap(
+    window: str = Query("today", pattern="^(today|week)$"),
+    sector: str | None = Query(None, max_length=32),
+):
     try:
-        articles = await asyncio.to_thread(_fetch_daily_recap_rows_sync)
-        return _build_daily_recap(articles)
+        return await asyncio.to_thread(_build_recap_sync, window, sector)
     except Exception as e:
         return {"error": str(e)}
@@ -2,19 +2,26 @@ import asyncio
 
 from fastapi import APIRouter, HTTPException, Query
 
-from database import NewsArticle, SessionLocal
+from database import ArticleTicker, NewsArticle, ReadSessionLocal, SessionLocal
+from news_index import known_symbols
 from news_service import fetch_google_news, save_articles_to_db
 
 
 router = APIRouter(prefix="/api/news", tags=["news"])
 
 
-def _query_market_news_sync(q: str):
-    db = SessionLocal()
+def _query_market_news_sync(q: str, session_factory=ReadSessionLocal):
+    db = session_factory()
     try:
         query = db.query(NewsArticle).order_by(NewsArticle.published_at.desc())
 
-        if q and q != "Global":
+        symbol = q.upper()
+        if symbol in known_symbols():
+            # Indexed join through article_tickers; the backfill links related_stock too.
+            query = query.join(ArticleTicker, ArticleTicker.article_id == NewsArticle.id).filter(
+                ArticleTicker.symbol == symbol
+            )
+        elif q and q != "Global":
             search_filter = f"%{q}%"
             query = query.filter(
                 (NewsArticle.related_stock == q) |
@@ -43,11 +50,13 @@ def _query_market_news_sync(q: str):
 
 
 def _save_live_news_sync(articles: list, related_stock: str):
+    """Save live articles, then re-read on the primary: a replica may not have them yet."""
     db = SessionLocal()
     try:
         save_articles_to_db(db, articles, related_stock=related_stock)
     finally:
         db.close()
+    return _query_market_news_sync(related_stock, session_factory=SessionLocal)
 
 
 @router.get("/")
@@ -65,8 +74,7 @@ async def get_market_news(
                 timeout=4,
             )
             if live_articles:
-                await asyncio.to_thread(_save_live_news_sync, live_articles, q)
-                results = await asyncio.to_thread(_query_market_news_sync, q)
+                results = await asyncio.to_thread(_save_live_news_sync, live_articles, q)
 
         return results
     except TimeoutError:
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Cookie, Depends, HTTPException
+import asyncio
+from datetime import date
+
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Query
+import pandas as pd
 from pydantic import BaseModel, Field, constr
 from sqlalchemy.orm import Session
-from database import SessionLocal, Portfolio
-import yfinance as yf
+from database import ReadSessionLocal, SessionLocal, Portfolio, Transaction
+import portfolio_engine
+from market_data import market_data
 from typing import List
 
 router = APIRouter(prefix="/api/portfolio", tags=["portfolio"])
@@ -36,111 +41,174 @@ class PortfolioResponse(BaseModel):
     gain_loss_pct: float
     gain_loss_value: float
 
+def _load_portfolio_rows_sync():
+    db = SessionLocal()
+    try:
+        return [
+            {
+                "id": item.id,
+                "symbol": item.symbol,
+                "avg_price": item.avg_price,
+                "total_shares": item.total_shares,
+                "total_invested": item.total_invested,
+            }
+            for item in db.query(Portfolio).all()
+        ]
+    finally:
+        db.close()
+
+
+def _fetch_portfolio_prices_sync(symbols: list[str]):
+    try:
+        return market_data.quotes_bulk_sync(symbols)
+    except Exception as e:
+        print(f"Error fetching portfolio prices: {e}")
+        return {}
+
+
+def _value_portfolio(rows: list[dict], prices: dict):
+    """
+    Vectorized valuation. Holdings without a live price fall back to their invested value.
+    """
+    frame = pd.DataFrame(rows)
+    shares = frame["total_shares"].astype(float)
+    stored_invested = frame["total_invested"].astype(float).fillna(0.0)
+    invested = stored_invested.where(stored_invested != 0, frame["avg_price"] * shares)
+
+    live_price = frame["symbol"].map(prices).astype(float)
+    priced = live_price.notna()
+
+    frame["current_price"] = live_price.fillna(frame["avg_price"])
+    frame["total_value"] = (live_price * shares).where(priced, invested)
+    frame["gain_loss_value"] = (frame["total_value"] - invested).where(priced, 0.0)
+    frame["gain_loss_pct"] = (frame["gain_loss_value"] / invested * 100).where(priced & (invested > 0), 0.0)
+    frame["total_lots"] = (shares // 100).astype(int)
+    frame["invested"] = invested
+    return frame
+
+
+async def _value_portfolio_async():
+    rows = await asyncio.to_thread(_load_portfolio_rows_sync)
+    if not rows:
+        return None
+
+    symbols = sorted({row["symbol"] for row in rows})
+    try:
+        prices = await market_data.quotes_bulk(symbols)
+    except Exception as e:
+        print(f"Error fetching portfolio prices: {e}")
+        prices = {}
+    return _value_portfolio(rows, prices)
+
+
 @router.get("/", response_model=List[PortfolioResponse])
-def get_portfolio(db: Session = Depends(get_db)):
+async def get_portfolio():
     """
     Get all portfolio items with REAL-TIME valuation.
+    All symbols are priced with one bulk quote fetch.
     """
-    items = db.query(Portfolio).all()
-    results = []
-    
-    if not items:
+    frame = await _value_portfolio_async()
+    if frame is None:
         return []
 
-    # Optimize: Fetch all prices in batch or loop? 
-    # yfinance is fast enough for small portfolios. Loop is fine for personal use.
-    
-    for item in items:
-        try:
-            # Fetch Live Price
-            ticker = f"{item.symbol}.JK"
-            stock = yf.Ticker(ticker)
-             # Try fast fetch first
-            current_price = stock.info.get("currentPrice") or stock.info.get("regularMarketPrice") or stock.history(period="1d")["Close"].iloc[-1]
-            
-            # Calculate Values
-            total_shares = item.total_shares
-            total_lots = total_shares / 100
-            
-            # Use stored total_invested if available for better avg price precision, else calc
-            invested = item.total_invested or (item.avg_price * total_shares)
-            
-            current_value = current_price * total_shares
-            gain_loss_value = current_value - invested
-            gain_loss_pct = (gain_loss_value / invested) * 100 if invested > 0 else 0
-            
-            results.append({
-                "id": item.id,
-                "symbol": item.symbol,
-                "avg_price": item.avg_price,
-                "total_lots": int(total_lots),
-                "current_price": current_price,
-                "total_value": current_value,
-                "gain_loss_pct": gain_loss_pct,
-                "gain_loss_value": gain_loss_value
-            })
-            
-        except Exception as e:
-            print(f"Error valuaing {item.symbol}: {e}")
-            # Return static/last known data if fetch fails
-            results.append({
-                "id": item.id,
-                "symbol": item.symbol,
-                "avg_price": item.avg_price,
-                "total_lots": int(item.total_shares / 100),
-                "current_price": item.avg_price, # Fallback
-                "total_value": item.total_invested,
-                "gain_loss_pct": 0,
-                "gain_loss_value": 0
-            })
-            
-    return results
+    columns = list(PortfolioResponse.model_fields)
+    return frame[columns].to_dict(orient="records")
+
+
+@router.get("/summary")
+async def get_portfolio_summary():
+    """
+    Portfolio totals: invested, current value and unrealized P&L.
+    """
+    frame = await _value_portfolio_async()
+    if frame is None:
+        return {"total_invested": 0.0, "total_value": 0.0, "gain_loss_value": 0.0, "gain_loss_pct": 0.0}
+
+    total_invested = float(frame["invested"].sum())
+    total_value = float(frame["total_value"].sum())
+    gain_loss_value = total_value - total_invested
+
+    return {
+        "total_invested": total_invested,
+        "total_value": total_value,
+        "gain_loss_value": gain_loss_value,
+        "gain_loss_pct": (gain_loss_value / total_invested) * 100 if total_invested > 0 else 0.0,
+    }
+
+@router.get("/transactions")
+def get_transactions(db: Session = Depends(get_db)):
+    """
+    Transaction ledger, newest first.
+    """
+    transactions = db.query(Transaction).order_by(Transaction.executed_at.desc()).limit(500).all()
+    return [
+        {
+            "id": tx.id,
+            "symbol": tx.symbol,
+            "side": tx.side,
+            "lots": tx.shares // 100,
+            "price": tx.price,
+            "executed_at": tx.executed_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "realized_pnl": tx.realized_pnl,
+        }
+        for tx in transactions
+    ]
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@router.get("/performance")
+def get_performance(start: date | None = None, end: date | None = None, db: Session = Depends(get_read_db)):
+    """
+    Equity curve, time-weighted return and P&L for a date range, served from daily snapshots.
+    Snapshots are kept current by the transaction endpoints and the worker's daily refresh.
+    """
+    return portfolio_engine.get_performance(db, start=start, end=end)
+
 
 @router.post("/", dependencies=[Depends(require_auth)])
 def add_transaction(item: PortfolioItem, db: Session = Depends(get_db)):
     """
-    Buy Stock: Updates Average Price if exists, or creates new entry.
+    Buy Stock: Records a BUY in the ledger and updates the average price.
     Input: symbol, price (per share), lots
     """
-    symbol = item.symbol.upper()
-    shares_bought = item.lots * 100
-    total_cost = shares_bought * item.price
-    
-    existing = db.query(Portfolio).filter(Portfolio.symbol == symbol).first()
-    
-    if existing:
-        # Average Down Calculation
-        new_total_shares = existing.total_shares + shares_bought
-        new_total_invested = existing.total_invested + total_cost
-        new_avg_price = new_total_invested / new_total_shares
-        
-        existing.total_shares = new_total_shares
-        existing.total_invested = new_total_invested
-        existing.avg_price = new_avg_price
-    else:
-        # Create New
-        new_item = Portfolio(
-            symbol=symbol,
-            total_shares=shares_bought,
-            total_invested=total_cost,
-            avg_price=item.price
-        )
-        db.add(new_item)
-    
-    db.commit()
+    portfolio_engine.apply_transaction(db, item.symbol, portfolio_engine.BUY, item.lots * 100, item.price)
     return {"message": "Transaction added successfully"}
 
+
+@router.post("/sell", dependencies=[Depends(require_auth)])
+def sell_transaction(item: PortfolioItem, db: Session = Depends(get_db)):
+    """
+    Sell Stock: Records a SELL in the ledger and realizes P&L against the average cost.
+    Input: symbol, price (per share), lots
+    """
+    try:
+        transaction = portfolio_engine.apply_transaction(db, item.symbol, portfolio_engine.SELL, item.lots * 100, item.price)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Transaction added successfully", "realized_pnl": transaction.realized_pnl}
+
+
 @router.delete("/{symbol}", dependencies=[Depends(require_auth)])
-def delete_asset(symbol: str, db: Session = Depends(get_db)):
+def delete_asset(symbol: str, price: float | None = Query(default=None, gt=0), db: Session = Depends(get_db)):
     """
     Remove asset from portfolio (Sell All).
+    Sold at the given price, else the last market price, else the average price.
     """
     symbol = symbol.upper()
     item = db.query(Portfolio).filter(Portfolio.symbol == symbol).first()
     
     if not item:
         raise HTTPException(status_code=404, detail="Asset not found")
-        
-    db.delete(item)
-    db.commit()
+
+    if price is None:
+        price = _fetch_portfolio_prices_sync([symbol]).get(symbol) or item.avg_price
+
+    portfolio_engine.apply_transaction(db, symbol, portfolio_engine.SELL, item.total_shares, price)
     return {"message": f"{symbol} removed from portfolio"}
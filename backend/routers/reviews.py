@@ -36,6 +36,14 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    db = database.ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def require_admin(x_admin_token: str | None = Header(default=None)):
     expected = os.getenv("ADMIN_API_TOKEN")
     if not expected or x_admin_token != expected:
@@ -56,5 +64,5 @@ def create_review(review: ReviewCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=List[ReviewResponse], dependencies=[Depends(require_admin)])
-def get_reviews(db: Session = Depends(get_db)):
+def get_reviews(db: Session = Depends(get_read_db)):
     return db.query(database.Review).order_by(database.Review.created_at.desc()).limit(200).all()
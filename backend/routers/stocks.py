@@ -1,8 +1,14 @@
 import asyncio
 import math
+from dataclasses import asdict
 
 from fastapi import APIRouter
-import yfinance as yf
+import pandas as pd
+
+from market_data import market_data
+from price_store import BarWindow
+from search_index import get_search_index
+from universe import instruments_version, load_instrument_frame, record_symbol_view, sector_summary_sync
 
 
 router = APIRouter(prefix="/api/stocks", tags=["stocks"])
@@ -22,6 +28,19 @@ SMALL_CAP_TICKERS = [
     "AUTO.JK", "DRMA.JK", "MAPA.JK", "ACES.JK", "ELSA.JK",
 ]
 
+# Normalized sector (see _normalize_sector) of every tracked ticker.
+SECTOR_TICKERS = {
+    "Finance": ["BBCA", "BBRI", "BMRI", "BBNI", "ARTO", "BRIS"],
+    "Technology": ["GOTO", "EMTK", "BUKA", "DCII"],
+    "Energy": ["ADRO", "PGAS", "PTBA", "MEDC", "DOID", "HRUM", "ELSA", "MYOH"],
+    "Basic Materials": ["ANTM", "TINS", "INCO"],
+    "Consumer": ["UNVR", "ICBP", "INDF", "AMRT", "MYOR", "CLEO", "ERAA", "AUTO", "DRMA", "MAPA", "ACES", "WOOD", "GJTL"],
+    "Healthcare": ["KLBF", "SIDO"],
+    "Infrastructure": ["TLKM", "ISAT", "EXCL"],
+    "Industrials": ["ASII", "UNTR", "JSMR", "MARK"],
+    "Real Estate": ["PANI"],
+}
+
 
 def sanitize_for_json(data):
     if isinstance(data, float):
@@ -67,23 +86,22 @@ def _normalize_sector(sector: str):
 
 
 def _fetch_ihsg_data_sync():
-    ihsg = yf.Ticker("^JKSE")
-    hist = ihsg.history(period="3mo")
-    info = ihsg.info
+    bars = market_data.history_sync("^JKSE", period="3mo")
+    profile = market_data.fundamentals_sync("^JKSE")
 
-    if hist.empty:
+    if not bars:
         return {"error": "No IHSG data found"}
 
     history_data = [
         {
-            "date": date.strftime("%Y-%m-%d"),
-            "value": float(row["Close"]),
+            "date": str(day),
+            "value": float(close),
         }
-        for date, row in hist.iterrows()
+        for day, close in zip(bars.dates, bars.close)
     ]
 
-    current_price = info.get("regularMarketPrice") or float(hist["Close"].iloc[-1])
-    prev_close = info.get("previousClose") or (float(hist["Close"].iloc[-2]) if len(hist) > 1 else current_price)
+    current_price = profile.price or float(bars.close[-1])
+    prev_close = profile.previous_close or (float(bars.close[-2]) if len(bars) > 1 else current_price)
     change = current_price - prev_close
     change_pct = (change / prev_close) * 100 if prev_close else 0
 
@@ -97,21 +115,47 @@ def _fetch_ihsg_data_sync():
     })
 
 
+def _market_summary_from_instruments():
+    frame = load_instrument_frame()
+    symbols = [ticker.replace(".JK", "") for ticker in POPULAR_TICKERS]
+    frame = frame[frame["symbol"].isin(symbols)].dropna(subset=["last_price", "previous_close"])
+    frame = frame[frame["previous_close"] > 0]
+    if frame.empty:
+        return None
+
+    change = frame["last_price"] - frame["previous_close"]
+    change_pct = change / frame["previous_close"] * 100
+    summary = pd.DataFrame({
+        "symbol": frame["symbol"],
+        "name": frame["name"].fillna(frame["symbol"]),
+        "price": frame["last_price"],
+        "change": change.round(2),
+        "change_pct": change_pct.round(2),
+        "status": ["up" if pct > 0 else "down" if pct < 0 else "neutral" for pct in change_pct],
+        "volume": frame["volume"].fillna(0).astype(int),
+        "marketCap": frame["market_cap"].fillna(0),
+        "sector": frame["sector"].fillna("Others"),
+    })
+    summary = summary.sort_values("change_pct", ascending=False)
+    return sanitize_for_json(summary.to_dict(orient="records"))
+
+
 def _fetch_market_summary_sync():
-    data = []
-    stocks = yf.Tickers(" ".join(POPULAR_TICKERS))
+    # The worker keeps the instruments table current; per-ticker info is only
+    # the fallback before its first refresh has landed.
+    data = _market_summary_from_instruments()
+    if data is not None:
+        return data
 
+    data = []
     for ticker in POPULAR_TICKERS:
         try:
-            info = stocks.tickers[ticker].info
+            profile = market_data.fundamentals_sync(ticker)
         except Exception:
             continue
 
-        if not info:
-            continue
-
-        price = info.get("currentPrice") or info.get("regularMarketPrice")
-        prev_close = info.get("previousClose") or info.get("regularMarketPreviousClose")
+        price = profile.price
+        prev_close = profile.previous_close
         if not price or not prev_close:
             continue
 
@@ -119,160 +163,182 @@ def _fetch_market_summary_sync():
         change_pct = (change / prev_close) * 100 if prev_close else 0
 
         data.append({
-            "symbol": ticker.replace(".JK", ""),
-            "name": info.get("longName", ticker),
+            "symbol": profile.symbol,
+            "name": profile.name or ticker,
             "price": price,
             "change": round(change, 2),
             "change_pct": round(change_pct, 2),
             "status": "up" if change_pct > 0 else "down" if change_pct < 0 else "neutral",
-            "volume": info.get("volume", 0),
-            "marketCap": info.get("marketCap", 0),
-            "sector": _normalize_sector(info.get("sector", "Others")),
+            "volume": profile.volume or 0,
+            "marketCap": profile.market_cap or 0,
+            "sector": _normalize_sector(profile.sector or "Others"),
         })
 
     data.sort(key=lambda x: x["change_pct"], reverse=True)
     return sanitize_for_json(data)
 
 
-def _search_stock_sync(query: str):
-    ticker_str = f"{query}.JK"
-    stock = yf.Ticker(ticker_str)
-    info = stock.info
+def _live_symbol_lookup_sync(query: str):
+    profile = market_data.fundamentals_sync(query)
 
-    if not info or not (info.get("currentPrice") or info.get("regularMarketPrice")):
+    if not profile.info or not profile.price:
         return []
 
-    price = info.get("currentPrice") or info.get("regularMarketPrice")
-    prev_close = info.get("previousClose") or info.get("regularMarketPreviousClose")
+    price = profile.price
+    prev_close = profile.previous_close
     change = price - prev_close if price and prev_close else 0
     change_pct = (change / prev_close) * 100 if prev_close else 0
 
     return sanitize_for_json([{
         "symbol": query,
-        "name": info.get("longName", query),
+        "name": profile.name or query,
         "price": price,
         "change": round(change, 2),
         "change_pct": round(change_pct, 2),
         "status": "up" if change_pct > 0 else "down" if change_pct < 0 else "neutral",
-        "marketCap": info.get("marketCap", 0),
-        "sector": _normalize_sector(info.get("sector", "Others")),
+        "marketCap": profile.market_cap or 0,
+        "sector": _normalize_sector(profile.sector or "Others"),
     }])
 
 
-def get_holders_data(stock):
-    holders = []
+def _search_index():
+    return get_search_index(
+        instruments_version(),
+        lambda: load_instrument_frame()[["symbol", "name"]].itertuples(index=False, name=None),
+    )
+
+
+def _search_stock_sync(query: str, limit: int = 10):
+    matches = _search_index().search(query, limit)
+    if not matches:
+        # Not in the universe yet (e.g. a fresh listing): one live lookup for a code-shaped query.
+        symbol = query.strip().upper()
+        return _live_symbol_lookup_sync(symbol) if len(symbol) == 4 and symbol.isalpha() else []
+
+    frame = load_instrument_frame().set_index("symbol")
+    results = []
+    for rank, (symbol, name, score) in enumerate(matches):
+        row = frame.loc[symbol] if symbol in frame.index else None
+        price = row["last_price"] if row is not None else None
+        prev_close = row["previous_close"] if row is not None else None
+
+        if rank == 0 and pd.isna(price):
+            # Only the top suggestion is worth an upstream quote.
+            price = market_data.quotes_bulk_sync([symbol]).get(symbol)
+
+        change = price - prev_close if not pd.isna(price) and not pd.isna(prev_close) else 0
+        change_pct = (change / prev_close) * 100 if change and prev_close else 0
+        results.append({
+            "symbol": symbol,
+            "name": name,
+            "price": price,
+            "change": round(change, 2),
+            "change_pct": round(change_pct, 2),
+            "status": "up" if change_pct > 0 else "down" if change_pct < 0 else "neutral",
+            "marketCap": row["market_cap"] if row is not None else None,
+            "sector": row["sector"] if row is not None and not pd.isna(row["sector"]) else "Others",
+            "match_score": score,
+        })
+    return sanitize_for_json(results)
+
+
+def _quote_section(quote):
+    section = {
+        "price": quote.price,
+        "previous_close": quote.previous_close,
+        "change": round(quote.change, 2),
+        "change_pct": round(quote.change_pct, 2),
+        "volume": quote.volume,
+    }
+    if quote.stale:
+        section["stale"] = True
+    else:
+        section.update({
+            "open": quote.open,
+            "day_high": quote.day_high,
+            "day_low": quote.day_low,
+            "fifty_two_week_high": quote.year_high,
+            "fifty_two_week_low": quote.year_low,
+            "currency": quote.currency,
+        })
+    return section
+
+
+def _history_section(bars: BarWindow):
+    return {
+        "history": [
+            {
+                "time": str(day),
+                "open": float(open_),
+                "high": float(high),
+                "low": float(low),
+                "close": float(close),
+                "volume": int(volume),
+            }
+            for day, open_, high, low, close, volume in zip(bars.dates, bars.open, bars.high, bars.low, bars.close, bars.volume)
+        ],
+    }
+
+
+def _fundamentals_section(profile):
+    return {
+        "info": profile.info,
+        "market_cap": profile.market_cap,
+        "pe_ratio": profile.pe_ratio,
+        "pbv_ratio": profile.pbv_ratio,
+        "roe": profile.roe,
+        "dividend_yield": profile.dividend_yield,
+        "revenue": profile.revenue,
+        "net_income": profile.net_income,
+        "book_value": profile.book_value,
+        "shares_outstanding": profile.shares_outstanding,
+        "float_shares": profile.float_shares,
+        "enterprise_value": profile.enterprise_value,
+        "ebitda": profile.ebitda,
+        "website": profile.website or "",
+        "industry": profile.industry or "Unknown",
+        "sector": profile.sector or "Unknown",
+        "description": profile.description or "No description available.",
+        "average_volume": profile.average_volume,
+        "beta": profile.beta,
+        "ipo_date": profile.ipo_date,
+    }
+
+
+def _holders_section(symbol: str):
     try:
-        inst_holders = stock.institutional_holders
-        if inst_holders is not None and not inst_holders.empty:
-            for _, row in inst_holders.iterrows():
-                holders.append({
-                    "name": row.get("Holder", "Unknown"),
-                    "shares": row.get("Shares", 0),
-                    "date": str(row.get("Date Reported", "")),
-                    "type": "Institution",
-                })
-
-        mf_holders = stock.mutualfund_holders
-        if mf_holders is not None and not mf_holders.empty:
-            for _, row in mf_holders.iterrows():
-                holders.append({
-                    "name": row.get("Holder", "Unknown"),
-                    "shares": row.get("Shares", 0),
-                    "date": str(row.get("Date Reported", "")),
-                    "type": "Mutual Fund",
-                })
-
-        return holders[:10]
+        return {"share_holders": [asdict(holder) for holder in market_data.holders_sync(symbol)]}
     except Exception:
-        return []
+        return {"share_holders": []}
 
 
-def get_robust_shares(stock, info):
-    shares = info.get("sharesOutstanding")
-    if not shares:
-        try:
-            shares = stock.fast_info["shares"]
-        except Exception:
-            shares = None
-    return shares
+# Caching, stale fallbacks and request sharing all live in market_data; a
+# section is just the formatting of one facade record.
+STOCK_SECTIONS = {
+    "quote": lambda symbol: _quote_section(market_data.quote_sync(symbol)),
+    "history": lambda symbol: _history_section(market_data.history_sync(symbol, period="1mo")),
+    "fundamentals": lambda symbol: _fundamentals_section(market_data.fundamentals_sync(symbol, complete=True)),
+    "holders": _holders_section,
+    "officers": lambda symbol: {"officers": market_data.fundamentals_sync(symbol).officers},
+}
 
 
-def get_robust_metric(stock, info, key):
-    val = info.get(key)
+def _fetch_stock_section_sync(symbol: str, section: str):
+    return sanitize_for_json(STOCK_SECTIONS[section](symbol.upper()))
 
-    if val is None and key == "ebitda":
-        try:
-            stmt = stock.income_stmt
-            if not stmt.empty:
-                if "EBITDA" in stmt.index:
-                    val = stmt.loc["EBITDA"].iloc[0]
-                elif "Normalized EBITDA" in stmt.index:
-                    val = stmt.loc["Normalized EBITDA"].iloc[0]
-                elif "Pretax Income" in stmt.index:
-                    pretax = stmt.loc["Pretax Income"].iloc[0]
-                    interest = stmt.loc["Interest Expense"].iloc[0] if "Interest Expense" in stmt.index else 0
-                    depreciation = stmt.loc["Reconciled Depreciation"].iloc[0] if "Reconciled Depreciation" in stmt.index else 0
-                    val = pretax + interest + depreciation
-        except Exception:
-            pass
-
-    if val is None:
-        return None
 
-    currency = info.get("currency")
-    financial_currency = info.get("financialCurrency")
-    if currency == "IDR" and financial_currency == "USD":
-        return val * 16500
+def _parse_sections(sections: str | None):
+    if not sections:
+        return list(STOCK_SECTIONS)
 
-    return val
-
-
-def _fetch_stock_detail_sync(symbol: str):
-    ticker = f"{symbol.upper()}.JK"
-    stock = yf.Ticker(ticker)
-    hist = stock.history(period="1mo")
-    info = stock.info
-
-    history_data = [
-        {
-            "time": date.strftime("%Y-%m-%d"),
-            "open": float(row["Open"]),
-            "high": float(row["High"]),
-            "low": float(row["Low"]),
-            "close": float(row["Close"]),
-            "volume": _safe_int(row.get("Volume"), 0),
-        }
-        for date, row in hist.iterrows()
-    ]
-
-    return sanitize_for_json({
-        "symbol": symbol.upper(),
-        "info": info,
-        "history": history_data,
-        "market_cap": info.get("marketCap"),
-        "pe_ratio": info.get("trailingPE"),
-        "pbv_ratio": info.get("priceToBook"),
-        "roe": info.get("returnOnEquity"),
-        "dividend_yield": info.get("dividendYield"),
-        "revenue": info.get("totalRevenue"),
-        "net_income": info.get("netIncomeToCommon"),
-        "book_value": get_robust_metric(stock, info, "bookValue"),
-        "shares_outstanding": get_robust_shares(stock, info),
-        "float_shares": info.get("floatShares"),
-        "enterprise_value": get_robust_metric(stock, info, "enterpriseValue"),
-        "ebitda": get_robust_metric(stock, info, "ebitda"),
-        "officers": info.get("companyOfficers", []),
-        "website": info.get("website", ""),
-        "industry": info.get("industry", "Unknown"),
-        "sector": info.get("sector", "Unknown"),
-        "description": info.get("longBusinessSummary", "No description available."),
-        "fifty_two_week_high": info.get("fiftyTwoWeekHigh"),
-        "fifty_two_week_low": info.get("fiftyTwoWeekLow"),
-        "average_volume": info.get("averageVolume"),
-        "beta": info.get("beta"),
-        "ipo_date": info.get("firstTradeDateEpochUtc"),
-        "share_holders": get_holders_data(stock),
-    })
+    requested = []
+    for section in sections.split(","):
+        section = section.strip().lower()
+        if section not in STOCK_SECTIONS:
+            raise ValueError(f"Unknown section: {section}")
+        if section not in requested:
+            requested.append(section)
+    return requested
 
 
 @router.get("/ihsg")
@@ -291,20 +357,50 @@ async def get_market_summary():
         return {"error": str(e)}
 
 
+@router.get("/sectors")
+async def get_sector_summary():
+    try:
+        return await asyncio.to_thread(sector_summary_sync)
+    except Exception as e:
+        return {"error": str(e)}
+
+
 @router.get("/search")
 async def search_stock(q: str):
     if not q:
         return []
 
     try:
-        return await asyncio.to_thread(_search_stock_sync, q.upper())
+        return await asyncio.to_thread(_search_stock_sync, q)
     except Exception:
         return []
 
 
 @router.get("/{symbol}")
-async def get_stock_detail(symbol: str):
+async def get_stock_detail(symbol: str, sections: str | None = None):
     try:
-        return await asyncio.to_thread(_fetch_stock_detail_sync, symbol)
-    except Exception as e:
+        requested = _parse_sections(sections)
+    except ValueError as e:
         return {"error": str(e)}
+
+    results = await asyncio.gather(
+        *(asyncio.to_thread(_fetch_stock_section_sync, symbol, section) for section in requested),
+        return_exceptions=True,
+    )
+
+    detail = {"symbol": symbol.upper()}
+    errors = {}
+    for section, result in zip(requested, results):
+        if isinstance(result, Exception):
+            errors[section] = str(result)
+        else:
+            detail.update(result)
+
+    if errors and len(errors) == len(requested):
+        return {"error": next(iter(errors.values()))}
+    if errors:
+        detail["section_errors"] = errors
+    # Only a symbol that resolved to prices counts as a view for refresh tiering.
+    if detail.get("price") is not None or detail.get("history"):
+        record_symbol_view(symbol)
+    return detail
@@ -0,0 +1,55 @@
+import asyncio
+
+from fastapi import APIRouter, Query, Request
+from starlette.responses import StreamingResponse
+
+from events import broker
+
+
+router = APIRouter(prefix="/api/stream", tags=["stream"])
+
+HEARTBEAT_SECONDS = 15
+MAX_STREAM_SYMBOLS = 20
+
+
+def _parse_symbols(symbols: str):
+    parsed = {
+        symbol.strip().upper().replace(".JK", "")
+        for symbol in symbols.split(",")
+        if symbol.strip()
+    }
+    return set(sorted(parsed)[:MAX_STREAM_SYMBOLS])
+
+
+@router.get("/")
+async def stream_events(
+    request: Request,
+    symbols: str = Query("", max_length=200, pattern=r"^[A-Za-z0-9.,]*$"),
+    news: bool = True,
+):
+    """
+    Server-sent events: `quote` for price changes of the subscribed symbols and
+    `news` for newly saved articles. Clients share one upstream refresh in the worker.
+    """
+    wanted = _parse_symbols(symbols)
+
+    async def event_source():
+        # Subscribe only once the response streams, so a request that never starts one leaks nothing.
+        subscription = broker.subscribe(wanted, news=news)
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield message
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,130 @@
+import re
+import threading
+from collections import Counter, defaultdict
+
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+# Corporate boilerplate every IDX name carries; matching on it ranks nothing.
+NAME_STOPWORDS = frozenset(["pt", "tbk", "persero", "indonesia"])
+
+MIN_PREFIX = 2
+MIN_NAME_SIMILARITY = 0.35
+
+EXACT_SYMBOL = 100.0
+SYMBOL_PREFIX = 80.0
+SYMBOL_TYPO = 70.0
+NAME_PREFIX = 60.0
+NAME_FUZZY = 50.0
+
+
+def _name_words(name: str):
+    return [word for word in WORD_RE.findall((name or "").lower()) if word not in NAME_STOPWORDS]
+
+
+def _trigrams(text: str):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _deletions(text: str):
+    """``text`` with one character removed at every position; pairs of these catch one-edit typos."""
+    return {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+class SymbolSearchIndex:
+    """
+    In-memory lookup over symbols and company names:
+    exact/prefix symbol hits, one-edit symbol typos (deletion neighbourhoods),
+    name-word prefixes, and trigram similarity for misspelled names.
+    Every path is a handful of dict lookups, so a query never scans the universe.
+    """
+
+    def __init__(self, instruments: list[tuple[str, str | None]]):
+        self.names = {}
+        self._symbol_prefixes = defaultdict(set)
+        self._symbol_deletions = defaultdict(set)
+        self._word_prefixes = defaultdict(set)
+        self._trigram_postings = defaultdict(set)
+        self._trigram_counts = {}
+
+        for symbol, name in instruments:
+            symbol = symbol.upper()
+            self.names[symbol] = name or symbol
+            for end in range(1, len(symbol)):
+                self._symbol_prefixes[symbol[:end]].add(symbol)
+            for variant in _deletions(symbol) | {symbol}:
+                self._symbol_deletions[variant].add(symbol)
+
+            words = _name_words(name)
+            for word in words:
+                for end in range(MIN_PREFIX, len(word) + 1):
+                    self._word_prefixes[word[:end]].add(symbol)
+
+            grams = _trigrams(" ".join(words))
+            self._trigram_counts[symbol] = len(grams)
+            for gram in grams:
+                self._trigram_postings[gram].add(symbol)
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query: str, limit: int = 10):
+        """Ranked ``(symbol, name, score)`` suggestions, best first."""
+        query = (query or "").strip()
+        if not query:
+            return []
+
+        scores = {}
+
+        def offer(symbol, score):
+            if score > scores.get(symbol, 0):
+                scores[symbol] = score
+
+        upper = query.upper()
+        if upper in self.names:
+            offer(upper, EXACT_SYMBOL)
+        for symbol in self._symbol_prefixes.get(upper, ()):
+            offer(symbol, SYMBOL_PREFIX - (len(symbol) - len(upper)))
+        if len(upper) >= 3 and " " not in upper:
+            for variant in _deletions(upper) | {upper}:
+                for symbol in self._symbol_deletions.get(variant, ()):
+                    offer(symbol, SYMBOL_TYPO)
+
+        words = _name_words(query)
+        if words:
+            matched = None
+            for word in words:
+                if len(word) < MIN_PREFIX:
+                    continue
+                hits = self._word_prefixes.get(word, set())
+                matched = hits if matched is None else matched & hits
+            for symbol in matched or ():
+                offer(symbol, NAME_PREFIX)
+
+            grams = _trigrams(" ".join(words))
+            shared = Counter()
+            for gram in grams:
+                for symbol in self._trigram_postings.get(gram, ()):
+                    shared[symbol] += 1
+            for symbol, count in shared.items():
+                similarity = 2 * count / (len(grams) + self._trigram_counts[symbol])
+                if similarity >= MIN_NAME_SIMILARITY:
+                    offer(symbol, NAME_FUZZY * similarity)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(symbol, self.names[symbol], round(score, 2)) for symbol, score in ranked]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_search_index(version, load_instruments):
+    """Shared index, rebuilt only when the instrument table's ``version`` moves."""
+    global _index, _index_version
+    with _index_lock:
+        if _index is None or _index_version != version:
+            _index = SymbolSearchIndex(load_instruments())
+            _index_version = version
+        return _index
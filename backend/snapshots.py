@@ -0,0 +1,126 @@
+"""Snapshots of the upstream caches and the price store, so a restart starts warm.
+
+The worker writes every persistent TTLCache (quotes, price history,
+fundamentals, holders, ...) to one zstd-compressed Parquet file every few
+minutes and once more at shutdown. On startup the snapshot is loaded back
+with each entry's remaining TTL: fresh entries are served as hits, expired
+ones still back ``serve_stale`` fallbacks until the first refresh lands.
+
+The price store goes alongside as an uncompressed .npy file (see
+``PriceHistoryStore.save``), which startup memory-maps instead of reading
+all of price_bars; the worker's load job then merges only recent changes.
+Indicators (the prediction's moving averages) are computed per request from
+those bars, so there is no derived state of their own to snapshot.
+Keep SNAPSHOT_DIR on a persistent volume for snapshots to survive redeploys.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from cache import persistent_caches
+from price_store import PriceHistoryStore, install_price_store, loaded_price_store
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", Path(__file__).resolve().parent / "data" / "snapshots"))
+CACHE_FILE = "caches.parquet"
+META_FILE = "snapshot.json"
+# Older snapshots are ignored: most of what they hold would be refetched anyway.
+SNAPSHOT_MAX_AGE_SECONDS = 24 * 3600
+
+
+def _cache_frame():
+    now = time.time()
+    rows = [
+        (name, key, json.dumps(value, default=str), now + expires_in)
+        for name, cache in persistent_caches().items()
+        for key, value, expires_in in cache.export_entries()
+        if isinstance(key, str)
+    ]
+    return pd.DataFrame(rows, columns=["cache", "key", "value", "expires_at"])
+
+
+def write_snapshot():
+    """Write the caches atomically (temp file + rename) and the price store; returns the number of cache entries."""
+    store = loaded_price_store()
+    if store is not None:
+        store.save(SNAPSHOT_DIR)
+    if duckdb is None:
+        return 0
+
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    frame = _cache_frame()
+    target = SNAPSHOT_DIR / CACHE_FILE
+    staging = target.with_suffix(".tmp")
+
+    connection = duckdb.connect()
+    try:
+        connection.register("entries", frame)
+        connection.execute(f"COPY entries TO '{staging}' (FORMAT parquet, COMPRESSION zstd)")
+    finally:
+        connection.close()
+    os.replace(staging, target)
+
+    meta = {"written_at": time.time(), "entries": len(frame)}
+    meta_staging = SNAPSHOT_DIR / f"{META_FILE}.tmp"
+    meta_staging.write_text(json.dumps(meta, default=str), encoding="utf-8")
+    os.replace(meta_staging, SNAPSHOT_DIR / META_FILE)
+    return len(frame)
+
+
+def restore_price_store():
+    """Memory-map the last price store snapshot, if it is recent enough; returns the number of symbols."""
+    loaded = PriceHistoryStore.load(SNAPSHOT_DIR)
+    if loaded is None:
+        return 0
+    store, written_at = loaded
+    if time.time() - written_at > SNAPSHOT_MAX_AGE_SECONDS:
+        return 0
+    install_price_store(store, datetime.fromtimestamp(written_at).date())
+    return len(store.symbols())
+
+
+def restore_snapshot():
+    """Warm the persistent caches and the price store from the last snapshot; returns the number of cache entries loaded."""
+    symbols = restore_price_store()
+    if symbols:
+        print(f"Restored price history for {symbols} symbols from snapshot.")
+
+    meta_path, cache_path = SNAPSHOT_DIR / META_FILE, SNAPSHOT_DIR / CACHE_FILE
+    if duckdb is None or not meta_path.exists() or not cache_path.exists():
+        return 0
+
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    if time.time() - meta.get("written_at", 0) > SNAPSHOT_MAX_AGE_SECONDS:
+        return 0
+
+    connection = duckdb.connect()
+    try:
+        frame = connection.execute("SELECT * FROM read_parquet(?)", [str(cache_path)]).df()
+    finally:
+        connection.close()
+
+    caches = persistent_caches()
+    now = time.time()
+    restored = 0
+    for name, entries in frame.groupby("cache", sort=False):
+        cache = caches.get(name)
+        if cache is None:
+            continue
+        cache.restore_entries(
+            (key, json.loads(value), expires_at - now)
+            for key, value, expires_at in entries[["key", "value", "expires_at"]].itertuples(index=False)
+        )
+        restored += len(entries)
+
+    print(f"Restored {restored} cache entries from snapshot written {datetime.fromtimestamp(meta['written_at'])}.")
+    return restored
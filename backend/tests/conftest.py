@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+
+# The backend modules import each other by flat name and read their settings
+# at import time, so both have to be in place before the first test module loads.
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp()) / 'tests.db'}")
+os.environ.setdefault("COMPUTE_WORKERS", "0")
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A session on the test database, emptied again after the test."""
+    import database
+
+    database.init_db()
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(database.Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
@@ -0,0 +1,40 @@
+import threading
+import time
+
+from cache import TTLCache
+
+
+def test_concurrent_loads_share_one_call_and_leave_no_lock_behind():
+    cache = TTLCache("test_shared_load", ttl_seconds=60)
+    calls = []
+
+    def loader():
+        calls.append(True)
+        time.sleep(0.05)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("key", loader))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 5
+    assert len(calls) == 1
+    assert cache._key_locks == {}
+
+
+def test_a_failed_load_releases_its_lock():
+    cache = TTLCache("test_failed_load", ttl_seconds=60)
+
+    def loader():
+        raise ValueError("upstream down")
+
+    for _ in range(2):
+        try:
+            cache.get_or_load(("BBCA", "1mo"), loader)
+        except ValueError:
+            pass
+
+    assert cache._key_locks == {}
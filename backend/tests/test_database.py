@@ -0,0 +1,15 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import engine
+
+
+def test_failed_queries_do_not_leave_timers_behind():
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+
+        assert conn.connection.info.get("query_started_at") == []
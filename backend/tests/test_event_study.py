@@ -0,0 +1,126 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics_store
+import event_study
+from database import ArticleTicker, EventStudyResult, NewsArticle, NewsDailySummary
+
+
+def add_article(db, article_id, symbol, published_at, label="POSITIVE", score=0.8, event_type="earnings"):
+    db.add(NewsArticle(
+        id=article_id, title=f"Berita {article_id}", link=f"https://example.com/{article_id}",
+        published_at=published_at, sentiment_label=label, sentiment_score=score, event_type=event_type,
+    ))
+    db.add(ArticleTicker(symbol=symbol, article_id=article_id))
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics_store, "ANALYTICS_DB_PATH", tmp_path / "analytics.duckdb")
+    monkeypatch.setattr(analytics_store, "READY_MARKER", tmp_path / "analytics.ready")
+    monkeypatch.setattr(event_study, "analytics_ready", analytics_store.analytics_ready)
+
+
+def test_events_come_from_postgres_and_its_archive_without_a_mirror(db, mirror):
+    add_article(db, 1, "BBCA", datetime(2024, 3, 4, 2))
+    add_article(db, 2, "BBCA", datetime(2024, 3, 4, 3), label="NEUTRAL")
+    db.add(NewsDailySummary(session_date=date(2024, 1, 8), symbol="TLKM", event_type="MERGER",
+                            sentiment_label="NEGATIVE", articles=2, sentiment_score_sum=-1.2))
+    db.commit()
+
+    events = event_study.load_events(db)
+
+    # Signs carry the confidence: archived articles get their group's mean score.
+    assert sorted(zip(events["symbol"], events["sign"].round(2))) == [("BBCA", 0.8), ("TLKM", -0.6), ("TLKM", -0.6)]
+    assert set(events["event_type"]) == {"earnings", "merger"}
+
+
+def test_events_are_read_from_the_mirror_once_it_is_synced(db, mirror):
+    add_article(db, 1, "BBCA", datetime(2024, 3, 4, 2))
+    add_article(db, 2, "TLKM", datetime(2024, 3, 5, 2), label="NEGATIVE")
+    db.commit()
+    assert not analytics_store.analytics_ready()
+    analytics_store.sync_analytics_store(db)
+    assert analytics_store.analytics_ready()
+
+    # Retention archives article 1: it leaves Postgres but stays in the mirror.
+    db.query(ArticleTicker).filter(ArticleTicker.article_id == 1).delete()
+    db.query(NewsArticle).filter(NewsArticle.id == 1).delete()
+    db.add_all([
+        NewsDailySummary(session_date=date(2024, 3, 4), symbol="BBCA", event_type="earnings",
+                         sentiment_label="POSITIVE", articles=1, sentiment_score_sum=0.8),
+        # Archived before the mirror's first sync, so only its summary remains.
+        NewsDailySummary(session_date=date(2024, 2, 1), symbol="ASII", event_type="earnings",
+                         sentiment_label="POSITIVE", articles=1, sentiment_score_sum=0.5),
+    ])
+    db.commit()
+
+    events = event_study.load_events(db)
+
+    assert sorted(events["symbol"]) == ["ASII", "BBCA", "TLKM"]
+    assert len(event_study.load_events(db, since=datetime(2024, 3, 5))) == 1
+
+
+def test_sentiment_sign_scales_the_label_by_confidence():
+    assert event_study.sentiment_sign("POSITIVE", 0.4) == 0.4
+    # The label sets the direction even if a provider returned an unsigned score.
+    assert event_study.sentiment_sign("NEGATIVE", 0.5) == -0.5
+    assert event_study.sentiment_sign("NEGATIVE", None) == -1.0
+    assert event_study.sentiment_sign("NEUTRAL", 0.9) == 0
+
+
+def test_abnormal_returns_start_at_the_first_session_that_could_price_the_news():
+    closes = pd.DataFrame(
+        {"BBCA": [100.0, 110.0, 110.0, 110.0], "TLKM": [100.0, 100.0, 100.0, 100.0]},
+        index=pd.bdate_range("2024-01-08", periods=4),
+    )
+    events = pd.DataFrame({
+        "symbol": ["BBCA", "BBCA", "ASII"],
+        # Before and after the 09:00 UTC close on the 9th, and a symbol without bars.
+        "published_at": pd.to_datetime(["2024-01-09 02:00", "2024-01-09 10:00", "2024-01-09 02:00"]),
+    })
+
+    car = event_study.abnormal_returns(closes, events, horizons=(1, 2, 5))
+
+    # BBCA's jump minus the equal-weighted market move, which is half of it.
+    assert car[0, 0] == pytest.approx(np.log(1.1) / 2)
+    assert car[0, 1] == pytest.approx(np.log(1.1) / 2)
+    assert car[1, 0] == pytest.approx(0.0)
+    assert np.isnan(car[0, 2]) and np.isnan(car[2]).all()
+
+
+def test_weights_scale_the_t_stat_and_shrink_thin_event_types():
+    events = pd.DataFrame({"event_type": ["earnings"] * 4 + ["merger"], "sign": [1.0, 1.0, -1.0, 0.5, 1.0]})
+    car = np.array([[0.02], [0.04], [-0.03], [0.02], [np.nan]])
+
+    summary = event_study.summarize_events(events, car, horizons=(5,)).set_index("event_type")
+
+    earnings = summary.loc["earnings"]
+    signed = np.array([0.02, 0.04, 0.03, 0.01])
+    t_stat = signed.mean() / (signed.std(ddof=1) / 2)
+    assert earnings["events"] == 4 and earnings["hit_rate"] == 1.0
+    assert earnings["t_stat"] == pytest.approx(t_stat)
+    assert earnings["weight"] == pytest.approx(min(t_stat / event_study.T_STAT_SCALE, 1.0) * 4 / 34)
+    # Events without a full window are left out, and every event also counts towards _all.
+    assert "merger" not in summary.index
+    assert summary.loc[event_study.ALL_EVENTS, "events"] == 4
+
+
+def test_headlines_use_the_stored_weight_of_their_event_type(db, monkeypatch):
+    monkeypatch.setattr(event_study, "_weights", {})
+    assert event_study.event_weight("earnings") == 1.0
+
+    db.add_all([
+        EventStudyResult(event_type="earnings", horizon=event_study.WEIGHT_HORIZON, events=50, weight=0.6),
+        EventStudyResult(event_type=event_study.ALL_EVENTS, horizon=event_study.WEIGHT_HORIZON, events=80, weight=0.2),
+        EventStudyResult(event_type="earnings", horizon=1, events=50, weight=-0.9),
+    ])
+    db.commit()
+
+    assert event_study.load_event_weights(db) == 2
+    assert event_study.event_weight("Earnings") == 0.6
+    assert event_study.event_weight("rumor") == 0.2
+    assert event_study.event_weight(None, {"earnings": 0.6}) == 1.0
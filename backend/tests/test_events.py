@@ -0,0 +1,43 @@
+import asyncio
+
+from events import EventBroker
+
+
+def delivered(subscribe, publish):
+    """Publish from the loop, then return what each subscription received."""
+    async def run():
+        broker = EventBroker()
+        broker.bind_loop(asyncio.get_running_loop())
+        subscriptions = [broker.subscribe(symbols, news=news) for symbols, news in subscribe]
+        publish(broker)
+        await asyncio.sleep(0)
+        return [subscription.queue.qsize() for subscription in subscriptions]
+
+    return asyncio.run(run())
+
+
+def test_news_reaches_subscribers_of_every_linked_ticker_once():
+    received = delivered(
+        [({"BBCA"}, True), ({"TLKM", "BBCA"}, True), ({"ASII"}, True), (set(), True), ({"BBCA"}, False)],
+        lambda broker: broker.publish("news", {"title": "t"}, symbols={"BBCA", "TLKM"}),
+    )
+
+    assert received == [1, 1, 0, 1, 0]
+
+
+def test_news_without_tickers_goes_to_every_news_subscriber():
+    received = delivered(
+        [({"BBCA"}, True), (set(), True)],
+        lambda broker: broker.publish("news", {"title": "t"}, symbols=set()),
+    )
+
+    assert received == [1, 1]
+
+
+def test_quotes_only_reach_their_symbol():
+    received = delivered(
+        [({"BBCA"}, True), ({"TLKM"}, True), (set(), True)],
+        lambda broker: broker.publish("quote", {"price": 1}, symbol="BBCA"),
+    )
+
+    assert received == [1, 0, 0]
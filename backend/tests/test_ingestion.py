@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import ingestion
+from database import NewsArticle, NewsFeedCheckpoint
+from ingestion import FeedJob, due_feeds, next_poll_at, next_poll_interval, run_pipeline
+
+
+def job(feed: str):
+    return FeedJob(feed, f"{feed} saham", 5)
+
+
+def stage(name: str, seen: list, fail_on: str | None = None):
+    async def handler(job):
+        await asyncio.sleep(0)
+        if job.feed == fail_on:
+            raise RuntimeError(f"{name} broke")
+        seen.append((name, job.feed))
+        return job
+    return handler
+
+
+def test_pipeline_runs_every_job_through_every_stage():
+    seen = []
+    stages = [("fetch", stage("fetch", seen), 2), ("persist", stage("persist", seen), 1)]
+
+    completed, failed = asyncio.run(run_pipeline([job("BBCA"), job("TLKM"), job("ASII")], stages, queue_size=1))
+
+    assert sorted(item.feed for item in completed) == ["ASII", "BBCA", "TLKM"]
+    assert failed == []
+    for feed in ("ASII", "BBCA", "TLKM"):
+        assert seen.index(("fetch", feed)) < seen.index(("persist", feed))
+
+
+def test_a_failing_feed_is_dropped_without_stopping_the_others():
+    seen = []
+    stages = [("fetch", stage("fetch", seen), 1), ("parse", stage("parse", seen, fail_on="TLKM"), 1), ("persist", stage("persist", seen), 1)]
+
+    completed, failed = asyncio.run(run_pipeline([job("BBCA"), job("TLKM"), job("ASII")], stages))
+
+    assert sorted(item.feed for item in completed) == ["ASII", "BBCA"]
+    assert [(item.feed, name, error) for item, name, error in failed] == [("TLKM", "parse", "parse broke")]
+    assert ("persist", "TLKM") not in seen
+
+
+def test_poll_interval_halves_when_busy_and_doubles_when_idle():
+    assert next_poll_interval(900, ingestion.BUSY_FEED_ARTICLES) == 450
+    assert next_poll_interval(900, 0) == 1800
+    assert next_poll_interval(900, 1) == 900
+    assert next_poll_interval(ingestion.MIN_POLL_INTERVAL, 10) == ingestion.MIN_POLL_INTERVAL
+    assert next_poll_interval(ingestion.MAX_POLL_INTERVAL, 0) == ingestion.MAX_POLL_INTERVAL
+
+
+def test_off_hours_polls_wait_at_least_the_off_hours_interval():
+    # 2024-01-08 is a Monday; 03:00 UTC is 10:00 in Jakarta.
+    trading = datetime(2024, 1, 8, 3)
+    weekend = datetime(2024, 1, 6, 3)
+
+    assert (next_poll_at(trading, 180) - trading).total_seconds() == 180
+    assert (next_poll_at(weekend, 180) - weekend).total_seconds() == ingestion.OFF_HOURS_MIN_INTERVAL
+
+
+def test_due_feeds_puts_never_polled_then_most_overdue_first():
+    now = datetime(2024, 1, 8, 3)
+    schedule = {
+        "BBCA": (600, datetime(2024, 1, 8, 2, 50)),
+        "TLKM": (300, datetime(2024, 1, 8, 2, 30)),
+        "ASII": (900, datetime(2024, 1, 8, 3, 10)),
+    }
+    jobs = [job("BBCA"), job("TLKM"), job("ASII"), job("Global")]
+
+    due = due_feeds(jobs, schedule, now)
+
+    assert [item.feed for item in due] == ["Global", "TLKM", "BBCA"]
+    assert [item.poll_interval for item in due] == [ingestion.DEFAULT_POLL_INTERVAL, 300, 600]
+
+
+def feed_article(index: int):
+    return {
+        "title": f"Laba bank ke-{index} naik tajam",
+        "description": "",
+        "source": "Kontan",
+        "link": f"https://example.com/{index}",
+        "published_at": "Mon, 08 Jan 2024 03:00:00 GMT",
+        "sentiment_label": "POSITIVE",
+        "sentiment_score": 0.5,
+    }
+
+
+def test_persist_commits_articles_with_the_checkpoint(db):
+    feed = job("BBCA")
+    feed.articles = [feed_article(1), feed_article(2)]
+
+    assert ingestion._persist_sync(feed) == 2
+
+    checkpoint = db.get(NewsFeedCheckpoint, "BBCA")
+    assert checkpoint.articles_inserted == 2
+    assert db.query(NewsArticle).count() == 2
+
+
+def test_persist_saves_no_articles_when_the_checkpoint_fails(db, monkeypatch):
+    def broken_checkpoint(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(ingestion, "_checkpoint", broken_checkpoint)
+    feed = job("BBCA")
+    feed.articles = [feed_article(1)]
+
+    with pytest.raises(RuntimeError):
+        ingestion._persist_sync(feed)
+
+    assert db.query(NewsArticle).count() == 0
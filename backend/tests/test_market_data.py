@@ -0,0 +1,17 @@
+import pandas as pd
+
+import market_data
+import universe
+
+
+def test_bulk_quotes_fill_symbols_the_download_missed_from_stored_prices(monkeypatch):
+    facade = market_data.MarketData()
+    monkeypatch.setattr(facade, "daily_bars_sync", lambda symbols, period: {"QAAA": pd.DataFrame({"Close": [1000.0, 1050.0]})})
+    monkeypatch.setattr(universe, "load_instrument_frame", lambda: pd.DataFrame({
+        "symbol": ["QAAA", "QBBB", "QCCC"],
+        "last_price": [900.0, 2000.0, None],
+    }))
+
+    prices = facade.quotes_bulk_sync(["QAAA", "QBBB", "QCCC"])
+
+    assert prices == {"QAAA": 1050.0, "QBBB": 2000.0}
@@ -0,0 +1,11 @@
+from metrics import UPSTREAM_ERRORS
+
+
+def test_label_values_are_escaped():
+    UPSTREAM_ERRORS.inc(provider='say "hi"\\now', method="line\nbreak")
+
+    line = next(line for line in UPSTREAM_ERRORS.render() if "say" in line)
+
+    assert 'provider="say \\"hi\\"\\\\now"' in line
+    assert 'method="line\\nbreak"' in line
+    assert "\n" not in line
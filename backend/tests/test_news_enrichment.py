@@ -0,0 +1,131 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import news_service
+from resilience import PROVIDERS, UpstreamUnavailable
+
+
+ITEM = {
+    "sentiment_label": "POSITIVE",
+    "sentiment_score": 0.6,
+    "summary": "Ringkasan.",
+    "event_type": "earnings",
+    "market_impact": "LOW",
+    "ai_rationale": "Judul menyebut laba naik.",
+}
+
+
+def delta_chunks(content: str, size: int = 16):
+    return [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[start:start + size]))])
+        for start in range(0, len(content), size)
+    ]
+
+
+def requested_ids(messages):
+    return [article["id"] for article in json.loads(messages[-1]["content"].split("\n\n", 1)[1])["articles"]]
+
+
+@pytest.fixture
+def fake_completion(monkeypatch):
+    """Install ``respond(ids) -> content`` as the LLM; returns the id lists it was asked for."""
+    calls = []
+    lock = threading.Lock()
+
+    def install(respond):
+        def completion(messages=None, stream=False, **kwargs):
+            ids = requested_ids(messages)
+            with lock:
+                calls.append(ids)
+            return iter(delta_chunks(respond(ids)))
+
+        monkeypatch.setattr(news_service, "completion", completion)
+        monkeypatch.setattr(news_service, "LITELLM_AVAILABLE", True)
+        return calls
+
+    PROVIDERS["litellm"].breaker.record_success()
+    return install
+
+
+def articles(count: int):
+    return [{"title": f"Berita {index}", "sentiment_label": "NEUTRAL", "sentiment_score": 0.0} for index in range(count)]
+
+
+def test_salvage_keeps_complete_items_of_a_truncated_array():
+    text = json.dumps({"articles": [{"id": 0, **ITEM}, {"id": 1, **ITEM}]})
+    truncated = text[:text.index('"id": 1') + 20]
+
+    assert [item["id"] for item in news_service._salvage_ai_items(truncated)] == [0]
+
+
+def test_salvage_skips_a_malformed_item():
+    text = '```json\n{"articles": [{"id": 0, "summary": "a"}, {"id": 1, "summary": }, {"id": 2, "summary": "c"}]}\n```'
+
+    assert [item["id"] for item in news_service._salvage_ai_items(text)] == [0, 2]
+
+
+def test_salvage_without_an_array_returns_nothing():
+    assert news_service._salvage_ai_items("The provider is overloaded.") == []
+
+
+def test_items_for_unknown_ids_or_labels_are_dropped():
+    wanted = {0, 1}
+
+    assert news_service._valid_enrichment({"id": "1", **ITEM}, wanted)
+    assert not news_service._valid_enrichment({"id": 99, **ITEM}, wanted)
+    assert not news_service._valid_enrichment({"id": 0, **ITEM, "sentiment_label": "BULLISH"}, wanted)
+    assert not news_service._valid_enrichment({**ITEM}, wanted)
+
+
+def test_missing_articles_are_retried_in_halved_batches(fake_completion):
+    def respond(ids):
+        text = json.dumps({"articles": [{"id": article_id, **ITEM, "summary": f"S{article_id}"} for article_id in ids]})
+        # The first call is cut off after two complete items.
+        return text[:text.index(f'"id": {ids[2]}')] if len(ids) == 4 else text
+
+    calls = fake_completion(respond)
+
+    enriched = asyncio.run(news_service.enrich_articles_with_ai(articles(4)))
+
+    assert calls[0] == [0, 1, 2, 3]
+    assert sorted(calls[1:]) == [[2], [3]]
+    assert [article["summary"] for article in enriched] == ["S0", "S1", "S2", "S3"]
+    assert {article["sentiment_label"] for article in enriched} == {"POSITIVE"}
+
+
+def test_a_round_with_no_usable_items_is_not_retried(fake_completion):
+    calls = fake_completion(lambda ids: json.dumps({"articles": [{"id": 99, **ITEM}]}))
+
+    enriched = asyncio.run(news_service.enrich_articles_with_ai(articles(3)))
+
+    assert calls == [[0, 1, 2]]
+    assert enriched == articles(3)
+
+
+def test_stream_is_closed_once_the_deadline_passes(monkeypatch):
+    closed = []
+
+    class SlowStream:
+        def __iter__(self):
+            for chunk in delta_chunks('{"articles": [' + "x" * 200):
+                time.sleep(0.02)
+                yield chunk
+
+        def close(self):
+            closed.append(True)
+
+    monkeypatch.setattr(news_service, "completion", lambda **kwargs: SlowStream())
+    PROVIDERS["litellm"].breaker.record_success()
+    chunks = []
+
+    with pytest.raises(UpstreamUnavailable):
+        news_service._stream_litellm_completion([{"id": 0}], chunks, time.monotonic() + 0.05)
+
+    assert closed == [True]
+    assert PROVIDERS["litellm"].breaker.state == "closed"
+    assert 0 < len(chunks) < len(delta_chunks('{"articles": [' + "x" * 200))
@@ -0,0 +1,49 @@
+from datetime import date, datetime, timedelta
+
+import news_retention
+from database import ArticleTicker, ArticleTokenCounts, NewsArticle, NewsDailySummary
+
+
+def add_article(db, article_id, published_at, symbols=(), label="POSITIVE", score=0.5, event_type="Earnings"):
+    db.add(NewsArticle(
+        id=article_id, title=f"Berita {article_id}", link=f"https://example.com/{article_id}",
+        published_at=published_at, sentiment_label=label, sentiment_score=score, event_type=event_type,
+    ))
+    db.add_all([ArticleTicker(symbol=symbol, article_id=article_id) for symbol in symbols])
+    db.add(ArticleTokenCounts(article_id=article_id, published_at=published_at, sentiment_label=label))
+
+
+def test_old_articles_are_rolled_into_daily_summaries_and_deleted(db):
+    monday = datetime(2020, 1, 6)
+    add_article(db, 1, monday + timedelta(hours=2), ["BBCA"], score=0.4)
+    add_article(db, 2, monday + timedelta(hours=3), ["BBCA", "BBRI"], score=0.8)
+    # After the 09:00 UTC close: counted towards Tuesday's session.
+    add_article(db, 3, monday + timedelta(hours=10), ["BBCA"], score=0.6)
+    add_article(db, 4, monday + timedelta(hours=4), label=None, score=0.0, event_type=None)
+    add_article(db, 5, datetime.utcnow(), ["TLKM"])
+    db.commit()
+
+    # One article per batch, so batches have to add onto each other's rows.
+    assert news_retention.archive_old_articles(db, retention_days=180, batch_size=1) == 4
+
+    summaries = {
+        (row.session_date, row.symbol, row.event_type, row.sentiment_label): (row.articles, round(row.sentiment_score_sum, 2))
+        for row in db.query(NewsDailySummary)
+    }
+    assert summaries == {
+        (date(2020, 1, 6), "BBCA", "earnings", "POSITIVE"): (2, 1.2),
+        (date(2020, 1, 6), "BBRI", "earnings", "POSITIVE"): (1, 0.8),
+        (date(2020, 1, 7), "BBCA", "earnings", "POSITIVE"): (1, 0.6),
+        (date(2020, 1, 6), "Global", "other", "NEUTRAL"): (1, 0.0),
+    }
+    assert [row.id for row in db.query(NewsArticle)] == [5]
+    assert [row.article_id for row in db.query(ArticleTicker)] == [5]
+    assert [row.article_id for row in db.query(ArticleTokenCounts)] == [5]
+
+
+def test_nothing_to_archive(db):
+    add_article(db, 1, datetime.utcnow(), ["BBCA"])
+    db.commit()
+
+    assert news_retention.archive_old_articles(db, retention_days=180) == 0
+    assert db.query(NewsDailySummary).count() == 0
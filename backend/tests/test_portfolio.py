@@ -0,0 +1,28 @@
+from routers.portfolio import _value_portfolio
+
+
+def test_holdings_are_valued_from_one_price_map():
+    rows = [
+        {"id": 1, "symbol": "BBCA", "avg_price": 9000.0, "total_shares": 200, "total_invested": 1_800_000.0},
+        {"id": 2, "symbol": "TLKM", "avg_price": 4000.0, "total_shares": 150, "total_invested": None},
+    ]
+
+    frame = _value_portfolio(rows, {"BBCA": 9900.0, "TLKM": 3600.0}).set_index("symbol")
+
+    assert frame.loc["BBCA", "total_value"] == 1_980_000
+    assert frame.loc["BBCA", "gain_loss_pct"] == 10
+    assert frame.loc["BBCA", "total_lots"] == 2
+    # Positions from before total_invested existed fall back to avg_price x shares.
+    assert frame.loc["TLKM", "invested"] == 600_000
+    assert frame.loc["TLKM", "gain_loss_value"] == -60_000
+
+
+def test_holdings_without_a_price_are_held_at_cost():
+    rows = [{"id": 1, "symbol": "GOTO", "avg_price": 80.0, "total_shares": 1000, "total_invested": 80_000.0}]
+
+    frame = _value_portfolio(rows, {})
+
+    assert frame.loc[0, "current_price"] == 80
+    assert frame.loc[0, "total_value"] == 80_000
+    assert frame.loc[0, "gain_loss_value"] == 0
+    assert frame.loc[0, "gain_loss_pct"] == 0
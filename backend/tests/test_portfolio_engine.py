@@ -0,0 +1,74 @@
+from datetime import date, datetime
+
+import pytest
+
+import portfolio_engine
+from database import Portfolio, PortfolioSnapshot, PriceBar, Transaction
+
+
+# Monday to Wednesday.
+DAYS = [date(2024, 1, 8), date(2024, 1, 9), date(2024, 1, 10)]
+
+
+def add_closes(db, symbol, closes):
+    db.add_all([
+        PriceBar(symbol=symbol, date=day, open=close, high=close, low=close, close=close, volume=100)
+        for day, close in zip(DAYS, closes)
+    ])
+    db.commit()
+
+
+def trade(db, day, side, shares, price):
+    return portfolio_engine.apply_transaction(db, "bbca", side, shares, price, datetime.combine(day, datetime.min.time()))
+
+
+@pytest.fixture
+def ledger(db):
+    add_closes(db, "BBCA", [1100.0, 1300.0, 1400.0])
+    trade(db, DAYS[0], "BUY", 100, 1000.0)
+    trade(db, DAYS[1], "BUY", 100, 1200.0)
+    trade(db, DAYS[2], "SELL", 50, 1500.0)
+    return db
+
+
+def test_average_cost_and_realized_pnl(ledger):
+    position = ledger.query(Portfolio).one()
+    sell = ledger.query(Transaction).filter(Transaction.side == "SELL").one()
+
+    assert position.symbol == "BBCA" and position.total_shares == 150
+    assert position.total_invested == pytest.approx(165_000)
+    assert position.avg_price == 1100
+    assert sell.realized_pnl == pytest.approx(20_000)
+
+
+def test_selling_more_than_held_is_rejected(ledger):
+    with pytest.raises(ValueError):
+        trade(ledger, DAYS[2], "SELL", 500, 1500.0)
+
+
+def test_snapshots_mark_positions_at_stored_closes(ledger):
+    snapshots = {
+        row.date: row
+        for row in ledger.query(PortfolioSnapshot).filter(PortfolioSnapshot.date <= DAYS[2])
+    }
+
+    assert [snapshots[day].market_value for day in DAYS] == [110_000, 260_000, 210_000]
+    assert [snapshots[day].net_flow for day in DAYS] == [100_000, 120_000, -75_000]
+
+
+def test_performance_is_time_weighted_over_the_range(ledger):
+    performance = portfolio_engine.get_performance(ledger, start=DAYS[0], end=DAYS[2])
+
+    # Day 2: (260k - 120k bought) / 110k; day 3: (210k + 75k sold) / 260k.
+    expected = (140_000 / 110_000) * (285_000 / 260_000) - 1
+    assert performance["time_weighted_return_pct"] == pytest.approx(expected * 100)
+    assert performance["realized_pnl"] == pytest.approx(20_000)
+    assert performance["unrealized_pnl"] == pytest.approx(45_000)
+    assert [point["value"] for point in performance["equity_curve"]] == [110_000, 260_000, 210_000]
+
+
+def test_a_backdated_trade_rebuilds_later_snapshots(ledger):
+    trade(ledger, DAYS[1], "BUY", 100, 1250.0)
+
+    snapshot = ledger.get(PortfolioSnapshot, DAYS[2])
+    assert snapshot.market_value == 250 * 1400
@@ -0,0 +1,194 @@
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import market_data
+from price_store import MIN_REGION, PriceHistoryStore
+
+
+def make_bars(start: date, days: int, close: float = 1000.0, symbol: str | None = None):
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    bars = pd.DataFrame({
+        "date": dates,
+        "open": close,
+        "high": close + 10,
+        "low": close - 10,
+        "close": [close + offset for offset in range(days)],
+        "volume": 100,
+    })
+    if symbol is not None:
+        bars.insert(0, "symbol", symbol)
+    return bars
+
+
+def test_from_frame_leaves_room_to_append_in_place():
+    store = PriceHistoryStore.from_frame(pd.concat([
+        make_bars(date(2024, 1, 1), 100, symbol="BBCA"),
+        make_bars(date(2024, 1, 1), 10, symbol="TLKM"),
+    ]))
+    start, length, capacity = store._index["BBCA"]
+    assert length == 100 and capacity > length
+    assert store._index["TLKM"][2] == MIN_REGION
+
+    store.upsert("BBCA", make_bars(date(2024, 4, 10), 5, close=2000.0))
+
+    assert store._index["BBCA"][:2] == [start, 105]
+    assert store.window("BBCA", date(2024, 4, 10)).close.tolist() == [2000, 2001, 2002, 2003, 2004]
+    assert store.window("TLKM").close.tolist() == [1000 + offset for offset in range(10)]
+
+
+def test_window_filters_by_date_inclusive():
+    store = PriceHistoryStore()
+    store.upsert("BBCA", make_bars(date(2024, 1, 1), 10))
+
+    bars = store.window("BBCA", date(2024, 1, 3), date(2024, 1, 5))
+
+    assert [str(day) for day in bars.dates] == ["2024-01-03", "2024-01-04", "2024-01-05"]
+    assert store.window("BBCA", date(2025, 1, 1)).close.size == 0
+    assert store.window("UNKNOWN") is None
+
+
+def test_upsert_replaces_overlapping_days():
+    store = PriceHistoryStore()
+    store.upsert("BBCA", make_bars(date(2024, 1, 1), 5))
+    store.upsert("BBCA", make_bars(date(2024, 1, 4), 4, close=5000.0))
+
+    bars = store.window("BBCA")
+
+    assert [str(day) for day in bars.dates] == [f"2024-01-0{day}" for day in range(1, 8)]
+    assert bars.close.tolist() == [1000, 1001, 1002, 5000, 5001, 5002, 5003]
+    assert store.span("BBCA") == (date(2024, 1, 1), date(2024, 1, 7))
+
+
+def test_merges_never_rewrite_held_windows():
+    store = PriceHistoryStore()
+    store.upsert("BBCA", make_bars(date(2024, 1, 1), 5))
+    held = store.window("BBCA")
+    assert np.shares_memory(held.close, store._columns["close"])
+
+    store.upsert("BBCA", make_bars(date(2024, 1, 2), 2, close=9000.0))
+    store.upsert("BBCA", make_bars(date(2024, 1, 6), 1, close=7000.0))
+
+    assert held.close.tolist() == [1000, 1001, 1002, 1003, 1004]
+    assert store.window("BBCA").close.tolist() == [1000, 9000, 9001, 1003, 1004, 7000]
+
+
+def test_relocations_are_compacted_instead_of_growing_forever():
+    store = PriceHistoryStore(capacity=256)
+    store.upsert("BBCA", make_bars(date(2024, 1, 1), 20))
+    for repeat in range(50):
+        store.upsert("BBCA", make_bars(date(2024, 1, 1), 20, close=1000.0 + repeat))
+
+    assert len(store._columns["day"]) <= 256
+    assert store.window("BBCA").close[0] == 1049
+
+    store.upsert("TLKM", make_bars(date(2024, 1, 1), 3))
+    assert store.compact() >= 0
+    assert store._gaps() == 0
+    assert store.window("TLKM").close.tolist() == [1000, 1001, 1002]
+
+
+def test_close_matrix_aligns_symbols_by_date():
+    store = PriceHistoryStore()
+    store.upsert("BBCA", make_bars(date(2024, 1, 1), 3))
+    store.upsert("TLKM", make_bars(date(2024, 1, 2), 3, close=3000.0))
+
+    closes = store.close_matrix(["BBCA", "TLKM", "UNKNOWN"], date(2024, 1, 1), date(2024, 1, 3))
+
+    assert list(closes.columns) == ["BBCA", "TLKM"]
+    assert closes.loc["2024-01-03"].tolist() == [1002, 3001]
+    assert np.isnan(closes.loc["2024-01-01", "TLKM"])
+
+
+def test_settled_session_day_skips_open_sessions_and_weekends():
+    # 2024-01-08 is a Monday; sessions close at 09:00 UTC.
+    assert market_data.settled_session_day(datetime(2024, 1, 8, 10, tzinfo=timezone.utc)) == date(2024, 1, 8)
+    assert market_data.settled_session_day(datetime(2024, 1, 8, 5, tzinfo=timezone.utc)) == date(2024, 1, 5)
+    assert market_data.settled_session_day(datetime(2024, 1, 7, 12, tzinfo=timezone.utc)) == date(2024, 1, 5)
+
+
+def test_history_is_served_from_a_store_that_covers_the_span(monkeypatch):
+    store = PriceHistoryStore()
+    now = datetime.now(timezone.utc)
+    monkeypatch.setattr(market_data, "in_trading_hours", lambda _: False)
+    monkeypatch.setattr(market_data, "loaded_price_store", lambda: store)
+    monkeypatch.setattr(market_data, "settled_session_day", lambda _: now.date())
+
+    def upstream(ticker, period):
+        raise AssertionError("the store covers this span")
+
+    monkeypatch.setattr(market_data, "_load_history_sync", upstream)
+    store.upsert("ZZZZ", make_bars(now.date() - timedelta(days=40), 41))
+
+    bars = market_data.market_data.history_sync("ZZZZ", "1mo")
+
+    assert bars.dates[-1].astype(date) == now.date()
+    assert len(bars) == 32
+
+
+def test_history_fetched_upstream_extends_the_store(monkeypatch):
+    store = PriceHistoryStore()
+    today = datetime.now(timezone.utc).date()
+    monkeypatch.setattr(market_data, "loaded_price_store", lambda: store)
+    monkeypatch.setattr(market_data, "settled_session_day", lambda _: today - timedelta(days=1))
+    fetched = make_bars(today - timedelta(days=4), 5).set_index(pd.DatetimeIndex(
+        [today - timedelta(days=offset) for offset in range(4, -1, -1)]
+    ))
+    fetched.columns = [name.title() for name in fetched.columns]
+    monkeypatch.setattr(
+        market_data, "_load_history_sync",
+        lambda ticker, period: market_data._window_record(market_data.window_from_frame(fetched)),
+    )
+
+    bars = market_data.market_data.history_sync("YYYY", "5d")
+
+    assert len(bars) == 5
+    # Today's bar is still moving, so only the settled ones are kept.
+    assert store.span("YYYY") == (today - timedelta(days=4), today - timedelta(days=1))
+
+
+def test_history_is_fetched_unadjusted_like_the_bulk_download(monkeypatch):
+    requested = {}
+
+    class FakeTicker:
+        def history(self, **kwargs):
+            requested.update(kwargs)
+            return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"])
+
+    monkeypatch.setattr(market_data, "_ticker", lambda ticker: FakeTicker())
+
+    market_data._load_history_sync("BBCA.JK", "1mo")
+
+    assert requested["auto_adjust"] is False
+
+
+def test_saved_store_loads_memory_mapped_and_stays_writable(tmp_path):
+    store = PriceHistoryStore()
+    store.upsert("BBCA", make_bars(date(2024, 1, 1), 5))
+    store.upsert("TLKM", make_bars(date(2024, 1, 1), 3, close=3000.0))
+    assert store.save(tmp_path) == 8
+    store.upsert("BBCA", make_bars(date(2024, 1, 6), 1, close=7000.0))
+    store.save(tmp_path)
+
+    loaded, _ = PriceHistoryStore.load(tmp_path)
+
+    assert isinstance(loaded._columns["close"].base, np.memmap)
+    assert loaded.window("BBCA").close.tolist() == [1000, 1001, 1002, 1003, 1004, 7000]
+    assert len(list(tmp_path.glob("price_store-*.npy"))) == 1
+
+    loaded.upsert("TLKM", make_bars(date(2024, 1, 4), 1, close=3500.0))
+    assert loaded.window("TLKM").close.tolist() == [3000, 3001, 3002, 3500]
+    assert PriceHistoryStore.load(tmp_path)[0].window("TLKM").close.tolist() == [3000, 3001, 3002]
+
+
+def test_changed_bars_skips_rows_already_stored():
+    store = PriceHistoryStore()
+    store.upsert("BBCA", make_bars(date(2024, 1, 1), 3))
+    update = make_bars(date(2024, 1, 1), 4).iloc[1:].copy()
+    update.loc[1, "close"] = 1500.0
+
+    changed = store.changed_bars("BBCA", update)
+
+    assert [str(day) for day in changed["date"]] == ["2024-01-02", "2024-01-04"]
+    assert store.changed_bars("TLKM", update) is update
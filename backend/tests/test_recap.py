@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import recap
+from database import ArticleTicker, NewsArticle
+
+
+@pytest.fixture(autouse=True)
+def fresh_recaps():
+    # Recaps are cached per article version, which outlives each test's rows.
+    recap.mark_articles_changed()
+
+
+def store(db, articles):
+    rows = [
+        NewsArticle(
+            title=title, link=f"https://example.com/{index}", sentiment_label=label,
+            published_at=published_at, related_stock=related_stock,
+        )
+        for index, (title, label, related_stock, published_at) in enumerate(articles)
+    ]
+    db.add_all(rows)
+    db.flush()
+    recap.store_article_tokens(db, rows)
+    db.commit()
+    recap.mark_articles_changed()
+    return rows
+
+
+def test_title_tokens_split_into_tickers_and_keywords():
+    tickers, keywords = recap.count_title_tokens("Laba BBCA dan BBRI melonjak, BBCA bagikan dividen 2024")
+
+    assert tickers == {"BBCA": 2, "BBRI": 1}
+    assert keywords["laba"] == 1 and keywords["melonjak"] == 1
+    # Stop words, short words and numbers are not topics.
+    assert "dividen" not in keywords and "dan" not in keywords and "2024" not in keywords
+
+
+def test_recap_reads_the_stored_counters_of_its_window(db):
+    now = datetime.utcnow()
+    store(db, [
+        ("BBCA cetak laba rekor", "POSITIVE", "BBCA", now - timedelta(hours=2)),
+        ("BBCA ekspansi kredit", "POSITIVE", "BBCA", now - timedelta(hours=3)),
+        ("TLKM tertekan regulasi", "NEGATIVE", "Global", now - timedelta(hours=4)),
+        ("GOTO merugi lagi", "NEGATIVE", "GOTO", now - timedelta(days=3)),
+    ])
+
+    today = recap.build_recap(db, "today")
+    week = recap.build_recap(db, "week")
+
+    assert today["sentiment_score"] == 1
+    assert today["top_topic"] == "BBCA, TLKM"
+    assert week["sentiment_score"] == 0 and week["mood"] == "Netral"
+    assert "**BBCA**" in today["recap"] and "Pekan Ini" in week["recap"]
+
+
+def test_sector_recap_only_counts_articles_linked_to_its_symbols(db):
+    now = datetime.utcnow()
+    bank, telco = store(db, [
+        ("BBCA cetak laba rekor", "POSITIVE", "BBCA", now),
+        ("TLKM tertekan regulasi", "NEGATIVE", "TLKM", now),
+    ])
+    db.add_all([ArticleTicker(symbol="BBCA", article_id=bank.id), ArticleTicker(symbol="TLKM", article_id=telco.id)])
+    db.commit()
+
+    banking = recap.build_recap(db, "today", sector="Finance", symbols=["BBCA", "BBRI"])
+
+    assert banking["mood"] == "Optimis"
+    assert banking["top_topic"] == "BBCA"
+
+
+def test_new_articles_invalidate_the_cached_recap(db):
+    assert "Belum ada" in recap.build_recap(db, "today")["recap"]
+
+    store(db, [("BBRI laba naik", "POSITIVE", "BBRI", datetime.utcnow())])
+
+    assert recap.build_recap(db, "today")["mood"] == "Optimis"
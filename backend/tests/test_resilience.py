@@ -0,0 +1,127 @@
+import time
+
+import httpx
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, ProviderGuard, UpstreamUnavailable, is_provider_failure, upstream_call
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_only_provider_side_errors_count_as_failures():
+    assert is_provider_failure(StatusError(503))
+    assert is_provider_failure(StatusError(429))
+    assert is_provider_failure(TimeoutError())
+    assert is_provider_failure(httpx.ConnectError("refused"))
+    assert not is_provider_failure(StatusError(404))
+    assert not is_provider_failure(KeyError("regularMarketPrice"))
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    guard = ProviderGuard(timeout=1.0, latency_target=1.0, initial_limit=1, max_limit=1)
+    guard.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    monkeypatch.setitem(resilience.PROVIDERS, "test", guard)
+    return guard
+
+
+def fail(error: Exception):
+    with upstream_call("test", "fetch"):
+        raise error
+
+
+def test_bad_requests_leave_the_breaker_closed(guard):
+    for _ in range(3):
+        with pytest.raises(StatusError):
+            fail(StatusError(404))
+
+    assert guard.breaker.state == "closed"
+    assert guard.limiter.in_flight == 0
+
+
+def test_open_breaker_short_circuits_calls(guard):
+    for _ in range(2):
+        with pytest.raises(OSError):
+            fail(OSError("connection reset"))
+
+    with pytest.raises(UpstreamUnavailable) as rejected:
+        with upstream_call("test", "fetch"):
+            pytest.fail("the call should not run")
+    assert rejected.value.reason == "circuit open"
+
+
+def test_calls_after_the_request_deadline_are_rejected(guard):
+    with resilience.request_deadline(0):
+        with pytest.raises(UpstreamUnavailable) as rejected:
+            with upstream_call("test", "fetch"):
+                pytest.fail("the call should not run")
+
+    assert rejected.value.reason == "deadline exceeded"
+    assert guard.breaker.state == "closed"
+
+
+def test_timeouts_of_calls_cut_short_by_the_request_deadline_are_not_counted(guard):
+    for _ in range(3):
+        with resilience.request_deadline(0.5):
+            with pytest.raises(TimeoutError):
+                fail(TimeoutError("read timed out"))
+
+    assert guard.breaker.state == "closed"
+    assert guard.breaker._failures == 0
+
+
+def test_timeouts_at_the_provider_timeout_are_counted(guard):
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            fail(TimeoutError("read timed out"))
+
+    assert guard.breaker.state == "open"
+
+
+def test_spent_call_budget_blames_the_request_deadline_when_it_cut_the_call_short(guard):
+    with resilience.request_deadline(0.5):
+        with upstream_call("test", "fetch"):
+            assert isinstance(resilience.call_budget_spent("GET /quote"), UpstreamUnavailable)
+
+    with upstream_call("test", "fetch"):
+        assert isinstance(resilience.call_budget_spent("GET /quote"), TimeoutError)
+
+    assert guard.breaker.state == "closed"
@@ -0,0 +1,73 @@
+import search_index
+from search_index import SymbolSearchIndex
+
+
+INSTRUMENTS = [
+    ("BBCA", "PT Bank Central Asia Tbk"),
+    ("BBRI", "PT Bank Rakyat Indonesia (Persero) Tbk"),
+    ("BBNI", "PT Bank Negara Indonesia (Persero) Tbk"),
+    ("TLKM", "PT Telkom Indonesia (Persero) Tbk"),
+    ("ASII", "PT Astra International Tbk"),
+    ("GOTO", None),
+]
+
+
+def symbols(results):
+    return [symbol for symbol, _, _ in results]
+
+
+def test_exact_symbol_ranks_above_prefix_matches():
+    index = SymbolSearchIndex(INSTRUMENTS)
+
+    results = index.search("bbca")
+
+    assert results[0] == ("BBCA", "PT Bank Central Asia Tbk", search_index.EXACT_SYMBOL)
+    assert symbols(index.search("BB")) == ["BBCA", "BBNI", "BBRI"]
+
+
+def test_one_edit_symbol_typos_are_found():
+    index = SymbolSearchIndex(INSTRUMENTS)
+
+    assert symbols(index.search("TLKN"))[0] == "TLKM"
+    assert symbols(index.search("BBCAA"))[0] == "BBCA"
+
+
+def test_every_name_word_must_prefix_match_and_boilerplate_is_ignored():
+    index = SymbolSearchIndex(INSTRUMENTS)
+
+    results = index.search("bank rak")
+
+    assert results[0] == ("BBRI", "PT Bank Rakyat Indonesia (Persero) Tbk", search_index.NAME_PREFIX)
+    # Other banks only share trigrams, which scores below every prefix hit.
+    assert all(score < search_index.NAME_PREFIX for _, _, score in results[1:])
+    assert "TLKM" not in symbols(index.search("tbk indonesia"))
+    assert index.search("   ") == []
+
+
+def test_misspelled_names_match_by_trigram_similarity():
+    index = SymbolSearchIndex(INSTRUMENTS)
+
+    results = index.search("astar internasional")
+
+    assert symbols(results) == ["ASII"]
+    assert search_index.MIN_NAME_SIMILARITY * search_index.NAME_FUZZY <= results[0][2] < search_index.NAME_PREFIX
+
+
+def test_limit_and_missing_names():
+    index = SymbolSearchIndex(INSTRUMENTS)
+
+    assert len(index.search("b", limit=2)) == 2
+    assert index.search("GOTO") == [("GOTO", "GOTO", search_index.EXACT_SYMBOL)]
+
+
+def test_the_shared_index_is_rebuilt_only_when_the_version_moves():
+    loads = []
+
+    def load():
+        loads.append(True)
+        return INSTRUMENTS
+
+    first = search_index.get_search_index(("test", 1), load)
+    assert search_index.get_search_index(("test", 1), load) is first
+    assert search_index.get_search_index(("test", 2), load) is not first
+    assert len(loads) == 2
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+import price_store
+import snapshots
+from database import PriceBar
+from price_store import PriceHistoryStore
+
+
+def test_restored_price_store_is_topped_up_with_recent_changes_only(tmp_path, monkeypatch, db):
+    today = date.today()
+    snapshot = PriceHistoryStore()
+    snapshot.upsert("BBCA", pd.DataFrame({
+        "date": [today - timedelta(days=2), today - timedelta(days=1)],
+        "open": 1000.0, "high": 1010.0, "low": 990.0, "close": [1000.0, 1005.0], "volume": 100,
+    }))
+    snapshot.save(tmp_path)
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr(price_store, "_store", None)
+    monkeypatch.setattr(price_store, "_restored_on", None)
+
+    assert snapshots.restore_price_store() == 1
+    restored = price_store.loaded_price_store()
+
+    db.add_all([
+        PriceBar(symbol="BBCA", date=today - timedelta(days=2), open=1000, high=1010, low=990, close=1000, volume=100),
+        PriceBar(symbol="BBCA", date=today - timedelta(days=1), open=1000, high=1010, low=990, close=1005, volume=100),
+        PriceBar(symbol="BBCA", date=today, open=1000, high=1010, low=990, close=1020, volume=100),
+        PriceBar(symbol="BBCA", date=today - timedelta(days=400), open=1, high=1, low=1, close=1, volume=1),
+    ])
+    db.commit()
+
+    assert price_store.load_price_store() is restored
+    assert restored.window("BBCA").close.tolist() == [1000, 1005, 1020]
+
+
+def test_stale_price_store_snapshots_are_ignored(tmp_path, monkeypatch):
+    PriceHistoryStore().save(tmp_path)
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr(snapshots, "SNAPSHOT_MAX_AGE_SECONDS", -1)
+    monkeypatch.setattr(price_store, "_store", None)
+
+    assert snapshots.restore_price_store() == 0
+    assert price_store.loaded_price_store() is None
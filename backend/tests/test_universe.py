@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import universe
+from database import Instrument, InstrumentPopularity, Portfolio
+
+
+def test_sector_summary_weights_returns_by_market_cap_and_sentiment_by_articles():
+    instruments = pd.DataFrame([
+        {"symbol": "BBCA", "sector": "Finance", "last_price": 110.0, "previous_close": 100.0, "market_cap": 1000.0},
+        {"symbol": "BBRI", "sector": "Finance", "last_price": 98.0, "previous_close": 100.0, "market_cap": 3000.0},
+        {"symbol": "GOTO", "sector": "Technology", "last_price": 50.0, "previous_close": 50.0, "market_cap": None},
+        {"symbol": "BUKA", "sector": "Technology", "last_price": 120.0, "previous_close": None, "market_cap": 500.0},
+    ])
+    sentiment = pd.DataFrame([
+        {"symbol": "BBCA", "sentiment_score": 0.5, "article_count": 2},
+        {"symbol": "BBRI", "sentiment_score": -0.1, "article_count": 3},
+    ])
+
+    finance, technology = universe.compute_sector_summary(instruments, sentiment)
+
+    assert finance["sector"] == "Finance"
+    assert finance["change_pct"] == pytest.approx((10 * 1000 - 2 * 3000) / 4000)
+    assert (finance["advancers"], finance["decliners"], finance["unchanged"]) == (1, 1, 0)
+    assert finance["sentiment_score"] == pytest.approx((0.5 * 2 - 0.1 * 3) / 5)
+    assert (finance["leader"], finance["laggard"]) == ("BBCA", "BBRI")
+    # No market caps: the plain mean; the unquoted BUKA is left out.
+    assert technology["stocks"] == 1 and technology["change_pct"] == 0
+    assert technology["sentiment_score"] is None and technology["article_count"] == 0
+
+
+def test_sector_summary_without_quotes_is_empty():
+    instruments = pd.DataFrame([{"symbol": "BBCA", "sector": "Finance", "last_price": None, "previous_close": 100.0, "market_cap": 1.0}])
+
+    assert universe.compute_sector_summary(instruments, pd.DataFrame(columns=["symbol", "sentiment_score", "article_count"])) == []
+
+
+def add_instruments(db, rows):
+    db.add_all([Instrument(symbol=symbol, last_price=price, volume=volume) for symbol, price, volume in rows])
+    db.commit()
+
+
+def test_tiers_follow_the_better_of_popularity_and_traded_value(db, monkeypatch):
+    monkeypatch.setattr(universe, "HOT_RANK", 1)
+    monkeypatch.setattr(universe, "WARM_RANK", 2)
+    now = datetime(2024, 1, 8)
+    add_instruments(db, [("BBCA", 9000.0, 1000), ("BBRI", 5000.0, 1000), ("TLKM", 3000.0, 10), ("GOTO", 50.0, 10), ("ANTM", None, None)])
+    db.add(InstrumentPopularity(symbol="GOTO", score=8.0, total_views=8, scored_at=now - timedelta(days=7)))
+    db.add(Portfolio(symbol="ANTM", avg_price=1500.0, total_shares=100, total_invested=150_000.0))
+    db.commit()
+
+    tiers = universe.assign_tiers(db, now).set_index("symbol")
+
+    # GOTO's week-old score halved to 4 and still ranks first by popularity.
+    assert tiers.loc["GOTO", "score"] == pytest.approx(4.0)
+    assert tiers["tier"].to_dict() == {"BBCA": "hot", "BBRI": "warm", "TLKM": "cold", "GOTO": "hot", "ANTM": "hot"}
+
+
+def test_refresh_plan_spends_the_budget_on_hot_and_stalest_first():
+    now = datetime(2024, 1, 8, 12)
+    tiers = pd.DataFrame([
+        {"symbol": "BBCA", "tier": "hot", "quote_updated_at": now - timedelta(minutes=20),
+         "profile_updated_at": now, "profile_retry_at": None},
+        {"symbol": "BBRI", "tier": "hot", "quote_updated_at": now - timedelta(minutes=5),
+         "profile_updated_at": now, "profile_retry_at": None},
+        {"symbol": "TLKM", "tier": "warm", "quote_updated_at": now - timedelta(hours=3),
+         "profile_updated_at": None, "profile_retry_at": None},
+        {"symbol": "GOTO", "tier": "cold", "quote_updated_at": None,
+         "profile_updated_at": None, "profile_retry_at": now + timedelta(hours=1)},
+        {"symbol": "ANTM", "tier": "cold", "quote_updated_at": None,
+         "profile_updated_at": now - timedelta(days=8), "profile_retry_at": None},
+    ])
+
+    assert universe.plan_refresh(tiers, now, budget=10) == (["BBCA", "TLKM", "GOTO", "ANTM"], ["TLKM", "ANTM"])
+    # Fresh quotes are skipped and a failed profile waits for its retry time;
+    # within the warm tier, TLKM's never-fetched profile is the stalest item.
+    assert universe.plan_refresh(tiers, now, budget=2) == (["BBCA"], ["TLKM"])
+    assert universe.plan_refresh(tiers, now, budget=0) == ([], [])
+
+
+def test_failed_profiles_back_off_exponentially_up_to_the_cold_interval():
+    assert [universe.profile_retry_delay(failures) for failures in (1, 2, 3)] == [
+        timedelta(hours=1), timedelta(hours=2), timedelta(hours=4),
+    ]
+    assert universe.profile_retry_delay(20) == universe.PROFILE_REFRESH["cold"]
+
+
+def test_viewed_symbols_join_the_universe_with_a_popularity_score(db, monkeypatch):
+    monkeypatch.setattr(universe, "invalidate_instrument_cache", lambda: None)
+    universe.record_symbol_view("bbca")
+    universe.record_symbol_view("BBCA")
+    universe.record_symbol_view("not-a-symbol")
+
+    assert universe.flush_symbol_views_sync(db, datetime(2024, 1, 8)) == 2
+
+    popularity = db.get(InstrumentPopularity, "BBCA")
+    assert popularity.score == 2 and popularity.total_views == 2
+    assert db.get(Instrument, "BBCA") is not None
@@ -0,0 +1,536 @@
+import argparse
+import csv
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+import pandas as pd
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from analytics_store import AnalyticsBusy, analytics_ready, symbol_sentiment
+from database import ArticleTicker, Instrument, InstrumentPopularity, NewsArticle, Portfolio, ReadSessionLocal, SessionLocal
+from market_data import market_data
+from resilience import UpstreamUnavailable, upstream_call
+
+
+INSTRUMENT_COLUMNS = [
+    "symbol", "name", "sector", "shares_outstanding", "market_cap", "last_price", "previous_close", "volume",
+]
+
+# Fallback for IDX "Daftar Saham" (symbol,name). The worker pulls the full
+# list (~900 symbols) from the exchange weekly and rewrites this file after
+# each successful pull; it is only read when the exchange cannot be reached.
+# The bundled copy is a partial export of 77 symbols: until one pull
+# succeeds (or ``python -m universe --update-listings`` is run from a network
+# the IDX site does not block), the universe and its tiering cover only those.
+LISTINGS_FILE = Path(os.getenv("IDX_LISTINGS_FILE", Path(__file__).resolve().parent / "data" / "idx_listings.csv"))
+IDX_LISTINGS_URL = os.getenv(
+    "IDX_LISTINGS_URL", "https://www.idx.co.id/primary/StockData/GetSecuritiesStock?start=0&length=9999"
+)
+SYMBOL_RE = re.compile(r"^[A-Z]{4}$")
+
+TIERS = ("hot", "warm", "cold")
+QUOTE_REFRESH = {"hot": timedelta(minutes=15), "warm": timedelta(hours=2), "cold": timedelta(hours=24)}
+PROFILE_REFRESH = {"hot": timedelta(days=1), "warm": timedelta(days=3), "cold": timedelta(days=7)}
+HOT_RANK = 50
+WARM_RANK = 200
+POPULARITY_HALF_LIFE = timedelta(days=7)
+# A failed profile fetch is retried after 1h, 2h, 4h, ... up to the cold refresh
+# interval; view-added symbols that fail MAX_PROFILE_FAILURES times are dropped.
+PROFILE_RETRY_BASE = timedelta(hours=1)
+MAX_PROFILE_FAILURES = 5
+_PROFILE_FAILED = object()
+
+# Upstream calls one scheduler cycle may spend: one per bulk-downloaded quote
+# and one per profile (info) fetch.
+REQUEST_BUDGET = int(os.getenv("UNIVERSE_REQUEST_BUDGET", "300"))
+
+_instrument_cache = TTLCache("instruments", ttl_seconds=60, max_entries=1)
+_sector_cache = TTLCache("sectors", ttl_seconds=60, max_entries=1)
+
+_instruments_version = 0
+
+_pending_views = Counter()
+_views_lock = threading.Lock()
+
+
+def load_listings(path: Path = LISTINGS_FILE):
+    if not path.exists():
+        print(f"Listings file not found: {path}")
+        return {}
+
+    with path.open(newline="", encoding="utf-8") as handle:
+        return {
+            row["symbol"].strip().upper(): (row.get("name") or "").strip() or None
+            for row in csv.DictReader(handle)
+            if SYMBOL_RE.match((row.get("symbol") or "").strip().upper())
+        }
+
+
+def fetch_idx_listings_sync(url: str = IDX_LISTINGS_URL):
+    """Every listed symbol and company name from the exchange's securities list."""
+    with upstream_call("idx", "listings") as timeout:
+        response = httpx.get(
+            url,
+            timeout=timeout,
+            headers={"User-Agent": "Mozilla/5.0", "Accept": "application/json"},
+            follow_redirects=True,
+        )
+        response.raise_for_status()
+    return {
+        row["Code"].strip().upper(): (row.get("Name") or "").strip() or None
+        for row in response.json().get("data", [])
+        if SYMBOL_RE.match((row.get("Code") or "").strip().upper())
+    }
+
+
+def write_listings(listings: dict, path: Path = LISTINGS_FILE):
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["symbol", "name"])
+        writer.writerows(sorted((symbol, name or "") for symbol, name in listings.items()))
+
+
+def current_listings():
+    """The exchange's live list, or the listings file when the exchange cannot be reached."""
+    try:
+        listings = fetch_idx_listings_sync()
+        if listings:
+            try:
+                write_listings(listings)
+            except OSError as e:
+                print(f"Error updating the listings file: {e}")
+            return listings
+        print("IDX returned no listings; using the listings file.")
+    except Exception as e:
+        print(f"Error fetching IDX listings, using the listings file: {e}")
+    listings = load_listings()
+    print(f"Listings file has {len(listings)} symbols.")
+    return listings
+
+
+def sync_listings_sync(db: Session, listings: dict | None = None):
+    """Insert instruments for listed symbols the table does not know yet."""
+    listings = load_listings() if listings is None else listings
+    known = {row[0] for row in db.query(Instrument.symbol).all()}
+    new_rows = [Instrument(symbol=symbol, name=name) for symbol, name in listings.items() if symbol not in known]
+    if new_rows:
+        db.add_all(new_rows)
+        db.commit()
+        invalidate_instrument_cache()
+    return len(new_rows)
+
+
+def record_symbol_view(symbol: str):
+    """Called per successful detail/prediction lookup; cheap, flushed by the worker."""
+    symbol = symbol.upper()
+    if SYMBOL_RE.match(symbol):
+        with _views_lock:
+            _pending_views[symbol] += 1
+
+
+def _decayed_score(score, scored_at, now: datetime):
+    elapsed = (now - scored_at) / POPULARITY_HALF_LIFE
+    return score * 0.5 ** elapsed
+
+
+def flush_symbol_views_sync(db: Session, now: datetime | None = None):
+    """Fold buffered views into the decaying popularity scores; unseen symbols join the universe."""
+    with _views_lock:
+        views = dict(_pending_views)
+        _pending_views.clear()
+    if not views:
+        return 0
+
+    now = now or datetime.utcnow()
+    existing = {
+        row.symbol: row
+        for row in db.query(InstrumentPopularity).filter(InstrumentPopularity.symbol.in_(list(views))).all()
+    }
+    for symbol, count in views.items():
+        row = existing.get(symbol)
+        if row is None:
+            db.add(InstrumentPopularity(symbol=symbol, score=count, total_views=count, scored_at=now, last_viewed_at=now))
+        else:
+            row.score = _decayed_score(row.score, row.scored_at, now) + count
+            row.total_views += count
+            row.scored_at = now
+            row.last_viewed_at = now
+    db.commit()
+
+    sync_listings_sync(db, {symbol: None for symbol in views})
+    return sum(views.values())
+
+
+def assign_tiers(db: Session, now: datetime | None = None):
+    """
+    Frame of every instrument with its refresh tier. Held positions are always
+    hot; otherwise the better of popularity rank and traded-value rank decides.
+    """
+    now = now or datetime.utcnow()
+    frame = pd.DataFrame(
+        db.query(
+            Instrument.symbol,
+            Instrument.last_price,
+            Instrument.volume,
+            Instrument.quote_updated_at,
+            Instrument.profile_updated_at,
+            Instrument.profile_retry_at,
+        ).all(),
+        columns=["symbol", "last_price", "volume", "quote_updated_at", "profile_updated_at", "profile_retry_at"],
+    )
+    if frame.empty:
+        return frame.assign(score=[], traded_value=[], tier=[])
+
+    popularity = pd.DataFrame(
+        db.query(InstrumentPopularity.symbol, InstrumentPopularity.score, InstrumentPopularity.scored_at).all(),
+        columns=["symbol", "score", "scored_at"],
+    )
+    if not popularity.empty:
+        popularity["score"] = _decayed_score(popularity["score"], popularity["scored_at"], now)
+    frame = frame.merge(popularity[["symbol", "score"]], on="symbol", how="left")
+    frame["score"] = pd.to_numeric(frame["score"]).fillna(0.0)
+
+    frame["traded_value"] = pd.to_numeric(frame["last_price"]).fillna(0) * pd.to_numeric(frame["volume"]).fillna(0)
+    popularity_rank = frame["score"].where(frame["score"] > 0).rank(ascending=False, method="first")
+    value_rank = frame["traded_value"].where(frame["traded_value"] > 0).rank(ascending=False, method="first")
+    best_rank = pd.concat([popularity_rank, value_rank], axis=1).min(axis=1)
+
+    held = {row[0] for row in db.query(Portfolio.symbol).all()}
+    frame["tier"] = "cold"
+    frame.loc[best_rank <= WARM_RANK, "tier"] = "warm"
+    frame.loc[(best_rank <= HOT_RANK) | frame["symbol"].isin(held), "tier"] = "hot"
+    return frame
+
+
+def plan_refresh(tiers: pd.DataFrame, now: datetime | None = None, budget: int = REQUEST_BUDGET):
+    """
+    Pick the quotes and profiles due this cycle, hot before warm before cold and
+    stalest first within a tier, until the request budget is spent. Profiles
+    that failed recently wait for their ``profile_retry_at``.
+    """
+    if tiers.empty or budget <= 0:
+        return [], []
+
+    now = now or datetime.utcnow()
+    due = []
+    for kind, intervals, column in (
+        ("quote", QUOTE_REFRESH, "quote_updated_at"),
+        ("profile", PROFILE_REFRESH, "profile_updated_at"),
+    ):
+        updated_at = pd.to_datetime(tiers[column])
+        max_age = tiers["tier"].map(intervals)
+        stale = updated_at.isna() | (now - updated_at >= max_age)
+        if kind == "profile":
+            stale &= ~(pd.to_datetime(tiers["profile_retry_at"]) > now)
+        due.append(pd.DataFrame({
+            "symbol": tiers["symbol"],
+            "kind": kind,
+            "tier_order": tiers["tier"].map(TIERS.index),
+            "updated_at": updated_at.fillna(pd.Timestamp.min),
+        })[stale])
+
+    due = pd.concat(due).sort_values(["tier_order", "updated_at"], kind="stable").head(budget)
+    return (
+        due.loc[due["kind"] == "quote", "symbol"].tolist(),
+        due.loc[due["kind"] == "profile", "symbol"].tolist(),
+    )
+
+
+def refresh_due_instruments_sync(budget: int = REQUEST_BUDGET):
+    """One tiered scheduler cycle: fold in views, then refresh what is due within budget."""
+    db = SessionLocal()
+    try:
+        flush_symbol_views_sync(db)
+        quotes, profiles = plan_refresh(assign_tiers(db), budget=budget)
+        if profiles:
+            refresh_instrument_profiles_sync(db, profiles)
+        quoted = refresh_instrument_quotes_sync(db, quotes) if quotes else 0
+        prune_unresolved_instruments(db)
+        return {"quotes": quoted, "profiles": len(profiles)}
+    finally:
+        db.close()
+
+
+def prune_unresolved_instruments(db: Session):
+    """Drop symbols picked up from views that upstream knows nothing about, or keeps failing on."""
+    removed = (
+        db.query(Instrument)
+        .filter(
+            Instrument.name.is_(None),
+            Instrument.last_price.is_(None),
+            Instrument.profile_updated_at.isnot(None) | (Instrument.profile_failures >= MAX_PROFILE_FAILURES),
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    if removed:
+        invalidate_instrument_cache()
+    return removed
+
+
+def hot_symbols(limit: int):
+    """Most-watched symbols, for jobs that can only afford a handful per cycle."""
+    db = SessionLocal()
+    try:
+        tiers = assign_tiers(db)
+    finally:
+        db.close()
+    if tiers.empty:
+        return []
+
+    tiers = tiers[tiers["tier"] == "hot"].sort_values(["score", "traded_value"], ascending=False)
+    return tiers["symbol"].head(limit).tolist()
+
+
+def invalidate_instrument_cache():
+    global _instruments_version
+    _instrument_cache.invalidate()
+    _sector_cache.invalidate()
+    _instruments_version += 1
+
+
+def instruments_version():
+    """Bumped on every instrument write; lets derived in-memory indexes know when to rebuild."""
+    return _instruments_version
+
+
+def _fetch_profile_sync(symbol: str):
+    from routers.stocks import _normalize_sector, _safe_int
+
+    fundamentals = market_data.fundamentals_sync(symbol)
+    profile = {
+        "name": fundamentals.name,
+        "sector": _normalize_sector(fundamentals.sector) if fundamentals.sector else None,
+        "shares_outstanding": _safe_int(fundamentals.shares_outstanding, None),
+        "market_cap": fundamentals.market_cap,
+    }
+    # Keep listing names and earlier values when the upstream profile is sparse.
+    profile = {key: value for key, value in profile.items() if value is not None}
+    return {
+        "symbol": symbol,
+        **profile,
+        "profile_updated_at": datetime.utcnow(),
+        "profile_failures": 0,
+        "profile_retry_at": None,
+    }
+
+
+def profile_retry_delay(failures: int):
+    return min(PROFILE_RETRY_BASE * 2 ** (failures - 1), PROFILE_REFRESH["cold"])
+
+
+def _record_profile_failures(db: Session, symbols: list[str], now: datetime):
+    for instrument in db.query(Instrument).filter(Instrument.symbol.in_(symbols)).all():
+        instrument.profile_failures = (instrument.profile_failures or 0) + 1
+        instrument.profile_retry_at = now + profile_retry_delay(instrument.profile_failures)
+
+
+def refresh_instrument_profiles_sync(db: Session, symbols: list[str]):
+    """Names, normalized sectors and share counts. Sector normalization happens here, once."""
+    known = {row[0] for row in db.query(Instrument.symbol).filter(Instrument.symbol.in_(symbols)).all()}
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(_safe_fetch_profile, symbols))
+
+    refreshed = 0
+    failed = []
+    for symbol, profile in zip(symbols, results):
+        if profile is None:
+            continue
+        if profile is _PROFILE_FAILED:
+            failed.append(symbol)
+            continue
+        if symbol in known:
+            db.execute(update(Instrument), [profile])
+        else:
+            db.add(Instrument(**profile))
+        refreshed += 1
+
+    if failed:
+        _record_profile_failures(db, failed, datetime.utcnow())
+    db.commit()
+    invalidate_instrument_cache()
+    return refreshed
+
+
+def _safe_fetch_profile(symbol: str):
+    """The profile; ``_PROFILE_FAILED`` when the lookup errored; None when the provider was unavailable."""
+    try:
+        return _fetch_profile_sync(symbol)
+    except UpstreamUnavailable as e:
+        # Breaker open or saturated: nothing was asked, so the symbol is not to blame.
+        print(f"Skipped profile for {symbol}: {e}")
+        return None
+    except Exception as e:
+        print(f"Error refreshing profile for {symbol}: {e}")
+        return _PROFILE_FAILED
+
+
+def refresh_instrument_quotes_sync(db: Session, symbols: list[str]):
+    """Latest close, previous close and volume for ``symbols`` from one bulk download."""
+    instruments = {
+        symbol: shares
+        for symbol, shares in db.query(Instrument.symbol, Instrument.shares_outstanding)
+        .filter(Instrument.symbol.in_(symbols))
+        .all()
+    }
+    if not instruments:
+        return 0
+
+    bars = market_data.daily_bars_sync(list(instruments), period="5d")
+    now = datetime.utcnow()
+    records = []
+    for symbol, frame in bars.items():
+        closes = frame["Close"].ffill()
+        if len(closes) < 2:
+            continue
+        last_price, previous_close = closes.iloc[-1], closes.iloc[-2]
+        if pd.isna(last_price) or pd.isna(previous_close):
+            continue
+
+        shares = instruments.get(symbol)
+        record = {
+            "symbol": symbol,
+            "last_price": float(last_price),
+            "previous_close": float(previous_close),
+            "volume": int(frame["Volume"].fillna(0).iloc[-1]),
+            "quote_updated_at": now,
+        }
+        if shares:
+            record["market_cap"] = float(shares * last_price)
+        records.append(record)
+
+    if records:
+        db.execute(update(Instrument), records)
+        db.commit()
+    invalidate_instrument_cache()
+    return len(records)
+
+
+def _load_instrument_frame_sync():
+    db = ReadSessionLocal()
+    try:
+        rows = db.query(*(getattr(Instrument, column) for column in INSTRUMENT_COLUMNS)).all()
+    finally:
+        db.close()
+
+    frame = pd.DataFrame(rows, columns=INSTRUMENT_COLUMNS)
+    for column in ("shares_outstanding", "market_cap", "last_price", "previous_close", "volume"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    return frame
+
+
+def load_instrument_frame():
+    """Latest instrument snapshot as a DataFrame, held in memory for a minute."""
+    return _instrument_cache.get_or_load("all", _load_instrument_frame_sync)
+
+
+def sector_symbols(sector: str):
+    from routers.stocks import SECTOR_TICKERS
+
+    frame = load_instrument_frame()
+    if frame.empty:
+        return SECTOR_TICKERS.get(sector, [])
+    return frame.loc[frame["sector"] == sector, "symbol"].tolist()
+
+
+def _load_symbol_sentiment_sync(since: datetime):
+    if analytics_ready():
+        try:
+            return symbol_sentiment(since)
+        except AnalyticsBusy:
+            pass
+
+    db = ReadSessionLocal()
+    try:
+        rows = (
+            db.query(
+                ArticleTicker.symbol,
+                func.avg(NewsArticle.sentiment_score),
+                func.count(NewsArticle.id),
+            )
+            .join(NewsArticle, NewsArticle.id == ArticleTicker.article_id)
+            .filter(NewsArticle.published_at >= since)
+            .group_by(ArticleTicker.symbol)
+            .all()
+        )
+    finally:
+        db.close()
+    return pd.DataFrame(rows, columns=["symbol", "sentiment_score", "article_count"])
+
+
+def compute_sector_summary(instruments: pd.DataFrame, sentiment: pd.DataFrame):
+    """Market-cap-weighted sector returns, breadth and article-weighted sentiment in one groupby."""
+    frame = instruments.dropna(subset=["last_price", "previous_close"])
+    frame = frame[frame["previous_close"] > 0].copy()
+    if frame.empty:
+        return []
+
+    frame = frame.merge(sentiment, on="symbol", how="left")
+    frame["article_count"] = pd.to_numeric(frame["article_count"]).fillna(0)
+    frame["sentiment_weighted"] = pd.to_numeric(frame["sentiment_score"]).fillna(0) * frame["article_count"]
+    frame["change_pct"] = (frame["last_price"] / frame["previous_close"] - 1) * 100
+    frame["weight"] = frame["market_cap"].fillna(0)
+    frame["weighted_change"] = frame["change_pct"] * frame["weight"]
+    frame["advancer"] = (frame["change_pct"] > 0).astype(int)
+    frame["decliner"] = (frame["change_pct"] < 0).astype(int)
+
+    grouped = frame.groupby("sector").agg(
+        stocks=("symbol", "count"),
+        market_cap=("weight", "sum"),
+        weighted_change=("weighted_change", "sum"),
+        mean_change=("change_pct", "mean"),
+        advancers=("advancer", "sum"),
+        decliners=("decliner", "sum"),
+        article_count=("article_count", "sum"),
+        sentiment_weighted=("sentiment_weighted", "sum"),
+    )
+    grouped["change_pct"] = (grouped["weighted_change"] / grouped["market_cap"]).where(
+        grouped["market_cap"] > 0, grouped["mean_change"]
+    )
+    grouped["sentiment_score"] = (grouped["sentiment_weighted"] / grouped["article_count"]).where(
+        grouped["article_count"] > 0
+    )
+    grouped["article_count"] = grouped["article_count"].astype(int)
+    grouped["unchanged"] = grouped["stocks"] - grouped["advancers"] - grouped["decliners"]
+    grouped["leader"] = frame.loc[frame.groupby("sector")["change_pct"].idxmax()].set_index("sector")["symbol"]
+    grouped["laggard"] = frame.loc[frame.groupby("sector")["change_pct"].idxmin()].set_index("sector")["symbol"]
+
+    grouped = grouped.sort_values("market_cap", ascending=False).reset_index()
+    columns = [
+        "sector", "change_pct", "market_cap", "stocks", "advancers", "decliners", "unchanged",
+        "sentiment_score", "article_count", "leader", "laggard",
+    ]
+    result = grouped[columns].astype(object).where(grouped[columns].notna(), None)
+    return result.to_dict(orient="records")
+
+
+def sector_summary_sync():
+    def load():
+        sentiment = _load_symbol_sentiment_sync(datetime.utcnow() - timedelta(days=1))
+        return compute_sector_summary(load_instrument_frame(), sentiment)
+
+    return _sector_cache.get_or_load("latest", load)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the IDX listings file.")
+    parser.add_argument("--update-listings", action="store_true", help=f"rewrite {LISTINGS_FILE.name} from {IDX_LISTINGS_URL}")
+    args = parser.parse_args()
+
+    if args.update_listings:
+        listings = fetch_idx_listings_sync()
+        if not listings:
+            raise SystemExit("IDX returned no listings; the file was left unchanged.")
+        write_listings(listings)
+        print(f"Wrote {len(listings)} listings to {LISTINGS_FILE}.")
+    else:
+        print(f"{len(load_listings())} listings in {LISTINGS_FILE}.")
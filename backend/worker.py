@@ -1,37 +1,68 @@
 import asyncio
+import functools
 from datetime import datetime
 from threading import Lock
 
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from database import SessionLocal, init_db
-from news_service import enrich_articles_with_ai, fetch_google_news, save_articles_to_db
+from analytics_store import sync_analytics_store_sync
+from database import SessionLocal, init_db, use_worker_pool
+from event_study import run_event_study_sync
+from events import broker
+from ingestion import FeedJob, ingest_news
+from market_data import market_data
+from metrics import WORKER_ARTICLES_INSERTED, WORKER_CYCLE_SECONDS
+from news_index import backfill_article_tickers, backfill_title_fingerprints, set_known_symbols
+from news_retention import archive_old_articles_sync
+from recap import backfill_article_tokens
+from portfolio_engine import refresh_portfolio_history_sync
+from price_store import load_price_store
+from snapshots import write_snapshot
+from universe import current_listings, hot_symbols, load_instrument_frame, refresh_due_instruments_sync, sync_listings_sync
 
 
+# Each tick polls only the feeds that are due (see ingestion.py).
+NEWS_POLL_SECONDS = 60
+NEWS_SYMBOL_COUNT = 5
+DEFAULT_NEWS_SYMBOLS = ["BBCA", "BBRI", "BMRI", "TLKM", "ASII"]
+
 _news_update_lock = Lock()
+_last_streamed_prices = {}
 
 
-def update_all_news():
-    print(f"[{datetime.now()}] Starting Background News Update...")
-    db = SessionLocal()
+def worker_job(func):
+    """Run a scheduler job on the worker's own database pool."""
+    @functools.wraps(func)
+    def run():
+        with use_worker_pool():
+            return func()
+    return run
+
+
+def news_feeds():
+    symbols = hot_symbols(NEWS_SYMBOL_COUNT) or DEFAULT_NEWS_SYMBOLS
+    return [FeedJob("Global", "saham ekonomi indonesia", 10)] + [
+        FeedJob(symbol, f"{symbol} saham", 5) for symbol in symbols
+    ]
 
+
+def update_all_news():
     try:
-        global_news = asyncio.run(fetch_google_news("saham ekonomi indonesia", limit=10))
-        global_news = asyncio.run(enrich_articles_with_ai(global_news))
-        save_articles_to_db(db, global_news, "Global")
-
-        for ticker in ["BBCA.JK", "BBRI.JK", "BMRI.JK", "TLKM.JK", "ASII.JK"]:
-            symbol = ticker.replace(".JK", "")
-            stock_news = asyncio.run(fetch_google_news(f"{symbol} saham", limit=5))
-            stock_news = asyncio.run(enrich_articles_with_ai(stock_news))
-            save_articles_to_db(db, stock_news, symbol)
+        with WORKER_CYCLE_SECONDS.time(job="news_update"):
+            result = asyncio.run(ingest_news(news_feeds()))
     except Exception as e:
         print(f"Error in background job: {e}")
-    finally:
-        db.close()
-        print(f"[{datetime.now()}] Background Update Finished.")
+        return
+
+    WORKER_ARTICLES_INSERTED.inc(result["inserted"], job="news_update")
+    if result["completed"] or result["failed"] or result["deferred"]:
+        print(
+            f"[{datetime.now()}] Background News Update ({result['inserted']} new articles, "
+            f"{result['completed']} feeds polled, {result['failed']} failed, {result['deferred']} over budget)."
+        )
 
 
+@worker_job
 def _run_update_all_news():
     if not _news_update_lock.acquire(blocking=False):
         print("Skipping background news update: previous job still running.")
@@ -43,19 +74,164 @@ def _run_update_all_news():
         _news_update_lock.release()
 
 
+@worker_job
+def publish_quote_deltas():
+    """One bulk quote refresh for every symbol any stream client subscribed to."""
+    symbols = sorted(broker.subscribed_symbols())
+    if not symbols:
+        return
+
+    try:
+        prices = market_data.quotes_bulk_sync(symbols)
+    except Exception as e:
+        print(f"Error refreshing streamed quotes: {e}")
+        return
+
+    for symbol, price in prices.items():
+        previous = _last_streamed_prices.get(symbol)
+        if previous == price:
+            continue
+
+        _last_streamed_prices[symbol] = price
+        broker.publish("quote", {
+            "symbol": symbol,
+            "price": price,
+            "change": round(price - previous, 2) if previous else 0,
+        }, symbol=symbol)
+
+
+@worker_job
+def _run_portfolio_history_refresh():
+    try:
+        with WORKER_CYCLE_SECONDS.time(job="portfolio_history"):
+            snapshots = refresh_portfolio_history_sync()
+        print(f"[{datetime.now()}] Portfolio snapshots refreshed ({snapshots} days).")
+    except Exception as e:
+        print(f"Error refreshing portfolio history: {e}")
+
+
+@worker_job
+def _run_universe_refresh():
+    try:
+        with WORKER_CYCLE_SECONDS.time(job="universe_refresh"):
+            refreshed = refresh_due_instruments_sync()
+        print(
+            f"[{datetime.now()}] Instrument universe refreshed "
+            f"({refreshed['quotes']} quotes, {refreshed['profiles']} profiles)."
+        )
+    except Exception as e:
+        print(f"Error refreshing instrument universe: {e}")
+
+
+def _sync_listings():
+    db = SessionLocal()
+    try:
+        added = sync_listings_sync(db, current_listings())
+        print(f"[{datetime.now()}] Listings synced ({added} new instruments).")
+    except Exception as e:
+        print(f"Error syncing listings: {e}")
+    finally:
+        db.close()
+    seed_known_symbols()
+
+
+def seed_known_symbols():
+    """Match tickers in headlines against every listed instrument, not just the built-in lists."""
+    symbols = load_instrument_frame()["symbol"]
+    if not symbols.empty:
+        set_known_symbols(symbols)
+
+
+@worker_job
+def _run_listings_sync():
+    _sync_listings()
+
+
+@worker_job
+def _run_universe_startup():
+    _sync_listings()
+    _run_universe_refresh()
+
+
+@worker_job
+def _run_price_store_load():
+    try:
+        store = load_price_store()
+        print(f"[{datetime.now()}] Price store loaded ({len(store.symbols())} symbols, {store.nbytes // 1024} KiB).")
+    except Exception as e:
+        print(f"Error loading price store: {e}")
+
+
+@worker_job
+def _run_event_study():
+    try:
+        with WORKER_CYCLE_SECONDS.time(job="event_study"):
+            results = run_event_study_sync()
+        print(f"[{datetime.now()}] Event study recalibrated ({results} event type/horizon rows).")
+    except Exception as e:
+        print(f"Error running event study: {e}")
+
+
+@worker_job
+def _run_news_retention():
+    try:
+        with WORKER_CYCLE_SECONDS.time(job="news_retention"):
+            archived = archive_old_articles_sync()
+        print(f"[{datetime.now()}] News retention archived {archived} articles.")
+    except Exception as e:
+        print(f"Error archiving old news: {e}")
+
+
+@worker_job
+def _run_analytics_sync():
+    try:
+        with WORKER_CYCLE_SECONDS.time(job="analytics_sync"):
+            copied = sync_analytics_store_sync()
+        print(f"[{datetime.now()}] Analytics mirror synced ({copied['news_events']} news rows, {copied['price_bars']} bars).")
+    except Exception as e:
+        print(f"Error syncing analytics mirror: {e}")
+
+
+def snapshot_caches():
+    try:
+        entries = write_snapshot()
+        print(f"[{datetime.now()}] Cache snapshot written ({entries} entries).")
+    except Exception as e:
+        print(f"Error writing cache snapshot: {e}")
+
+
+@worker_job
+def _run_article_backfill():
+    db = SessionLocal()
+    try:
+        linked = backfill_article_tickers(db)
+        fingerprinted = backfill_title_fingerprints(db)
+        counted = backfill_article_tokens(db)
+        print(
+            f"[{datetime.now()}] Article backfill linked {linked} ticker pairs, "
+            f"fingerprinted {fingerprinted} and counted {counted} titles."
+        )
+    except Exception as e:
+        print(f"Error backfilling article indexes: {e}")
+    finally:
+        db.close()
+
+
 def start_scheduler():
     init_db()
     scheduler = BackgroundScheduler()
     scheduler.add_job(
         _run_update_all_news,
         "interval",
-        minutes=15,
+        seconds=NEWS_POLL_SECONDS,
         id="news_update_interval",
         max_instances=1,
         coalesce=True,
-        misfire_grace_time=300,
+        misfire_grace_time=60,
         replace_existing=True,
     )
+    # The first tick runs at startup; feeds still inside their polling
+    # interval (per their checkpoints) are left alone.
     scheduler.add_job(
         _run_update_all_news,
         "date",
@@ -64,5 +240,124 @@ def start_scheduler():
         coalesce=True,
         replace_existing=True,
     )
+    scheduler.add_job(
+        _run_article_backfill,
+        "date",
+        id="article_backfill",
+        max_instances=1,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        publish_quote_deltas,
+        "interval",
+        seconds=15,
+        id="quote_stream_refresh",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+    # History reads go upstream until the store is loaded, never into a request.
+    scheduler.add_job(
+        _run_price_store_load,
+        "date",
+        id="price_store_load",
+        max_instances=1,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        _run_universe_startup,
+        "date",
+        id="universe_startup",
+        max_instances=1,
+        replace_existing=True,
+    )
+    # New listings and IPOs; the startup job covers the first sync.
+    scheduler.add_job(
+        _run_listings_sync,
+        "cron",
+        day_of_week="sun",
+        hour=6,
+        timezone="Asia/Jakarta",
+        id="listings_weekly",
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=3600,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        _run_universe_refresh,
+        "interval",
+        minutes=15,
+        id="universe_refresh_interval",
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=300,
+        replace_existing=True,
+    )
+    # Fills snapshots for a ledger seeded from pre-existing positions.
+    scheduler.add_job(
+        _run_portfolio_history_refresh,
+        "date",
+        id="portfolio_history_startup",
+        max_instances=1,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        _run_portfolio_history_refresh,
+        "cron",
+        day_of_week="mon-fri",
+        hour=16,
+        minute=30,
+        timezone="Asia/Jakarta",
+        id="portfolio_history_daily",
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=3600,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        _run_event_study,
+        "cron",
+        day_of_week="sat",
+        hour=3,
+        minute=0,
+        timezone="Asia/Jakarta",
+        id="event_study_weekly",
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=3600,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        _run_analytics_sync,
+        "interval",
+        minutes=15,
+        id="analytics_sync_interval",
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=300,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        snapshot_caches,
+        "interval",
+        minutes=5,
+        id="cache_snapshot_interval",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        _run_news_retention,
+        "cron",
+        hour=2,
+        minute=30,
+        timezone="Asia/Jakarta",
+        id="news_retention_daily",
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=3600,
+        replace_existing=True,
+    )
     scheduler.start()
     return scheduler
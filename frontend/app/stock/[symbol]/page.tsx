@@ -100,11 +100,28 @@ export default function StockDetailPage() {
     useEffect(() => {
         const controller = new AbortController();
 
+        // Holders change rarely and are the slowest upstream call, so they load after the page renders.
+        const fetchHolders = async () => {
+            try {
+                const holdersRes = await axios.get(`${process.env.NEXT_PUBLIC_API_URL}/api/stocks/${symbol}`, {
+                    params: { sections: 'holders' },
+                    signal: controller.signal,
+                });
+                if (holdersRes.data?.error) throw new Error(holdersRes.data.error);
+                setStockData((prev) => (prev ? { ...prev, share_holders: holdersRes.data.share_holders } : prev));
+            } catch (error) {
+                if (!controller.signal.aborted) {
+                    console.error("Error fetching holders", error);
+                }
+            }
+        };
+
         const fetchData = async () => {
             setLoading(true);
             try {
                 const [stockRes, predRes, newsRes] = await Promise.all([
                     axios.get(`${process.env.NEXT_PUBLIC_API_URL}/api/stocks/${symbol}`, {
+                        params: { sections: 'quote,history,fundamentals' },
                         signal: controller.signal,
                     }),
                     axios.get(`${process.env.NEXT_PUBLIC_API_URL}/api/analysis/prediction/${symbol}?timeframe=3m`, {
@@ -123,6 +140,7 @@ export default function StockDetailPage() {
                 setStockData(stockRes.data);
                 setPrediction(predRes.data);
                 setNews(newsRes.data);
+                fetchHolders();
             } catch (error) {
                 if (!controller.signal.aborted) {
                     console.error("Error fetching detail data", error);
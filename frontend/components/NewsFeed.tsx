@@ -74,6 +74,18 @@ export default function NewsFeed({ limit }: { limit?: number }) {
         fetchNews();
     }, [debouncedQuery]);
 
+    // Live articles from the backend's SSE stream while the default feed is shown
+    useEffect(() => {
+        if (debouncedQuery) return;
+
+        const source = new EventSource(`${process.env.NEXT_PUBLIC_API_URL}/api/stream/?news=true`);
+        source.addEventListener('news', (event) => {
+            const article: Article = JSON.parse((event as MessageEvent).data);
+            setNews(prev => prev.some(item => item.link === article.link) ? prev : [article, ...prev]);
+        });
+        return () => source.close();
+    }, [debouncedQuery]);
+
     // Limit display if needed
     const displayNews = limit ? news.slice(0, limit) : news;
 
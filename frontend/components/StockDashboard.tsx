@@ -92,6 +92,33 @@ export default function StockDashboard({ simpleView = false }: { simpleView?: bo
         return () => controller.abort();
     }, []);
 
+    // Live quotes for the watchlist (or the first listed stocks) from the backend's SSE stream
+    const streamedSymbols = (favorites.length ? favorites : stocks.map(s => s.symbol)).slice(0, 20).join(',');
+
+    useEffect(() => {
+        if (!streamedSymbols) return;
+
+        const source = new EventSource(
+            `${process.env.NEXT_PUBLIC_API_URL}/api/stream/?news=false&symbols=${encodeURIComponent(streamedSymbols)}`
+        );
+        source.addEventListener('quote', (event) => {
+            const quote: { symbol: string; price: number } = JSON.parse((event as MessageEvent).data);
+            setStocks(prev => prev.map((s): Stock => {
+                if (s.symbol !== quote.symbol) return s;
+                const previousClose = s.price - s.change;
+                const change = quote.price - previousClose;
+                return {
+                    ...s,
+                    price: quote.price,
+                    change: Math.round(change * 100) / 100,
+                    change_pct: previousClose ? Math.round((change / previousClose) * 10000) / 100 : s.change_pct,
+                    status: change > 0 ? 'up' : change < 0 ? 'down' : 'neutral',
+                };
+            }));
+        });
+        return () => source.close();
+    }, [streamedSymbols]);
+
     // Extract unique sectors
     const sectors = ['All', ...Array.from(new Set(stocks.map(s => s.sector || 'Others')))];
 